@@ -1,7 +1,8 @@
 import os
 import time
 import sqlite3
-from contextlib import contextmanager
+
+from storage import pool, writer
 
 from .cooldown import can_send
 
@@ -20,15 +21,8 @@ class AlertService:
     def __init__(self, db_path: str):
         self.db_path = db_path
 
-    @contextmanager
     def _db(self):
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        try:
-            conn.row_factory = sqlite3.Row
-            conn.execute("PRAGMA foreign_keys = ON;")
-            yield conn
-        finally:
-            conn.close()
+        return pool.connect(self.db_path)
 
     def _insert_alert(
         self,
@@ -145,7 +139,7 @@ class AlertService:
         battery_level = row.get("battery_level")
         now_ts = int(time.time())
 
-        with self._db() as conn:
+        def ack_offline(conn):
             conn.execute(
                 """
                 UPDATE alerts
@@ -156,7 +150,8 @@ class AlertService:
                 """,
                 (now_ts, dev_eui),
             )
-            conn.commit()
+
+        writer.run_write(self.db_path, ack_offline, conn_factory=self._db)
 
         if smoke == 1:
             alert_type = "SMOKE_DETECTED"
@@ -176,7 +171,7 @@ class AlertService:
             f"Smoke: {smoke}\n"
         )
 
-        with self._db() as conn:
+        def evaluate(conn):
             # 1) Check if THIS telemetry matches ANY enabled preference for this node
             match_count_row = conn.execute(
                 """
@@ -228,24 +223,21 @@ class AlertService:
             if not can_send(conn, dev_eui, alert_type):
                 return
 
-            # Requirement order: store alert event first, then enqueue (atomic)
-            try:
-                conn.execute("BEGIN")
-                self._insert_alert(conn, dev_eui, alert_type, msg, now_ts)
-                self._enqueue_matching_users(
-                    conn,
-                    dev_eui,
-                    temp_c,
-                    battery_level,
-                    smoke,
-                    alert_type,
-                    msg,
-                    now_ts,
-                )
-                conn.commit()
-            except Exception:
-                conn.rollback()
-                raise
+            # Requirement order: store alert event first, then enqueue. The
+            # write job is one transaction, so a failure undoes both.
+            self._insert_alert(conn, dev_eui, alert_type, msg, now_ts)
+            self._enqueue_matching_users(
+                conn,
+                dev_eui,
+                temp_c,
+                battery_level,
+                smoke,
+                alert_type,
+                msg,
+                now_ts,
+            )
+
+        writer.run_write(self.db_path, evaluate, conn_factory=self._db)
 
 
 _service = AlertService(DB_PATH)
@@ -3,8 +3,8 @@ import time
 import sqlite3
 import threading
 import logging
-import datetime
-from contextlib import contextmanager
+
+from storage import pool
 
 from .cooldown import can_send
 
@@ -23,15 +23,8 @@ STALENESS_POLL_SECONDS = float(os.getenv("NODE_STALENESS_POLL_SECONDS", "60"))
 PREF_COOLDOWN_SECONDS = int(os.getenv("STALENESS_ALERT_PREF_COOLDOWN_SECONDS", "86400"))
 
 
-@contextmanager
 def _db():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    try:
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA foreign_keys = ON;")
-        yield conn
-    finally:
-        conn.close()
+    return pool.connect(DB_PATH)
 
 
 def _check_offline_nodes(conn: sqlite3.Connection) -> int:
@@ -40,11 +33,8 @@ def _check_offline_nodes(conn: sqlite3.Connection) -> int:
     and have at least one user with an enabled alert preference.
     Returns the number of alerts fired.
     """
-    cutoff = datetime.datetime.utcnow() - datetime.timedelta(
-        seconds=OFFLINE_THRESHOLD_SECONDS
-    )
-    cutoff_iso = cutoff.isoformat()
     now_ts = int(time.time())
+    cutoff_ms = (now_ts - OFFLINE_THRESHOLD_SECONDS) * 1000
 
     stale = conn.execute(
         """
@@ -54,10 +44,10 @@ def _check_offline_nodes(conn: sqlite3.Connection) -> int:
         JOIN users u ON u.auth_sub = ap.user_id
         WHERE ap.enabled = 1
           AND u.email IS NOT NULL
-          AND n.last_seen IS NOT NULL
-          AND n.last_seen < ?
+          AND n.last_seen_ms IS NOT NULL
+          AND n.last_seen_ms < ?
         """,
-        (cutoff_iso,),
+        (cutoff_ms,),
     ).fetchall()
 
     fired = 0
@@ -3,7 +3,8 @@ import time
 import sqlite3
 import threading
 import logging
-from contextlib import contextmanager
+
+from storage import pool, writer
 
 from .dispatch_email import send_email_alert
 from .staleness import start_staleness_checker
@@ -24,15 +25,8 @@ POLL_SECONDS = float(os.getenv("ALERT_POLL_SECONDS", "1.0"))
 CLAIM_TTL_SECONDS = int(os.getenv("ALERT_CLAIM_TTL_SECONDS", "60"))
 
 
-@contextmanager
 def _db():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    try:
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA foreign_keys = ON;")
-        yield conn
-    finally:
-        conn.close()
+    return pool.connect(DB_PATH)
 
 
 def _claim_one(conn: sqlite3.Connection) -> sqlite3.Row | None:
@@ -100,6 +94,33 @@ def _release_stale_claims(conn: sqlite3.Connection) -> int:
     return cur.rowcount
 
 
+def _mark_processed(conn: sqlite3.Connection, queue_id: int) -> None:
+    conn.execute(
+        """
+        UPDATE alert_queue
+        SET processed = 1,
+            processed_at = ?,
+            in_progress = 0,
+            in_progress_at = NULL
+        WHERE id = ?
+        """,
+        (int(time.time()), queue_id),
+    )
+
+
+def _release_failed(conn: sqlite3.Connection, queue_id: int, detail: str) -> None:
+    _insert_system_alert(conn, "EMAIL_SEND_FAILED", detail)
+    conn.execute(
+        """
+        UPDATE alert_queue
+        SET in_progress = 0,
+            in_progress_at = NULL
+        WHERE id = ? AND processed = 0
+        """,
+        (queue_id,),
+    )
+
+
 def worker_loop(worker_id: int) -> None:
     while True:
         try:
@@ -124,19 +145,10 @@ def worker_loop(worker_id: int) -> None:
                 )
 
                 # Mark processed only after successful send
-                with _db() as conn:
-                    conn.execute(
-                        """
-                        UPDATE alert_queue
-                        SET processed = 1,
-                            processed_at = ?,
-                            in_progress = 0,
-                            in_progress_at = NULL
-                        WHERE id = ?
-                        """,
-                        (int(time.time()), row["id"]),
-                    )
-                    conn.commit()
+                writer.run_write(
+                    DB_PATH, lambda conn: _mark_processed(conn, row["id"]),
+                    conn_factory=_db,
+                )
 
             except Exception as e:
                 log.exception(
@@ -144,22 +156,11 @@ def worker_loop(worker_id: int) -> None:
                     worker_id,
                     row["id"],
                 )
-                with _db() as conn:
-                    _insert_system_alert(
-                        conn,
-                        "EMAIL_SEND_FAILED",
-                        f"queue_id={row['id']} email={row['email']} error={e}",
-                    )
-                    conn.execute(
-                        """
-                        UPDATE alert_queue
-                        SET in_progress = 0,
-                            in_progress_at = NULL
-                        WHERE id = ? AND processed = 0
-                        """,
-                        (row["id"],),
-                    )
-                    conn.commit()
+                detail = f"queue_id={row['id']} email={row['email']} error={e}"
+                writer.run_write(
+                    DB_PATH, lambda conn: _release_failed(conn, row["id"], detail),
+                    conn_factory=_db,
+                )
 
         except Exception:
             log.exception(
@@ -6,18 +6,35 @@ import hashlib
 import sqlite3
 import uvicorn
 import logging
-import requests
 import subprocess
 import threading
 import jwt as pyjwt
 import datetime as dt
+import downsample
+import response_cache
+from clerk_client import ClerkClient, ClerkError, ClerkUnavailable
+from ttl_cache import TTLCache
+import data_listener
+from storage import (
+    events, export, invalidation, pool, rollups, spatial, versions, writer,
+)
+from storage.timestamps import parse_time_param
+from serialization import (
+    FORMAT_PATTERN, csv_stream, decode_cursor, encode, encode_cursor, fetch,
+    gzip_stream, ndjson_stream, respond, shape,
+)
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
-from typing import Optional, List, Any
+from typing import Optional, List
 from alerts.worker import start_workers
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, HTTPException, Query, Depends, Request
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi import (
+    BackgroundTasks, FastAPI, Header, HTTPException, Query, Depends, Request,
+    Response,
+)
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 
@@ -88,16 +105,15 @@ async def lifespan(app: FastAPI):
     # Only start workers when explicitly enabled
     if not _env_bool("ALERTS_ENABLE_WORKERS", "0"):
         log.info("Alert workers disabled (set ALERTS_ENABLE_WORKERS=1 to enable).")
-        yield
-        return
-
-    try:
-        start_workers()
-        log.info("Alert workers started.")
-    except Exception:
-        log.exception("Failed to start alert workers")
+    else:
+        try:
+            start_workers()
+            log.info("Alert workers started.")
+        except Exception:
+            log.exception("Failed to start alert workers")
 
     yield
+    await clerk.aclose()
 
 
 app = FastAPI(title="LoRa Wildfire Backend API", lifespan=lifespan)
@@ -109,6 +125,11 @@ ALL_PERMISSIONS: set[str] = {
     "ack_alerts",
     "manage_alert_preferences",
 }
+# one bit per permission; a caller's permissions are OR-ed into an int mask
+PERMISSION_BITS: dict[str, int] = {
+    perm: 1 << i for i, perm in enumerate(sorted(ALL_PERMISSIONS))
+}
+ALL_PERMISSIONS_MASK = sum(PERMISSION_BITS.values())
 
 app.add_middleware(
     CORSMiddleware,
@@ -126,18 +147,97 @@ DB_NAME = os.getenv("DB_NAME", "lora.db")
 DB_PATH = os.path.join(HERE, DB_NAME)
 
 
-def db() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON;")
-    return conn
+def db(readonly: bool = False):
+    """
+    Pooled connection context manager; commits on clean exit.
+    Writable blocks go through storage.writer so they join its group commit
+    when SQLITE_SINGLE_WRITER is on.
+    """
+    if readonly:
+        return pool.connect(DB_PATH, readonly=True)
+    return writer.transaction(DB_PATH)
 
 
-def parse_iso(ts: Optional[str]) -> Optional[dt.datetime]:
-    if not ts:
-        return None
-    ts = ts.replace("Z", "+00:00")
-    return dt.datetime.fromisoformat(ts)
+async def get_db():
+    """
+    The request's read-only connection, shared by the auth dependencies and
+    the endpoint through request_conn. It is borrowed from the pool on first
+    use and returned when the endpoint returns, before a streamed body is
+    sent. Writes still go through db().
+    """
+    conn = pool.RequestConnection(pool.get_pool(DB_PATH, readonly=True))
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+request_conn = Depends(get_db, scope="function")
+
+
+def parse_time(value: Optional[str], name: str) -> Optional[int]:
+    """Query-parameter time (ISO-8601 or epoch ms) as epoch milliseconds."""
+    try:
+        return parse_time_param(value)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{name} must be ISO-8601 or epoch milliseconds",
+        )
+
+
+def conditional_get(
+    request: Request,
+    response: Response,
+    tables: tuple[str, ...],
+    *scope: object,
+    conn: pool.RequestConnection,
+) -> Optional[Response]:
+    """
+    Tag the response with an ETag built from the data versions of `tables`
+    and return a 304 if the client already holds it, before any query runs.
+    Versions are read before the data, so a write landing in between only
+    costs the next request a full response. `conn` is the request's
+    connection.
+    """
+    tag = versions.etag(
+        versions.current(conn, tables),
+        request.url.path, request.url.query, *scope,
+    )
+    headers = {"ETag": tag, "Cache-Control": "no-cache"}
+    if versions.matches(request.headers.get("if-none-match"), tag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+def cached(request: Request, response: Response, build) -> Response:
+    """
+    Serve an endpoint body through the shared single-flight micro-cache.
+    Entries are keyed by path and query string and stay valid while the
+    ETag conditional_get put on `response` is unchanged (and for at most
+    RESPONSE_CACHE_TTL_MS). `build` returns the JSON content; identical
+    requests arriving while it runs wait for its result. X-Cache reports
+    hit, miss or coalesced.
+    """
+    body, outcome = response_cache.responses.get(
+        (DB_PATH, request.url.path, request.url.query),
+        response.headers["etag"],
+        lambda: encode(build()),
+    )
+    response.headers["X-Cache"] = outcome
+    return respond(body, response)
+
+
+def parse_cursor(token: str, kind: str, size: int) -> list:
+    """Keyset values of a next_cursor issued by the `kind` endpoint."""
+    try:
+        value = decode_cursor(token)
+    except ValueError:
+        value = None
+    if not value or len(value) != size + 1 or value[0] != kind:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value[1:]
 
 
 def now_ts() -> int:
@@ -159,12 +259,84 @@ def ensure_user_row(user_id: str, email: str) -> None:
         conn.commit()
 
 
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "4096"))
+JWT_CACHE_MAX_SECONDS = float(os.getenv("JWT_CACHE_MAX_SECONDS", "3600"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "4096"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+PERMISSION_CACHE_SIZE = int(os.getenv("PERMISSION_CACHE_SIZE", "4096"))
+PERMISSION_CACHE_TTL_SECONDS = float(os.getenv("PERMISSION_CACHE_TTL_SECONDS", "300"))
+
+
+async def sync_caches() -> None:
+    """
+    invalidation.sync for async dependencies. Between polls this is a clock
+    check; a due poll reads the log in the threadpool, off the event loop.
+    """
+    invalidator = invalidation.get_invalidator(DB_PATH)
+    if invalidator.due():
+        await run_in_threadpool(invalidator.sync)
+
+
+# verified token payloads by SHA-256 of the token, dropped at the token's exp
+_jwt_cache = TTLCache(JWT_CACHE_SIZE, JWT_CACHE_MAX_SECONDS)
+# user ids known to have a users row with an email -> that email
+_user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+
+def _drop_user(user_id: str | None) -> None:
+    if user_id is None:
+        _user_cache.clear()
+    else:
+        _user_cache.pop(user_id)
+
+
+invalidation.subscribe("user", _drop_user)
+
+
+def permission_mask(permissions) -> int:
+    mask = 0
+    for perm in permissions:
+        mask |= PERMISSION_BITS.get(perm, 0)
+    return mask
+
+
+def permission_names(mask: int) -> set[str]:
+    return {perm for perm, bit in PERMISSION_BITS.items() if mask & bit}
+
+
+# (org_id, clerk_role) -> permission mask from org_role_settings
+_permission_cache = TTLCache(PERMISSION_CACHE_SIZE, PERMISSION_CACHE_TTL_SECONDS)
+# bumped on every invalidation, so a lookup that raced one is not stored
+_permission_epoch = 0
+
+
+def _drop_org_permissions(org_id: str | None) -> None:
+    global _permission_epoch
+    _permission_epoch += 1
+    if org_id is None:
+        _permission_cache.clear()
+    else:
+        _permission_cache.discard(lambda key: key[0] == org_id)
+
+
+invalidation.subscribe("org_permissions", _drop_org_permissions)
+
+
 def _decode_clerk_jwt(
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
 ) -> dict:
+    """
+    Verified claims of the bearer token. A token that verified once is
+    served from _jwt_cache until its exp, skipping the RS256 check; failed
+    verifications are not cached.
+    """
     token = credentials.credentials
+    cache_key = hashlib.sha256(token.encode()).digest()
+    payload = _jwt_cache.get(cache_key)
+    if payload is not None:
+        return payload
     try:
-        return pyjwt.decode(
+        payload = pyjwt.decode(
             token,
             CLERK_JWT_PUBLIC_KEY,
             algorithms=["RS256"],
@@ -173,25 +345,34 @@ def _decode_clerk_jwt(
         )
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Invalid Clerk JWT: {e}")
+    exp = payload.get("exp")
+    _jwt_cache.set(cache_key, payload, None if exp is None else exp - time.time())
+    return payload
 
 
-def get_clerk_user_id(
+async def get_clerk_user_id(
     request: Request,
     payload: dict = Depends(_decode_clerk_jwt),
+    conn: pool.RequestConnection = request_conn,
 ) -> str:
     user_id = payload.get("sub") or payload.get("user_id")
     if not user_id:
         raise HTTPException(status_code=401, detail="No user_id in Clerk token")
-    email = None
-    with db() as conn:
+    await sync_caches()
+    if _user_cache.get(user_id) is not None:
+        return user_id
+
+    def _stored_email():
         row = conn.execute(
             "SELECT email FROM users WHERE auth_sub = ?", (user_id,)
         ).fetchone()
-        if row and row["email"]:
-            email = row["email"]
+        return row["email"] if row else None
+
+    email = await run_in_threadpool(_stored_email)
     if not email:
-        email = fetch_clerk_email(user_id)
-        ensure_user_row(user_id, email)
+        email = await fetch_clerk_email(user_id)
+        await run_in_threadpool(ensure_user_row, user_id, email)
+    _user_cache.set(user_id, email)
     return user_id
 
 
@@ -202,41 +383,24 @@ def get_clerk_org_id(
     return payload.get("org_id") or request.headers.get("x-org-id")
 
 
-_org_role_cache: dict[tuple[str, str], tuple[str | None, float]] = {}
-_ORG_ROLE_CACHE_TTL = 300  # 5 minutes
-
+# Clerk API lookups (emails, org roles) shared by every request of this worker
+clerk = ClerkClient(CLERK_SECRET_KEY)
+invalidation.subscribe("org_member", clerk.forget_user)
+invalidation.subscribe("user", clerk.forget_user)
 
-def _fetch_user_org_role(user_id: str, org_id: str) -> str | None:
-    cache_key = (user_id, org_id)
-    cached = _org_role_cache.get(cache_key)
-    if cached and time.time() - cached[1] < _ORG_ROLE_CACHE_TTL:
-        return cached[0]
 
-    if not CLERK_SECRET_KEY:
+async def _fetch_user_org_role(user_id: str, org_id: str) -> str | None:
+    await sync_caches()
+    if not clerk.configured:
         return None
-    result: str | None = None
     try:
-        r = requests.get(
-            f"https://api.clerk.com/v1/users/{user_id}/organization_memberships",
-            params={"limit": 50},
-            headers={"Authorization": f"Bearer {CLERK_SECRET_KEY}"},
-            timeout=10,
-        )
-        if r.status_code != 200:
-            log.warning("Clerk memberships API error: status=%s", r.status_code)
-        else:
-            for m in r.json().get("data", []):
-                if m.get("organization", {}).get("id") == org_id:
-                    result = m.get("role")
-                    break
-    except Exception:
-        log.exception("Failed to fetch user org role from Clerk")
-
-    _org_role_cache[cache_key] = (result, time.time())
-    return result
+        return await clerk.org_role(user_id, org_id)
+    except ClerkError as e:
+        log.warning("Failed to fetch user org role from Clerk: %s", e)
+        return None
 
 
-def get_clerk_org_role(
+async def get_clerk_org_role(
     request: Request,
     user_id: str = Depends(get_clerk_user_id),
     org_id: str | None = Depends(get_clerk_org_id),
@@ -246,33 +410,58 @@ def get_clerk_org_role(
     if jwt_role:
         return jwt_role
     if org_id:
-        return _fetch_user_org_role(user_id, org_id)
+        return await _fetch_user_org_role(user_id, org_id)
     return None
 
 
-def get_org_permissions(
+async def get_permission_mask(
     user_id: str = Depends(get_clerk_user_id),
     org_id: str | None = Depends(get_clerk_org_id),
     org_role: str | None = Depends(get_clerk_org_role),
-) -> set[str]:
+    conn: pool.RequestConnection = request_conn,
+) -> int:
+    """
+    The caller's permissions as a PERMISSION_BITS mask. Role settings are
+    read once per (org, role) and kept in _permission_cache until a write
+    to org_role_settings, in this process or another, invalidates them.
+    """
     if not org_id:
-        return ALL_PERMISSIONS
+        return ALL_PERMISSIONS_MASK
     if org_role == "org:admin":
-        return ALL_PERMISSIONS
+        return ALL_PERMISSIONS_MASK
     if not org_role:
-        return set()
-    with db() as conn:
-        perms = conn.execute(
-            "SELECT permission FROM org_role_settings "
-            "WHERE org_id = ? AND clerk_role = ?",
-            (org_id, org_role),
-        ).fetchall()
-    return {p["permission"] for p in perms}
+        return 0
+    await sync_caches()
+    key = (org_id, org_role)
+    mask = _permission_cache.get(key)
+    if mask is not None:
+        return mask
+
+    def _load():
+        return permission_mask(
+            r[0] for r in conn.execute(
+                "SELECT permission FROM org_role_settings "
+                "WHERE org_id = ? AND clerk_role = ?",
+                (org_id, org_role),
+            )
+        )
+
+    epoch = _permission_epoch
+    mask = await run_in_threadpool(_load)
+    if epoch == _permission_epoch:
+        _permission_cache.set(key, mask)
+    return mask
+
+
+def get_org_permissions(mask: int = Depends(get_permission_mask)) -> set[str]:
+    return permission_names(mask)
 
 
 def _require_perm(perm: str):
-    def _check(permissions: set = Depends(get_org_permissions)) -> None:
-        if perm not in permissions:
+    bit = PERMISSION_BITS[perm]
+
+    async def _check(mask: int = Depends(get_permission_mask)) -> None:
+        if not mask & bit:
             raise HTTPException(status_code=403, detail=f"Permission denied: {perm}")
 
     return _check
@@ -293,43 +482,20 @@ def require_org_admin(
     return org_id
 
 
-def fetch_clerk_email(user_id: str) -> str:
-    if not CLERK_SECRET_KEY:
+async def fetch_clerk_email(user_id: str) -> str:
+    if not clerk.configured:
         raise HTTPException(status_code=500, detail="Missing CLERK_SECRET_KEY")
-
-    url = f"https://api.clerk.com/v1/users/{user_id}"
-    r = requests.get(
-        url,
-        headers={"Authorization": f"Bearer {CLERK_SECRET_KEY}"},
-        timeout=10,
-    )
-
-    if r.status_code != 200:
-        log.warning("Clerk API error: status=%s body=%s", r.status_code, r.text[:200])
+    try:
+        email = await clerk.user_email(user_id)
+    except ClerkUnavailable:
+        raise HTTPException(status_code=503, detail="Clerk is unavailable")
+    except ClerkError as e:
         raise HTTPException(
             status_code=502,
-            detail=f"Failed to fetch user from Clerk (status {r.status_code})",
+            detail=f"Failed to fetch user from Clerk (status {e.status})",
         )
-
-    data: dict[str, Any] = r.json()
-
-    # pick primary email if present, else first email
-    primary_id = data.get("primary_email_address_id")
-    emails = data.get("email_addresses") or []
-
-    email = None
-    if primary_id:
-        for e in emails:
-            if e.get("id") == primary_id:
-                email = e.get("email_address")
-                break
-
-    if not email and emails:
-        email = emails[0].get("email_address")
-
     if not email:
         raise HTTPException(status_code=401, detail="No email on Clerk user")
-
     return email
 
 
@@ -464,7 +630,10 @@ def create_alert_preference(
 
 
 @app.get("/alert-preferences")
-def list_alert_preferences(user_id: str = Depends(get_clerk_user_id)):
+def list_alert_preferences(
+    user_id: str = Depends(get_clerk_user_id),
+    conn: pool.RequestConnection = request_conn,
+):
     q = """
         SELECT
           id,
@@ -481,20 +650,19 @@ def list_alert_preferences(user_id: str = Depends(get_clerk_user_id)):
         WHERE user_id = ?
         ORDER BY id DESC
     """
-    with db() as conn:
-        rows = conn.execute(q, (user_id,)).fetchall()
+    rows = conn.execute(q, (user_id,)).fetchall()
     return [dict(r) for r in rows]
 
 
 @app.get("/subscriptions")
 def get_user_subscriptions(
     user_id: str = Depends(get_clerk_user_id),
+    conn: pool.RequestConnection = request_conn,
 ):
-    with db() as conn:
-        rows = conn.execute(
-            "SELECT device_eui FROM user_node_subscriptions WHERE user_id = ?",
-            (user_id,),
-        ).fetchall()
+    rows = conn.execute(
+        "SELECT device_eui FROM user_node_subscriptions WHERE user_id = ?",
+        (user_id,),
+    ).fetchall()
     return [r[0] for r in rows]
 
 
@@ -505,10 +673,45 @@ def health():
 
 @app.get("/alerts")
 def get_alerts(
+    request: Request,
+    response: Response,
     limit: int = Query(50, ge=1, le=200),
     dev_eui: Optional[str] = Query(None),
     acknowledged: Optional[bool] = Query(None),
+    since: Optional[int] = Query(
+        None, ge=0, description="Cursor from a previous since= response"
+    ),
+    fmt: str = Query("rows", alias="format", pattern=FORMAT_PATTERN),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor of the previous page; empty for the first"
+    ),
+    paged: bool = Query(
+        False, description='Return {"alerts": [...], "next_cursor": ...}'
+    ),
+    conn: pool.RequestConnection = request_conn,
 ):
+    """
+    Newest alerts first, as a plain list. When there are more, X-Next-Cursor
+    holds a cursor for the next page; send it back as cursor=. Pages are
+    keyset seeks on (created_at, id) along idx_alerts_created_at.
+    paged=true returns {"alerts": [...], "next_cursor": ...} (null on the
+    last page) for every page instead of the plain list.
+    With since=<cursor>, returns
+    {cursor, reset, has_more, alerts}: only alerts created or acknowledged
+    after the cursor, oldest change first. reset=true means the cursor had
+    expired and alerts is a fresh newest-first list; has_more=true means
+    call again with the new cursor. since= cannot be combined with cursor=
+    or paged=true.
+    format=columnar returns each alert list as {"columns", "data"}.
+    """
+    if since is not None and (cursor is not None or paged):
+        raise HTTPException(
+            status_code=400, detail="since cannot be combined with cursor or paged"
+        )
+    not_modified = conditional_get(request, response, ("alerts",), conn=conn)
+    if not_modified is not None:
+        return not_modified
+
     clauses: List[str] = []
     params: List[object] = []
 
@@ -519,9 +722,15 @@ def get_alerts(
         clauses.append("a.acknowledged = ?")
         params.append(1 if acknowledged else 0)
 
-    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
-    q = f"""
-        SELECT
+    page_clauses = list(clauses)
+    page_params = list(params)
+    if cursor:
+        created_at, alert_id = parse_cursor(cursor, "a", 2)
+        # created_at DESC, id ASC is the order idx_alerts_created_at returns
+        page_clauses.append("a.created_at <= ? AND (a.created_at < ? OR a.id > ?)")
+        page_params += [created_at, created_at, alert_id]
+
+    select_columns = """
           a.id,
           a.dev_eui,
           a.alert_type,
@@ -529,15 +738,63 @@ def get_alerts(
           a.created_at,
           a.acknowledged,
           a.acknowledged_at
+    """
+    where = ("WHERE " + " AND ".join(page_clauses)) if page_clauses else ""
+    q = f"""
+        SELECT {select_columns}
         FROM alerts a
         {where}
-        ORDER BY a.created_at DESC
+        ORDER BY a.created_at DESC, a.id ASC
         LIMIT ?
     """
-    params.append(limit)
-    with db() as conn:
-        rows = conn.execute(q, tuple(params)).fetchall()
-    return [dict(r) for r in rows]
+    if since is None:
+        columns, rows = fetch(conn, q, (*page_params, limit + 1))
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = dict(zip(columns, rows[-1]))
+            next_cursor = encode_cursor("a", last["created_at"], last["id"])
+            response.headers["X-Next-Cursor"] = next_cursor
+        body = shape(columns, rows, fmt)
+        if paged:
+            body = {"alerts": body, "next_cursor": next_cursor}
+        return respond(body, response)
+
+    head = events.head(conn)
+    if not events.covers(conn, since, head):
+        columns, rows = fetch(conn, q, (*params, limit))
+        return respond(
+            {
+                "cursor": head, "reset": True, "has_more": False,
+                "alerts": shape(columns, rows, fmt),
+            },
+            response,
+        )
+    columns, rows = fetch(
+        conn,
+        f"""
+        SELECT MAX(e.id) AS event_id, {select_columns}
+        FROM events e
+        JOIN alerts a ON a.id = e.ref_id
+        WHERE e.kind = 'alert' AND e.id > ? AND e.id <= ?
+          {"".join(" AND " + c for c in clauses)}
+        GROUP BY a.id
+        ORDER BY event_id
+        LIMIT ?
+        """,
+        (since, head, *params, limit + 1),
+    )
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if has_more:
+        head = rows[-1][0]
+    # drop the leading event_id column
+    alerts = shape(columns[1:], [r[1:] for r in rows], fmt)
+    return respond(
+        {"cursor": head, "reset": False, "has_more": has_more, "alerts": alerts},
+        response,
+    )
 
 
 @app.put("/alerts/{alert_id}/ack")
@@ -685,7 +942,10 @@ def delete_alert_preference(
 
 
 @app.get("/nodes")
-def list_nodes(_perm: None = require_permission("view_nodes")):
+def list_nodes(
+    _perm: None = require_permission("view_nodes"),
+    conn: pool.RequestConnection = request_conn,
+):
     """
     Returns: [{device_eui, node_id, last_seen}]
     """
@@ -694,16 +954,25 @@ def list_nodes(_perm: None = require_permission("view_nodes")):
         FROM nodes
         ORDER BY device_eui
     """
-    with db() as conn:
-        rows = conn.execute(q).fetchall()
+    rows = conn.execute(q).fetchall()
     return [dict(r) for r in rows]
 
 
 @app.get("/nodes/{device_eui}/latest")
-def node_latest(device_eui: str, _perm: None = require_permission("view_nodes")):
+def node_latest(
+    device_eui: str,
+    request: Request,
+    response: Response,
+    _perm: None = require_permission("view_nodes"),
+    conn: pool.RequestConnection = request_conn,
+):
     """
     Latest telemetry row for a device_eui.
+    A newer row always updates node_latest, so its version tags the result.
     """
+    not_modified = conditional_get(request, response, ("node_latest",), conn=conn)
+    if not_modified is not None:
+        return not_modified
     q = """
         SELECT
           device_eui,
@@ -721,52 +990,365 @@ def node_latest(device_eui: str, _perm: None = require_permission("view_nodes"))
           snr
         FROM telemetry
         WHERE device_eui = ?
-        ORDER BY timestamp DESC
+        ORDER BY ts_ms DESC, timestamp DESC
         LIMIT 1
     """
-    with db() as conn:
-        row = conn.execute(q, (device_eui,)).fetchone()
+    row = conn.execute(q, (device_eui,)).fetchone()
     if not row:
         raise HTTPException(status_code=404, detail="No telemetry for this device")
     return dict(row)
 
 
+@app.get("/nodes/{device_eui}/overview")
+def node_overview(
+    device_eui: str,
+    request: Request,
+    response: Response,
+    _perm: None = require_permission("view_nodes"),
+    user_id: str = Depends(get_clerk_user_id),
+    telemetry_limit: int = Query(50, ge=1, le=500),
+    alerts_limit: int = Query(50, ge=1, le=200),
+    conn: pool.RequestConnection = request_conn,
+):
+    """
+    Everything the node detail panel shows, in one request:
+    {device_eui, latest, telemetry, alerts, subscribed, preference}.
+      - latest: the node_latest row, or null before the first uplink
+      - telemetry: the newest telemetry_limit raw rows, newest first
+      - alerts: the newest alerts_limit alerts for the node
+      - subscribed / preference: the caller's subscription and alert
+        preference (null when none) for the node
+    All reads share one connection and the authorization dependencies
+    run once. The ETag covers every source table, so an unchanged node
+    answers 304 after a single version lookup.
+    """
+    not_modified = conditional_get(
+        request, response,
+        ("node_latest", "alerts", "user_node_subscriptions", "alert_preferences"),
+        user_id,
+        conn=conn,
+    )
+    if not_modified is not None:
+        return not_modified
+    if not conn.execute(
+        "SELECT 1 FROM nodes WHERE device_eui = ?", (device_eui,)
+    ).fetchone():
+        raise HTTPException(status_code=404, detail="Unknown device")
+
+    columns, rows = fetch(
+        conn,
+        """
+        SELECT
+          device_eui, gateway_id, timestamp, device_timestamp,
+          latitude, longitude, altitude, temperature_c, humidity_pct,
+          battery_level, smoke_detected, rssi, snr
+        FROM node_latest
+        WHERE device_eui = ?
+        """,
+        (device_eui,),
+    )
+    latest = shape(columns, rows)[0] if rows else None
+
+    columns, rows = fetch(
+        conn,
+        """
+        SELECT
+          device_eui, gateway_id, timestamp, device_timestamp,
+          latitude, longitude, altitude, temperature_c, humidity_pct,
+          battery_level, smoke_detected, rssi, snr
+        FROM telemetry
+        WHERE device_eui = ?
+        ORDER BY ts_ms DESC, id DESC
+        LIMIT ?
+        """,
+        (device_eui, telemetry_limit),
+    )
+    telemetry = shape(columns, rows)
+
+    columns, rows = fetch(
+        conn,
+        """
+        SELECT
+          id, dev_eui, alert_type, message, created_at,
+          acknowledged, acknowledged_at
+        FROM alerts
+        WHERE dev_eui = ?
+        ORDER BY created_at DESC, id ASC
+        LIMIT ?
+        """,
+        (device_eui, alerts_limit),
+    )
+    alerts = shape(columns, rows)
+
+    subscribed = conn.execute(
+        "SELECT 1 FROM user_node_subscriptions "
+        "WHERE user_id = ? AND device_eui = ?",
+        (user_id, device_eui),
+    ).fetchone() is not None
+
+    columns, rows = fetch(
+        conn,
+        """
+        SELECT
+          id, user_id, dev_eui, enabled,
+          temp_over_c, battery_below_pct, smoke_detected,
+          last_sent_at, created_at, updated_at
+        FROM alert_preferences
+        WHERE user_id = ? AND dev_eui = ?
+        """,
+        (user_id, device_eui),
+    )
+    preference = shape(columns, rows)[0] if rows else None
+
+    return respond(
+        {
+            "device_eui": device_eui,
+            "latest": latest,
+            "telemetry": telemetry,
+            "alerts": alerts,
+            "subscribed": subscribed,
+            "preference": preference,
+        },
+        response,
+    )
+
+
 @app.get("/telemetry")
 def get_telemetry(
+    response: Response,
     _perm: None = require_permission("view_nodes"),
     device_eui: Optional[str] = None,
     t_from: Optional[str] = Query(
-        None, description="ISO8601; e.g. 2025-01-01T00:00:00Z"
+        None, description="ISO8601 or epoch ms; e.g. 2025-01-01T00:00:00Z"
+    ),
+    t_to: Optional[str] = Query(
+        None, description="ISO8601 or epoch ms; e.g. 1735776000000"
     ),
-    t_to: Optional[str] = Query(None, description="ISO8601; e.g. 2025-01-02T00:00:00Z"),
     limit: int = Query(500, ge=1, le=5000),
     newest_first: bool = True,
+    resolution: str = Query("auto", pattern="^(auto|raw|1m|1h|1d)$"),
+    fmt: str = Query("rows", alias="format", pattern=FORMAT_PATTERN),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor of the previous page; empty for the first"
+    ),
+    paged: bool = Query(
+        False, description='Return {"telemetry": [...], "next_cursor": ...}'
+    ),
+    max_points: Optional[int] = Query(
+        None, ge=3, le=5000, description="Downsample each metric for charting"
+    ),
+    conn: pool.RequestConnection = request_conn,
 ):
     """
     Returns telemetry rows. Filters:
       - device_eui: only that device’s data
-      - t_from/t_to: time range on 'timestamp'
+      - t_from/t_to: time range on 'timestamp' (ISO-8601 or epoch ms)
       - limit: row cap (default 500)
+      - resolution: raw rows or 1m/1h/1d rollup buckets; "auto" (default)
+        serves raw rows for short ranges and otherwise the finest rollup
+        whose bucket count fits in limit
+    Rollup rows carry the bucket start as 'timestamp', averages under the
+    raw column names, plus <metric>_min/_max, samples and smoke_count.
+    The resolution used is returned in the X-Telemetry-Resolution header.
+    format=columnar returns {"columns": [...], "data": [[...], ...]}.
+    Range filters and ordering use the integer ts_ms column; rows the
+    background backfill has not converted yet sort last and are not matched
+    by t_from/t_to until it reaches them.
+    Pagination: when there are more rows, X-Next-Cursor holds a cursor for
+    the next page; send it back as cursor=. Pages are keyset seeks on
+    (ts_ms, id), or (bucket_ms, device_eui) for rollups, and keep the
+    resolution of the first page. Every page is the plain row list unless
+    paged=true, which returns {"telemetry": [...], "next_cursor": ...}
+    (null on the last page) for every page instead.
+    max_points: chart mode for one device. Up to TELEMETRY_LTTB_SOURCE_ROWS
+    of the newest rows (limit and newest_first are ignored) are reduced per
+    metric with LTTB, returning {device_eui, resolution, source_points,
+    series: {metric: {"t": [epoch ms...], "v": [...]}}} oldest first.
     """
-    dt_from = parse_iso(t_from)
-    dt_to = parse_iso(t_to)
+    ms_from = parse_time(t_from, "t_from")
+    ms_to = parse_time(t_to, "t_to")
+    order = "DESC" if newest_first else "ASC"
+    if max_points is not None:
+        if not device_eui:
+            raise HTTPException(
+                status_code=400, detail="max_points requires device_eui"
+            )
+        if cursor is not None or paged:
+            raise HTTPException(
+                status_code=400,
+                detail="max_points cannot be combined with cursor or paged",
+            )
+        limit = downsample.LTTB_SOURCE_ROWS
+        order = "DESC"
+    after = parse_cursor(cursor, "t", 4) if cursor else None
+    if after is not None:
+        if after[0] not in ("raw", *rollups.RESOLUTIONS) or after[1] != order:
+            raise HTTPException(
+                status_code=400, detail="Cursor does not match this query"
+            )
+        resolution = after[0]
+    else:
+        resolution = rollups.select_resolution(resolution, ms_from, ms_to, limit)
+    response.headers["X-Telemetry-Resolution"] = resolution
 
     clauses: List[str] = []
     params: List[object] = []
+    time_col = "ts_ms" if resolution == "raw" else "bucket_ms"
+    if resolution != "raw" and ms_from is not None:
+        # include the bucket that contains t_from
+        width = rollups.RESOLUTIONS[resolution]
+        ms_from = (ms_from // width) * width
 
     if device_eui:
         clauses.append("device_eui = ?")
         params.append(device_eui)
-    if dt_from:
-        clauses.append("timestamp >= ?")
-        params.append(dt_from.isoformat())
-    if dt_to:
-        clauses.append("timestamp <= ?")
-        params.append(dt_to.isoformat())
+    if ms_from is not None:
+        clauses.append(f"{time_col} >= ?")
+        params.append(ms_from)
+    if ms_to is not None:
+        clauses.append(f"{time_col} <= ?")
+        params.append(ms_to)
+    if (cursor is not None or paged) and resolution == "raw":
+        # unconverted rows have no keyset position
+        clauses.append("ts_ms IS NOT NULL")
+    if after is not None:
+        key = "(ts_ms, id)" if resolution == "raw" else "(bucket_ms, device_eui)"
+        clauses.append(f"{key} {'<' if order == 'DESC' else '>'} (?, ?)")
+        params.extend(after[2:])
 
     where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
-    order = "DESC" if newest_first else "ASC"
+    params.append(limit + 1)
+
+    if resolution != "raw":
+        q = rollups.query_sql(resolution, where, order)
+        columns, rows = fetch(conn, q, tuple(params))
+        key_columns = (columns.index("bucket_ms"), columns.index("device_eui"))
+    else:
+        q = f"""
+            SELECT
+              device_eui,
+              gateway_id,
+              timestamp,
+              device_timestamp,
+              latitude,
+              longitude,
+              altitude,
+              temperature_c,
+              humidity_pct,
+              battery_level,
+              smoke_detected,
+              rssi,
+              snr,
+              ts_ms,
+              id
+            FROM telemetry
+            {where}
+            ORDER BY ts_ms {order}, id {order}
+            LIMIT ?
+        """
+        columns, rows = fetch(conn, q, tuple(params))
+        # ts_ms and id are selected for the cursor only
+        key_columns = (len(columns) - 2, len(columns) - 1)
+
+    if max_points is not None:
+        rows = rows[:limit][::-1]
+        x_column = "ts_ms" if resolution == "raw" else "bucket_ms"
+        return respond(
+            {
+                "device_eui": device_eui,
+                "resolution": resolution,
+                "source_points": len(rows),
+                "series": downsample.series(
+                    columns, rows, x_column, rollups.METRICS, max_points
+                ),
+            },
+            response,
+        )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if last[key_columns[0]] is not None:
+            next_cursor = encode_cursor(
+                "t", resolution, order, *(last[i] for i in key_columns)
+            )
+            response.headers["X-Next-Cursor"] = next_cursor
+    if resolution == "raw":
+        columns = columns[:-2]
+        rows = [row[:-2] for row in rows]
+
+    body = shape(columns, rows, fmt)
+    if paged:
+        body = {"telemetry": body, "next_cursor": next_cursor}
+    return respond(body, response)
+
+
+@app.get("/telemetry/export")
+def export_telemetry(
+    _perm: None = require_permission("view_nodes"),
+    device_eui: Optional[List[str]] = Query(
+        None, description="Repeat for several devices; omit for the whole fleet"
+    ),
+    t_from: Optional[str] = Query(None, description="ISO8601 or epoch ms"),
+    t_to: Optional[str] = Query(None, description="ISO8601 or epoch ms"),
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    compress: bool = Query(False, alias="gzip"),
+):
+    """
+    Stream raw telemetry for any time range as NDJSON or CSV, optionally
+    gzipped. Rows are read in fixed-size keyset chunks, so memory use does
+    not grow with the size of the export. One device or the whole fleet is
+    ordered by time; several devices come out one after another.
+    """
+    ms_from = parse_time(t_from, "t_from")
+    ms_to = parse_time(t_to, "t_to")
+    if ms_from is not None and ms_to is not None and ms_from > ms_to:
+        raise HTTPException(status_code=400, detail="t_from is after t_to")
+
+    chunks = export.iter_telemetry(DB_PATH, device_eui, ms_from, ms_to)
+    if fmt == "csv":
+        body = csv_stream(export.TELEMETRY_COLUMNS, chunks)
+        media_type = "text/csv"
+    else:
+        body = ndjson_stream(export.TELEMETRY_COLUMNS, chunks)
+        media_type = "application/x-ndjson"
+    filename = f"telemetry.{fmt}"
+    if compress:
+        body = gzip_stream(body)
+        media_type = "application/gzip"
+        filename += ".gz"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 
+@app.get("/latest")
+def latest_all_nodes(
+    request: Request,
+    response: Response,
+    user_id: str = Depends(get_clerk_user_id),
+    _perm: None = require_permission("view_nodes"),
+    conn: pool.RequestConnection = request_conn,
+):
+    not_modified = conditional_get(
+        request, response, ("node_latest", "user_node_subscriptions"), user_id,
+        conn=conn,
+    )
+    if not_modified is not None:
+        return not_modified
+
+    device_euis = conn.execute(
+        "SELECT device_eui FROM user_node_subscriptions WHERE user_id = ?",
+        (user_id,),
+    ).fetchall()
+    device_euis = [r[0] for r in device_euis]
+    if not device_euis:
+        return []
+
+    placeholders = ",".join(["?"] * len(device_euis))
     q = f"""
         SELECT
           device_eui,
@@ -782,62 +1364,36 @@ def get_telemetry(
           smoke_detected,
           rssi,
           snr
-        FROM telemetry
-        {where}
-        ORDER BY timestamp {order}
-        LIMIT ?
+        FROM node_latest
+        WHERE device_eui IN ({placeholders})
+        ORDER BY device_eui
     """
-
-    params.append(limit)
-
-    with db() as conn:
-        rows = conn.execute(q, tuple(params)).fetchall()
+    rows = conn.execute(q, tuple(device_euis)).fetchall()
     return [dict(r) for r in rows]
 
 
-@app.get("/latest")
-def latest_all_nodes(
-    user_id: str = Depends(get_clerk_user_id),
+@app.get("/summary")
+def summary_all_nodes(
+    request: Request,
+    response: Response,
     _perm: None = require_permission("view_nodes"),
+    since: Optional[int] = Query(
+        None, ge=0, description="Cursor from a previous since= response"
+    ),
+    fmt: str = Query("rows", alias="format", pattern=FORMAT_PATTERN),
+    conn: pool.RequestConnection = request_conn,
 ):
-    with db() as conn:
-        device_euis = conn.execute(
-            "SELECT device_eui FROM user_node_subscriptions WHERE user_id = ?",
-            (user_id,),
-        ).fetchall()
-        device_euis = [r[0] for r in device_euis]
-        if not device_euis:
-            return []
-
-        placeholders = ",".join(["?"] * len(device_euis))
-        q = f"""
-            SELECT
-              device_eui,
-              gateway_id,
-              timestamp,
-              device_timestamp,
-              latitude,
-              longitude,
-              altitude,
-              temperature_c,
-              humidity_pct,
-              battery_level,
-              smoke_detected,
-              rssi,
-              snr
-            FROM latest_telemetry
-            WHERE device_eui IN ({placeholders})
-            ORDER BY device_eui
-        """
-        rows = conn.execute(q, tuple(device_euis)).fetchall()
-    return [dict(r) for r in rows]
-
-
-@app.get("/summary")
-def summary_all_nodes(_perm: None = require_permission("view_nodes")):
     """
     Compact payload for map: latest row per device.
+    With since=<cursor>, returns {cursor, reset, nodes} holding only nodes
+    whose state changed after the cursor; reset=true means the cursor had
+    expired and nodes is the full list.
+    format=columnar returns each row list as {"columns", "data"}.
     """
+    not_modified = conditional_get(request, response, ("node_latest",), conn=conn)
+    if not_modified is not None:
+        return not_modified
+
     q = """
         SELECT
           device_eui,
@@ -848,39 +1404,112 @@ def summary_all_nodes(_perm: None = require_permission("view_nodes")):
           humidity_pct,
           battery_level,
           smoke_detected
-        FROM latest_telemetry
+        FROM node_latest
+        {where}
         ORDER BY device_eui
     """
-    with db() as conn:
-        rows = conn.execute(q).fetchall()
-    return [dict(r) for r in rows]
+
+    def build():
+        if since is None:
+            columns, rows = fetch(conn, q.format(where=""))
+            return shape(columns, rows, fmt)
+
+        cursor = events.head(conn)
+        reset = not events.covers(conn, since, cursor)
+        if reset:
+            columns, rows = fetch(conn, q.format(where=""))
+        else:
+            columns, rows = fetch(
+                conn,
+                q.format(where="""
+                    WHERE device_eui IN (
+                      SELECT device_eui FROM events
+                      WHERE kind = 'node' AND id > ? AND id <= ?
+                    )
+                """),
+                (since, cursor),
+            )
+        return {"cursor": cursor, "reset": reset, "nodes": shape(columns, rows, fmt)}
+
+    return cached(request, response, build)
 
 
 @app.get("/map/nodes")
 def map_nodes(
+    request: Request,
+    response: Response,
     _perm: None = require_permission("view_nodes"),
     min_lat: Optional[float] = Query(None),
     max_lat: Optional[float] = Query(None),
     min_lon: Optional[float] = Query(None),
     max_lon: Optional[float] = Query(None),
     limit: int = Query(5000, ge=1, le=10000),
+    fmt: str = Query("rows", alias="format", pattern=FORMAT_PATTERN),
+    conn: pool.RequestConnection = request_conn,
 ):
     """
     Compact payload for map with optional viewport filtering.
+    Viewport queries go through the node_positions R*Tree; a missing pair
+    of bounds leaves that axis unbounded.
+    format=columnar returns {"columns": [...], "data": [[...], ...]}.
     """
-    clauses: List[str] = []
-    params: List[object] = []
+    # node_positions is written together with node_latest
+    not_modified = conditional_get(request, response, ("node_latest",), conn=conn)
+    if not_modified is not None:
+        return not_modified
+    if all(v is None for v in (min_lat, max_lat, min_lon, max_lon)):
+        q = """
+            SELECT
+              device_eui,
+              timestamp,
+              latitude,
+              longitude,
+              temperature_c,
+              humidity_pct,
+              battery_level,
+              smoke_detected
+            FROM node_latest
+            ORDER BY device_eui
+            LIMIT ?
+        """
+        params: tuple = (limit,)
+    else:
+        lat_set = min_lat is not None and max_lat is not None
+        lon_set = min_lon is not None and max_lon is not None
+        q = spatial.BBOX_SQL
+        params = spatial.bbox_params(
+            min_lat if lat_set else -90.0,
+            max_lat if lat_set else 90.0,
+            min_lon if lon_set else -180.0,
+            max_lon if lon_set else 180.0,
+            limit,
+        )
 
-    if min_lat is not None and max_lat is not None:
-        clauses.append("latitude BETWEEN ? AND ?")
-        params += [min_lat, max_lat]
-    if min_lon is not None and max_lon is not None:
-        clauses.append("longitude BETWEEN ? AND ?")
-        params += [min_lon, max_lon]
+    def build():
+        columns, rows = fetch(conn, q, params)
+        return shape(columns, rows, fmt)
 
-    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return cached(request, response, build)
 
-    q = f"""
+
+@app.get("/map/nodes/nearest")
+def nearest_nodes(
+    _perm: None = require_permission("view_nodes"),
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    n: int = Query(10, ge=1, le=100),
+    conn: pool.RequestConnection = request_conn,
+):
+    """
+    The n nodes closest to (lat, lon), nearest first, with distance_km and
+    the same fields as /map/nodes.
+    """
+    hits = spatial.nearest(conn, lat, lon, n)
+    if not hits:
+        return []
+    marks = ", ".join("?" for _ in hits)
+    rows = conn.execute(
+        f"""
         SELECT
           device_eui,
           timestamp,
@@ -890,16 +1519,63 @@ def map_nodes(
           humidity_pct,
           battery_level,
           smoke_detected
-        FROM latest_telemetry
-        {where}
-        ORDER BY device_eui
-        LIMIT ?
-    """
-    params.append(limit)
+        FROM node_latest
+        WHERE device_eui IN ({marks})
+        """,
+        [h["device_eui"] for h in hits],
+    ).fetchall()
+    by_eui = {r["device_eui"]: dict(r) for r in rows}
+    return [
+        {**by_eui[h["device_eui"]], "distance_km": h["distance_km"]}
+        for h in hits
+        if h["device_eui"] in by_eui
+    ]
 
-    with db() as conn:
-        rows = conn.execute(q, tuple(params)).fetchall()
-    return [dict(r) for r in rows]
+
+@app.get("/stream")
+async def stream(
+    _perm: None = require_permission("view_nodes"),
+    user_id: str = Depends(get_clerk_user_id),
+    device_eui: Optional[str] = Query(None),
+    subscribed: bool = Query(False),
+    last_event_id: Optional[int] = Query(None, ge=0),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    """
+    Server-Sent Events of node state changes ("node": the node_latest row)
+    and new alerts ("alert": the alerts row). Each event id is a cursor:
+    reconnecting with Last-Event-ID (or ?last_event_id=) resumes after it,
+    otherwise only events from now on are sent. A cursor older than the
+    retained events gets a "reset" event ({"cursor": id}) instead of the
+    missed ones: refetch current state, then keep reading the stream.
+    """
+    cursor = last_event_id
+    if last_event_id_header is not None and last_event_id_header.strip():
+        if not last_event_id_header.strip().isdigit():
+            raise HTTPException(
+                status_code=400, detail="Last-Event-ID must be an event id"
+            )
+        cursor = int(last_event_id_header)
+
+    device_euis: Optional[set[str]] = {device_eui} if device_eui else None
+    if subscribed:
+        def _subscriptions():
+            with db(readonly=True) as conn:
+                return {
+                    r[0] for r in conn.execute(
+                        "SELECT device_eui FROM user_node_subscriptions "
+                        "WHERE user_id = ?",
+                        (user_id,),
+                    )
+                }
+        subs = await run_in_threadpool(_subscriptions)
+        device_euis = subs if device_euis is None else device_euis & subs
+
+    return StreamingResponse(
+        events.sse(events.get_hub(DB_PATH), cursor, device_euis),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # -------------------------
@@ -908,12 +1584,14 @@ def map_nodes(
 
 
 @app.get("/org/role-settings")
-def get_org_role_settings(org_id: str = Depends(require_org_admin)):
-    with db() as conn:
-        rows = conn.execute(
-            "SELECT clerk_role, permission FROM org_role_settings WHERE org_id = ?",
-            (org_id,),
-        ).fetchall()
+def get_org_role_settings(
+    org_id: str = Depends(require_org_admin),
+    conn: pool.RequestConnection = request_conn,
+):
+    rows = conn.execute(
+        "SELECT clerk_role, permission FROM org_role_settings WHERE org_id = ?",
+        (org_id,),
+    ).fetchall()
     result: dict[str, list[str]] = {}
     for row in rows:
         result.setdefault(row["clerk_role"], []).append(row["permission"])
@@ -921,7 +1599,7 @@ def get_org_role_settings(org_id: str = Depends(require_org_admin)):
 
 
 @app.put("/org/role-settings/{clerk_role}")
-def update_org_role_settings(
+async def update_org_role_settings(
     clerk_role: str,
     body: RoleSettingsUpdate,
     org_id: str = Depends(require_org_admin),
@@ -933,74 +1611,77 @@ def update_org_role_settings(
         )
 
     new_perms = set(body.permissions)
-    with db() as conn:
-        old_perms = {
-            row["permission"]
-            for row in conn.execute(
-                "SELECT permission FROM org_role_settings "
-                "WHERE org_id = ? AND clerk_role = ?",
-                (org_id, clerk_role),
-            ).fetchall()
-        }
 
-        conn.execute(
-            "DELETE FROM org_role_settings WHERE org_id = ? AND clerk_role = ?",
-            (org_id, clerk_role),
-        )
-        for perm in new_perms:
+    def _replace_settings():
+        with db() as conn:
+            old_perms = {
+                row["permission"]
+                for row in conn.execute(
+                    "SELECT permission FROM org_role_settings "
+                    "WHERE org_id = ? AND clerk_role = ?",
+                    (org_id, clerk_role),
+                ).fetchall()
+            }
+
             conn.execute(
-                "INSERT INTO org_role_settings "
-                "(org_id, clerk_role, permission) VALUES (?, ?, ?)",
-                (org_id, clerk_role, perm),
+                "DELETE FROM org_role_settings WHERE org_id = ? AND clerk_role = ?",
+                (org_id, clerk_role),
             )
-        conn.commit()
+            for perm in new_perms:
+                conn.execute(
+                    "INSERT INTO org_role_settings "
+                    "(org_id, clerk_role, permission) VALUES (?, ?, ?)",
+                    (org_id, clerk_role, perm),
+                )
+            conn.commit()
+        _permission_cache.set((org_id, clerk_role), permission_mask(new_perms))
+        return old_perms
+
+    old_perms = await run_in_threadpool(_replace_settings)
 
     subscribe_revoked = (
         "subscribe_nodes" in old_perms and "subscribe_nodes" not in new_perms
     )
-    if subscribe_revoked and CLERK_SECRET_KEY:
+    if subscribe_revoked and clerk.configured:
         try:
-            r = requests.get(
-                f"https://api.clerk.com/v1/organizations/{org_id}/memberships",
-                params={"limit": 500},
-                headers={"Authorization": f"Bearer {CLERK_SECRET_KEY}"},
-                timeout=10,
-            )
-            if r.status_code == 200:
-                affected_user_ids = [
-                    m["public_user_data"]["user_id"]
-                    for m in r.json().get("data", [])
-                    if m.get("role") == clerk_role
-                ]
-                if affected_user_ids:
-                    uid_params = [(uid,) for uid in affected_user_ids]
-                    with db() as conn:
-                        conn.executemany(
-                            "DELETE FROM user_node_subscriptions WHERE user_id = ?",
-                            uid_params,
-                        )
-                        conn.executemany(
-                            "DELETE FROM alert_preferences WHERE user_id = ?",
-                            uid_params,
-                        )
-                        conn.commit()
-                    log.info(
-                        "Auto-unsubscribed %d user(s) in org %s "
-                        "(role %s lost subscribe_nodes); "
-                        "removed matching alert preferences",
-                        len(affected_user_ids),
-                        org_id,
-                        clerk_role,
+            members = await clerk.org_memberships(org_id, limit=500)
+        except ClerkError as e:
+            log.warning("Could not fetch org members to auto-unsubscribe: %s", e)
+            members = []
+        affected_user_ids = [
+            m["public_user_data"]["user_id"]
+            for m in members
+            if m.get("role") == clerk_role
+        ]
+        if affected_user_ids:
+            uid_params = [(uid,) for uid in affected_user_ids]
+
+            def _unsubscribe():
+                with db() as conn:
+                    conn.executemany(
+                        "DELETE FROM user_node_subscriptions WHERE user_id = ?",
+                        uid_params,
                     )
-            else:
-                log.warning(
-                    "Could not fetch org members to auto-unsubscribe: " "status=%s",
-                    r.status_code,
+                    conn.executemany(
+                        "DELETE FROM alert_preferences WHERE user_id = ?",
+                        uid_params,
+                    )
+                    conn.commit()
+
+            try:
+                await run_in_threadpool(_unsubscribe)
+                log.info(
+                    "Auto-unsubscribed %d user(s) in org %s "
+                    "(role %s lost subscribe_nodes); "
+                    "removed matching alert preferences",
+                    len(affected_user_ids),
+                    org_id,
+                    clerk_role,
+                )
+            except Exception:
+                log.exception(
+                    "Failed to auto-unsubscribe users after subscribe_nodes revocation"
                 )
-        except Exception:
-            log.exception(
-                "Failed to auto-unsubscribe users after subscribe_nodes revocation"
-            )
 
     return {
         "org_id": org_id,
@@ -1015,24 +1696,26 @@ def get_my_permissions(permissions: set = Depends(get_org_permissions)):
 
 
 @app.get("/org/roles")
-def list_org_roles(org_id: str = Depends(require_org_admin)):
-    with db() as conn:
-        roles = conn.execute(
-            """
-            SELECT id, org_id, name, description, is_default, created_at
-            FROM org_roles WHERE org_id = ? ORDER BY name
-            """,
-            (org_id,),
+def list_org_roles(
+    org_id: str = Depends(require_org_admin),
+    conn: pool.RequestConnection = request_conn,
+):
+    roles = conn.execute(
+        """
+        SELECT id, org_id, name, description, is_default, created_at
+        FROM org_roles WHERE org_id = ? ORDER BY name
+        """,
+        (org_id,),
+    ).fetchall()
+    result = []
+    for role in roles:
+        perms = conn.execute(
+            "SELECT permission FROM org_role_permissions WHERE role_id = ?",
+            (role["id"],),
         ).fetchall()
-        result = []
-        for role in roles:
-            perms = conn.execute(
-                "SELECT permission FROM org_role_permissions WHERE role_id = ?",
-                (role["id"],),
-            ).fetchall()
-            result.append(
-                {**dict(role), "permissions": [p["permission"] for p in perms]}
-            )
+        result.append(
+            {**dict(role), "permissions": [p["permission"] for p in perms]}
+        )
     return result
 
 
@@ -1200,45 +1883,42 @@ def remove_role_permission(
 
 
 @app.get("/org/members")
-def list_org_members(org_id: str = Depends(require_org_admin)):
-    if not CLERK_SECRET_KEY:
+async def list_org_members(org_id: str = Depends(require_org_admin)):
+    if not clerk.configured:
         raise HTTPException(status_code=500, detail="Missing CLERK_SECRET_KEY")
-    r = requests.get(
-        f"https://api.clerk.com/v1/organizations/{org_id}/memberships?limit=100",
-        headers={"Authorization": f"Bearer {CLERK_SECRET_KEY}"},
-        timeout=10,
-    )
-    if r.status_code != 200:
-        log.warning(
-            "Clerk org memberships error: status=%s body=%s",
-            r.status_code,
-            r.text[:200],
-        )
+    try:
+        clerk_members = await clerk.org_memberships(org_id, limit=100)
+    except ClerkUnavailable:
+        raise HTTPException(status_code=503, detail="Clerk is unavailable")
+    except ClerkError as e:
         raise HTTPException(
             status_code=502,
-            detail=f"Failed to fetch org members from Clerk (status {r.status_code})",
+            detail=f"Failed to fetch org members from Clerk (status {e.status})",
         )
-    clerk_members = r.json().get("data", [])
 
-    with db() as conn:
-        member_role_rows = conn.execute(
-            """
-            SELECT mr.user_id, mr.role_id, r.name AS role_name,
-                   r.description AS role_description, r.is_default
-            FROM org_member_roles mr
-            JOIN org_roles r ON r.id = mr.role_id
-            WHERE mr.org_id = ?
-            """,
-            (org_id,),
-        ).fetchall()
-        role_map = {row["user_id"]: dict(row) for row in member_role_rows}
-        perm_map: dict[str, list[str]] = {}
-        for row in member_role_rows:
-            perms = conn.execute(
-                "SELECT permission FROM org_role_permissions WHERE role_id = ?",
-                (row["role_id"],),
+    def _member_roles():
+        with db(readonly=True) as conn:
+            member_role_rows = conn.execute(
+                """
+                SELECT mr.user_id, mr.role_id, r.name AS role_name,
+                       r.description AS role_description, r.is_default
+                FROM org_member_roles mr
+                JOIN org_roles r ON r.id = mr.role_id
+                WHERE mr.org_id = ?
+                """,
+                (org_id,),
             ).fetchall()
-            perm_map[row["user_id"]] = [p["permission"] for p in perms]
+            role_map = {row["user_id"]: dict(row) for row in member_role_rows}
+            perm_map: dict[str, list[str]] = {}
+            for row in member_role_rows:
+                perms = conn.execute(
+                    "SELECT permission FROM org_role_permissions WHERE role_id = ?",
+                    (row["role_id"],),
+                ).fetchall()
+                perm_map[row["user_id"]] = [p["permission"] for p in perms]
+        return role_map, perm_map
+
+    role_map, perm_map = await run_in_threadpool(_member_roles)
 
     result = []
     for m in clerk_members:
@@ -1335,6 +2015,58 @@ def _verify_github_signature(body: bytes, signature: str) -> bool:
     return hmac.compare_digest(expected, signature)
 
 
+INGEST_SECRET = os.getenv("INGEST_SECRET", "").encode()
+
+
+def _verify_ingest_signature(body: bytes, signature: str) -> bool:
+    expected = "sha256=" + hmac.new(INGEST_SECRET, body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def _ingest_uplinks(rows: list[dict]) -> None:
+    try:
+        inserted = data_listener.ingest(rows, DB_PATH)
+        data_listener.run_alerts(inserted)
+        log.info(
+            "Ingested %d pushed uplink(s), skipped %d duplicate(s)",
+            len(inserted),
+            len(rows) - len(inserted),
+        )
+    except Exception:
+        log.exception("Failed to ingest pushed uplinks")
+
+
+@app.post("/ingest/uplinks", status_code=202)
+async def ingest_uplinks(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    event: Optional[str] = Query(None),
+):
+    """
+    Push ingestion for ChirpStack-style uplink events (single object or list).
+    Signed with X-Ingest-Signature: sha256=HMAC(INGEST_SECRET, body).
+    Rows are stored and evaluated for alerts after the response is sent.
+    """
+    if not INGEST_SECRET:
+        raise HTTPException(status_code=503, detail="Ingest endpoint not configured")
+    body = await request.body()
+    signature = request.headers.get("x-ingest-signature", "")
+    if not signature or not _verify_ingest_signature(body, signature):
+        raise HTTPException(status_code=403, detail="Invalid signature")
+    # ChirpStack's HTTP integration posts every event type to the same URL
+    if event is not None and event != "up":
+        return {"message": "Event ignored", "accepted": 0}
+    try:
+        payload = json.loads(body)
+        objs = payload if isinstance(payload, list) else [payload]
+        rows = data_listener.extract_rows(objs)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid uplink payload")
+    if rows:
+        background_tasks.add_task(_ingest_uplinks, rows)
+    return {"message": "Accepted", "accepted": len(rows)}
+
+
 def _restart_backend():
     venv_python = os.path.join(BACKEND_DIR, "venv", "bin", "python")
     python = venv_python if os.path.exists(venv_python) else "python3"
@@ -0,0 +1,297 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+from ttl_cache import TTLCache
+
+log = logging.getLogger("clerk_client")
+
+CLERK_API_URL = os.getenv("CLERK_API_URL", "https://api.clerk.com/v1")
+CLERK_TIMEOUT_SECONDS = float(os.getenv("CLERK_TIMEOUT_SECONDS", "5"))
+CLERK_MAX_CONNECTIONS = int(os.getenv("CLERK_MAX_CONNECTIONS", "20"))
+CLERK_CACHE_SIZE = int(os.getenv("CLERK_CACHE_SIZE", "4096"))
+CLERK_CACHE_TTL_SECONDS = float(os.getenv("CLERK_CACHE_TTL_SECONDS", "300"))
+CLERK_NEGATIVE_TTL_SECONDS = float(os.getenv("CLERK_NEGATIVE_TTL_SECONDS", "30"))
+CLERK_SLOW_CALL_SECONDS = float(os.getenv("CLERK_SLOW_CALL_SECONDS", "2"))
+CLERK_BREAKER_FAILURES = int(os.getenv("CLERK_BREAKER_FAILURES", "5"))
+CLERK_BREAKER_RESET_SECONDS = float(os.getenv("CLERK_BREAKER_RESET_SECONDS", "30"))
+
+_MISSING = object()
+
+
+class ClerkError(Exception):
+    """A Clerk API call failed; status is None when no response came back."""
+
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+
+class ClerkUnavailable(ClerkError):
+    """The circuit breaker is open, so the call was not attempted."""
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through, and `failures` consecutive failed or slow
+    calls open the breaker. Open: calls are refused for `reset_seconds`.
+    Half-open: then a single trial call goes through; its success closes
+    the breaker and its failure opens it again.
+    """
+
+    def __init__(self, failures: int, reset_seconds: float):
+        self.threshold = max(1, failures)
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return "open"
+            return "half_open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self._trial = True
+            return True
+
+    def release(self) -> None:
+        """End a trial call that was abandoned without an outcome."""
+        with self._lock:
+            self._trial = False
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._trial = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is None and self.failures >= self.threshold:
+                log.warning("Clerk circuit breaker opened after %d failures",
+                            self.failures)
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+def _primary_email(user: dict[str, Any]) -> str | None:
+    """The user's primary email address, else the first one, else None."""
+    emails = user.get("email_addresses") or []
+    primary_id = user.get("primary_email_address_id")
+    if primary_id:
+        for e in emails:
+            if e.get("id") == primary_id:
+                return e.get("email_address")
+    if emails:
+        return emails[0].get("email_address")
+    return None
+
+
+class ClerkClient:
+    """
+    Async Clerk backend API client shared by all requests of a worker.
+
+    Calls go through one pooled httpx.AsyncClient with keep-alive. At most
+    `max_connections` are in flight; further calls queue for a connection
+    within the same timeout. Waiting for Clerk holds no threadpool thread.
+    User lookups are cached in a bounded LRU: answers for
+    CLERK_CACHE_TTL_SECONDS, failures for CLERK_NEGATIVE_TTL_SECONDS.
+    Concurrent lookups of the same key share one call. Calls that fail with
+    a network error, 429 or 5xx, or that take longer than
+    CLERK_SLOW_CALL_SECONDS, count towards a circuit breaker. While it is
+    open, calls raise ClerkUnavailable at once.
+    """
+
+    def __init__(
+        self,
+        secret_key: str | None,
+        base_url: str = CLERK_API_URL,
+        timeout: float = CLERK_TIMEOUT_SECONDS,
+        max_connections: int = CLERK_MAX_CONNECTIONS,
+        cache_size: int = CLERK_CACHE_SIZE,
+        cache_ttl: float = CLERK_CACHE_TTL_SECONDS,
+        negative_ttl: float = CLERK_NEGATIVE_TTL_SECONDS,
+        slow_call_seconds: float = CLERK_SLOW_CALL_SECONDS,
+        breaker_failures: int = CLERK_BREAKER_FAILURES,
+        breaker_reset_seconds: float = CLERK_BREAKER_RESET_SECONDS,
+    ):
+        self.secret_key = secret_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_connections = max(1, max_connections)
+        self.negative_ttl = negative_ttl
+        self.slow_call_seconds = slow_call_seconds
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset_seconds)
+        self._http: httpx.AsyncClient | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._inflight: dict[tuple, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self.counters = {
+            "calls": 0, "failures": 0, "slow": 0, "rejected": 0, "coalesced": 0,
+        }
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.secret_key)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._loop is not loop:
+            # pooled connections and pending lookups belong to one event loop
+            self._loop = loop
+            self._inflight = {}
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.secret_key}"},
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            http, self._http = self._http, None
+            await http.aclose()
+
+    async def _get(self, path: str, params: dict | None = None) -> Any:
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise ClerkUnavailable("Clerk circuit breaker is open")
+        self._count("calls")
+        started = time.monotonic()
+        try:
+            r = await self._client().get(path, params=params)
+        except Exception as e:
+            # every outcome must be recorded, or a half-open trial never ends
+            self._count("failures")
+            self.breaker.record(False)
+            if isinstance(e, httpx.HTTPError):
+                raise ClerkError(f"Clerk request failed: {e!r}") from e
+            raise
+        except BaseException:
+            # cancelled or interrupted: says nothing about Clerk's health
+            self.breaker.release()
+            raise
+
+        slow = time.monotonic() - started > self.slow_call_seconds
+        healthy = r.status_code < 500 and r.status_code != 429
+        data = invalid = None
+        if r.status_code == 200:
+            try:
+                data = r.json()
+            except ValueError as e:
+                healthy, invalid = False, e
+            else:
+                # every endpoint used here answers with a JSON object
+                if not isinstance(data, dict):
+                    healthy = False
+                    invalid = TypeError(f"got {type(data).__name__}")
+        if slow:
+            self._count("slow")
+        if not healthy:
+            self._count("failures")
+        self.breaker.record(healthy and not slow)
+        if invalid is not None:
+            raise ClerkError(
+                "Clerk returned a body that is not a JSON object", r.status_code
+            ) from invalid
+        if r.status_code != 200:
+            log.warning(
+                "Clerk API error: path=%s status=%s body=%s",
+                path, r.status_code, r.text[:200],
+            )
+            raise ClerkError(f"Clerk returned status {r.status_code}", r.status_code)
+        return data
+
+    async def _load(self, key: tuple, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            try:
+                value, ttl = await fetch(), None
+            except ClerkUnavailable:
+                raise
+            except ClerkError as e:
+                value, ttl = e, self.negative_ttl
+            self.cache.set(key, value, ttl)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _cached(self, key: tuple, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.cache.get(key, _MISSING)
+        if value is _MISSING:
+            self._client()
+            task = self._inflight.get(key)
+            if task is None:
+                task = self._inflight[key] = asyncio.ensure_future(
+                    self._load(key, fetch)
+                )
+            else:
+                self._count("coalesced")
+            # a caller that goes away does not cancel the lookup others await
+            value = await asyncio.shield(task)
+        if isinstance(value, ClerkError):
+            raise ClerkError(str(value), value.status)
+        return value
+
+    async def user_email(self, user_id: str) -> str | None:
+        """Primary email of a Clerk user; None if the user has no email."""
+        async def fetch():
+            return _primary_email(await self._get(f"/users/{user_id}"))
+
+        return await self._cached(("email", user_id), fetch)
+
+    async def org_role(self, user_id: str, org_id: str) -> str | None:
+        """The user's role in `org_id`, None when not a member."""
+        async def fetch():
+            data = await self._get(
+                f"/users/{user_id}/organization_memberships", {"limit": 50}
+            )
+            return {
+                m.get("organization", {}).get("id"): m.get("role")
+                for m in data.get("data", [])
+            }
+
+        return (await self._cached(("memberships", user_id), fetch)).get(org_id)
+
+    async def org_memberships(self, org_id: str, limit: int = 100) -> list[dict]:
+        """Current members of an organization; not cached."""
+        data = await self._get(
+            f"/organizations/{org_id}/memberships", {"limit": limit}
+        )
+        return data.get("data", [])
+
+    def forget_user(self, user_id: str | None) -> None:
+        """Drop cached lookups for a user, or for everyone when None."""
+        if user_id is None:
+            self.cache.clear()
+        else:
+            self.cache.discard(lambda key: key[1] == user_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        return {**counters, **self.cache.counters, "breaker": self.breaker.state}
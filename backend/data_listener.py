@@ -1,9 +1,14 @@
 import os
 import time
-import sqlite3
+import asyncio
+import logging
 import datetime
+import threading
 import requests
+from collections import OrderedDict
 from dotenv import load_dotenv
+from storage import pool, retention, rollups, spatial, timestamps, writer
+from storage.timestamps import to_epoch_ms
 from alerts.cooldown import can_send
 from alerts.engine import process_row_for_alerts
 
@@ -13,6 +18,67 @@ load_dotenv(os.path.join(HERE, ".env"))
 API_URL = os.getenv("LIVE_URL", "https://lora.derekrgreene.com/api/live")
 DB_NAME = os.getenv("DB_NAME") or "lora.db"
 DB_PATH = os.path.join(HERE, DB_NAME)
+DEDUP_CACHE_SIZE = int(os.getenv("INGEST_DEDUP_CACHE_SIZE", "4096"))
+POLL_SECONDS = float(os.getenv("LIVE_POLL_SECONDS", "3"))
+
+# "poll" runs fetch/parse/write/alert back to back; "pipeline" overlaps them;
+# "push" is for when uplinks arrive via POST /ingest/uplinks and only polls
+# occasionally as a safety net (duplicates are skipped either way)
+LISTENER_MODE = os.getenv("LISTENER_MODE", "poll").strip().lower()
+PUSH_FALLBACK_POLL_SECONDS = float(os.getenv("PUSH_FALLBACK_POLL_SECONDS", "60"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+PIPELINE_STATS_SECONDS = float(os.getenv("PIPELINE_STATS_SECONDS", "60"))
+
+
+class IngestStats:
+    """Running counters for the ingestion path (thread-safe)."""
+
+    FIELDS = ("received", "inserted", "duplicates_cached", "duplicates_db", "dropped")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def as_dict(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+class RecentUplinks:
+    """
+    Bounded LRU of uplink keys that are already stored, so repeats served by
+    the live API are skipped before any SQL runs.
+    """
+
+    def __init__(self, maxsize=DEDUP_CACHE_SIZE):
+        self.maxsize = max(1, maxsize)
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            if key not in self._keys:
+                return False
+            self._keys.move_to_end(key)
+            return True
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key):
+        with self._lock:
+            self._keys[key] = None
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+
+
+stats = IngestStats()
+recent_uplinks = RecentUplinks()
 
 
 def parse_rfc3339(dt_str):
@@ -37,13 +103,14 @@ def fetch_live():
 
 def extract_rows(objs):
     rows = []
-    seen_euis = set()
     for o in objs:
+        stats.incr("received")
         device_eui = (o.get("deviceInfo") or {}).get("devEui")
-        if not device_eui or device_eui in seen_euis:
+        if not device_eui:
+            stats.incr("dropped")
             continue
-        seen_euis.add(device_eui)
         node_id = o.get("devAddr")
+        f_cnt = o.get("fCnt")
         ts_network = parse_rfc3339(o.get("time"))
 
         rx = (o.get("rxInfo") or [])
@@ -64,10 +131,18 @@ def extract_rows(objs):
         temperature_c = (float(temp_raw) / 100.0) if temp_raw is not None else None
         ts_device = parse_unix_epoch(obj.get("timestamp"))
 
+        # telemetry.timestamp is the uplink identity; fall back to device time
+        if ts_network is None:
+            ts_network = ts_device
+        if ts_network is None:
+            stats.incr("dropped")
+            continue
+
         rows.append({
             "node_id": node_id,
             "device_eui": device_eui,
             "gateway_id": gateway_id,
+            "f_cnt": f_cnt,
             "timestamp": ts_network,
             "device_timestamp": ts_device,
             "lat": lat, "lon": lon, "alt": alt,
@@ -84,23 +159,37 @@ def _to_iso(dt):
     return dt.isoformat() if isinstance(dt, datetime.datetime) else None
 
 
+def uplink_key(row):
+    """
+    Identity of an uplink: device plus network receive time, as the ISO
+    string ux_telemetry_uplink compares, so both layers agree on repeats.
+    """
+    return (row["device_eui"], _to_iso(row["timestamp"]))
+
+
 def upsert(conn, rows):
     cur = conn.cursor()
 
-    # Nodes upsert (SQLite ON CONFLICT)
+    # Nodes upsert; replayed or late uplinks never move last_seen backwards
     node_values = []
     for r in rows:
         if r["device_eui"]:
-            node_values.append((r["device_eui"], r["node_id"], _to_iso(r["timestamp"])))
+            node_values.append((
+                r["device_eui"], r["node_id"],
+                _to_iso(r["timestamp"]), to_epoch_ms(r["timestamp"]),
+            ))
 
     if node_values:
         conn.executemany(
             """
-            INSERT INTO nodes (device_eui, node_id, last_seen)
-            VALUES (?, ?, ?)
+            INSERT INTO nodes (device_eui, node_id, last_seen, last_seen_ms)
+            VALUES (?, ?, ?, ?)
             ON CONFLICT(device_eui) DO UPDATE SET
               node_id = excluded.node_id,
-              last_seen  = excluded.last_seen;
+              last_seen  = excluded.last_seen,
+              last_seen_ms = excluded.last_seen_ms
+            WHERE nodes.last_seen_ms IS NULL
+               OR excluded.last_seen_ms >= nodes.last_seen_ms;
             """, node_values)
 
     # Gateways insert-ignore
@@ -112,31 +201,142 @@ def upsert(conn, rows):
             ON CONFLICT(gateway_id) DO NOTHING;
         """, gw_values)
 
-    # Telemetry insert (bulk)
+    # Telemetry insert; the unique (device_eui, timestamp) index drops repeats
+    inserted = []
     tel_values = []
     for r in rows:
-        tel_values.append((
-            r["device_eui"], r["gateway_id"], _to_iso(r["timestamp"]),
-            _to_iso(r["device_timestamp"]),
+        values = (
+            r["device_eui"], r["gateway_id"], r.get("f_cnt"),
+            _to_iso(r["timestamp"]), _to_iso(r["device_timestamp"]),
+            to_epoch_ms(r["timestamp"]), to_epoch_ms(r["device_timestamp"]),
             r["lat"], r["lon"], r["alt"],
             r["temperature_c"], r["humidity_pct"], r["battery_level"],
             r["rssi"], r["snr"], r["smoke_detected"]
-        ))
+        )
+        cur.execute("""
+            INSERT INTO telemetry
+              (device_eui, gateway_id, f_cnt, timestamp, device_timestamp,
+               ts_ms, device_ts_ms,
+               latitude, longitude, altitude,
+               temperature_c, humidity_pct, battery_level,
+               rssi, snr, smoke_detected)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(device_eui, timestamp) DO NOTHING
+        """, values)
+        if cur.rowcount:
+            inserted.append(r)
+            tel_values.append(values[:2] + values[3:])
 
     if tel_values:
+        # Latest-state upsert; older rows in the batch never overwrite newer ones
         cur.executemany("""
-            INSERT INTO telemetry
+            INSERT INTO node_latest
               (device_eui, gateway_id, timestamp, device_timestamp,
+               ts_ms, device_ts_ms,
                latitude, longitude, altitude,
                temperature_c, humidity_pct, battery_level,
                rssi, snr, smoke_detected)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(device_eui) DO UPDATE SET
+              gateway_id = excluded.gateway_id,
+              timestamp = excluded.timestamp,
+              device_timestamp = excluded.device_timestamp,
+              ts_ms = excluded.ts_ms,
+              device_ts_ms = excluded.device_ts_ms,
+              latitude = excluded.latitude,
+              longitude = excluded.longitude,
+              altitude = excluded.altitude,
+              temperature_c = excluded.temperature_c,
+              humidity_pct = excluded.humidity_pct,
+              battery_level = excluded.battery_level,
+              rssi = excluded.rssi,
+              snr = excluded.snr,
+              smoke_detected = excluded.smoke_detected
+            WHERE node_latest.ts_ms IS NULL OR excluded.ts_ms >= node_latest.ts_ms;
         """, tel_values)
+        # keep the R*Tree in step with positions that moved
+        spatial.sync_positions(conn, [v[0] for v in tel_values])
 
+    rollups.apply(conn, inserted)
     conn.commit()
+    stats.incr("inserted", len(inserted))
+    stats.incr("duplicates_db", len(rows) - len(inserted))
+    return inserted
+
+
+def ingest(rows, db_path=None):
+    """
+    Store rows exactly once. Keys seen recently are skipped without touching
+    the database; the unique index catches anything the LRU has evicted.
+    The write goes through storage.writer, so it is group-committed with
+    other writers when the single-writer service is enabled.
+    Returns the rows that were actually inserted.
+    """
+    fresh = []
+    batch_keys = set()
+    for r in rows:
+        key = uplink_key(r)
+        if key in recent_uplinks or key in batch_keys:
+            stats.incr("duplicates_cached")
+            continue
+        batch_keys.add(key)
+        fresh.append(r)
 
+    if not fresh:
+        return []
 
-def main():
+    inserted = writer.run_write(db_path or DB_PATH, lambda conn: upsert(conn, fresh))
+    for key in batch_keys:
+        recent_uplinks.add(key)
+    return inserted
+
+
+def run_alerts(rows):
+    for r in rows:
+        try:
+            process_row_for_alerts(r)
+        except Exception as alert_exc:
+            # alert engine failed; don't treat as API fetch failure
+            print("Error processing alerts for row:", alert_exc)
+
+
+def record_api_error(e):
+    # Store as a DB alert so dashboard can show API problems
+    dev_eui = "SYSTEM"
+    alert_type = "API_ERROR"
+    now_ts = int(time.time())
+    err_name = type(e).__name__
+    err_msg = str(e).replace("\n", " ").strip()
+    err_msg = err_msg[:200]
+    msg = f"Live API error fetching telemetry. {err_name}: {err_msg}"
+
+    try:
+        with pool.connect(DB_PATH) as conn:
+            if can_send(conn, dev_eui, alert_type):
+                cur = conn.cursor()
+                cur.execute(
+                    """
+                    INSERT INTO alerts (
+                        dev_eui,
+                        alert_type,
+                        message,
+                        created_at,
+                        acknowledged
+                    )
+                    VALUES (?, ?, ?, ?, 0)
+                    """,
+                    (dev_eui, alert_type, msg, now_ts),
+                )
+                conn.commit()
+    except Exception:
+        # If logging to DB fails, don't crash the listener loop
+        pass
+
+    print("Error:", e)
+
+
+def poll_loop(interval=None):
+    interval = POLL_SECONDS if interval is None else interval
     while True:
         try:
             objs = fetch_live()
@@ -145,60 +345,157 @@ def main():
             if not rows:
                 print("No data.")
             else:
-                conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-                try:
-                    conn.execute("PRAGMA foreign_keys = ON;")
-                    upsert(conn, rows)
-
-                    for r in rows:
-                        try:
-                            process_row_for_alerts(r)
-                        except Exception as alert_exc:
-                            # alert engine failed; don't treat as API fetch failure
-                            print("Error processing alerts for row:", alert_exc)
-
-                    print(f"Inserted {len(rows)} row(s).")
-                finally:
-                    conn.close()
+                inserted = ingest(rows)
+                run_alerts(inserted)
+                print(
+                    f"Inserted {len(inserted)} row(s), "
+                    f"skipped {len(rows) - len(inserted)} duplicate(s)."
+                )
         except Exception as e:
-            # Store as a DB alert so dashboard can show API problems
-            dev_eui = "SYSTEM"
-            alert_type = "API_ERROR"
-            now_ts = int(time.time())
-            err_name = type(e).__name__
-            err_msg = str(e).replace("\n", " ").strip()
-            err_msg = err_msg[:200]
-            msg = f"Live API error fetching telemetry. {err_name}: {err_msg}"
+            record_api_error(e)
+
+        time.sleep(interval)
+
+
+class Pipeline:
+    """
+    Asyncio ingestion pipeline: fetch -> parse -> persist -> alert.
+
+    Stages are joined by bounded queues, so the next poll overlaps with the
+    current write, and a slow stage pushes back on the ones before it instead
+    of letting memory grow. `blocked` records how long each producer waited on
+    a full queue. Blocking work (HTTP, SQLite, alert evaluation) runs in worker
+    threads via asyncio.to_thread using the same functions as poll_loop.
+    """
+
+    STAGES = ("fetch", "parse", "persist")
+
+    def __init__(self, queue_size=PIPELINE_QUEUE_SIZE, poll_seconds=POLL_SECONDS,
+                 fetch=None, max_polls=None):
+        self.queue_size = queue_size
+        self.poll_seconds = poll_seconds
+        self.fetch = fetch or fetch_live
+        self.max_polls = max_polls
+        self.fetched = asyncio.Queue(maxsize=queue_size)
+        self.parsed = asyncio.Queue(maxsize=queue_size)
+        self.persisted = asyncio.Queue(maxsize=queue_size)
+        self.blocked = dict.fromkeys(self.STAGES, 0.0)
+
+    async def _put(self, stage, queue, item):
+        started = time.monotonic()
+        await queue.put(item)
+        self.blocked[stage] += time.monotonic() - started
+
+    def snapshot(self):
+        return {
+            "queue_size": self.queue_size,
+            "depth": {
+                "fetched": self.fetched.qsize(),
+                "parsed": self.parsed.qsize(),
+                "persisted": self.persisted.qsize(),
+            },
+            "blocked_seconds": {k: round(v, 3) for k, v in self.blocked.items()},
+            "ingest": stats.as_dict(),
+        }
+
+    async def fetch_stage(self):
+        polls = 0
+        while self.max_polls is None or polls < self.max_polls:
+            polls += 1
+            started = time.monotonic()
+            try:
+                objs = await asyncio.to_thread(self.fetch)
+            except Exception as e:
+                await asyncio.to_thread(record_api_error, e)
+            else:
+                await self._put("fetch", self.fetched, objs)
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(max(0.0, self.poll_seconds - elapsed))
+        # None is the shutdown marker; each stage forwards it downstream
+        await self.fetched.put(None)
+
+    async def parse_stage(self):
+        while (objs := await self.fetched.get()) is not None:
+            try:
+                rows = extract_rows(objs)
+            except Exception as e:
+                # a malformed batch must not stop the other stages
+                await asyncio.to_thread(record_api_error, e)
+                continue
+            if rows:
+                await self._put("parse", self.parsed, rows)
+            else:
+                print("No data.")
+        await self.parsed.put(None)
 
+    async def persist_stage(self):
+        while (rows := await self.parsed.get()) is not None:
             try:
-                conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-                try:
-                    conn.execute("PRAGMA foreign_keys = ON;")
-                    if can_send(conn, dev_eui, alert_type):
-                        cur = conn.cursor()
-                        cur.execute(
-                            """
-                            INSERT INTO alerts (
-                                dev_eui,
-                                alert_type,
-                                message,
-                                created_at,
-                                acknowledged
-                            )
-                            VALUES (?, ?, ?, ?, 0)
-                            """,
-                            (dev_eui, alert_type, msg, now_ts),
-                        )
-                        conn.commit()
-                finally:
-                    conn.close()
-            except Exception:
-                # If logging to DB fails, don't crash the listener loop
-                pass
-
-            print("Error:", e)
-
-        time.sleep(3)
+                inserted = await asyncio.to_thread(ingest, rows)
+            except Exception as e:
+                print("Error persisting telemetry:", e)
+                continue
+            print(
+                f"Inserted {len(inserted)} row(s), "
+                f"skipped {len(rows) - len(inserted)} duplicate(s)."
+            )
+            if inserted:
+                await self._put("persist", self.persisted, inserted)
+        await self.persisted.put(None)
+
+    async def alert_stage(self):
+        while (rows := await self.persisted.get()) is not None:
+            try:
+                await asyncio.to_thread(run_alerts, rows)
+            except Exception as e:
+                # like run_alerts: alert failures are not API fetch failures
+                print("Error processing alerts:", e)
+
+    async def monitor(self, interval=PIPELINE_STATS_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            print("Pipeline:", self.snapshot())
+
+    async def run(self):
+        monitor = asyncio.create_task(self.monitor())
+        try:
+            await asyncio.gather(
+                self.fetch_stage(),
+                self.parse_stage(),
+                self.persist_stage(),
+                self.alert_stage(),
+            )
+        finally:
+            monitor.cancel()
+
+
+def backfill_history():
+    """
+    Bring rows stored by older versions up to date: epoch-ms columns first,
+    then rollups, which are built from them. Runs once at startup in the
+    background; both steps are batched and idempotent.
+    """
+    try:
+        converted = timestamps.run_backfill(DB_PATH)
+        if converted:
+            print(f"Converted {converted} row(s) to epoch-ms timestamps.")
+        buckets = rollups.run_backfill(DB_PATH)
+        if buckets:
+            print(f"Rolled up history into {buckets} minute bucket(s).")
+    except Exception as e:
+        print("Error backfilling history:", e)
+
+
+def main():
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    threading.Thread(target=backfill_history, daemon=True).start()
+    retention.start_retention(DB_PATH)
+    if LISTENER_MODE == "pipeline":
+        asyncio.run(Pipeline().run())
+    elif LISTENER_MODE == "push":
+        poll_loop(PUSH_FALLBACK_POLL_SECONDS)
+    else:
+        poll_loop()
 
 
 if __name__ == "__main__":
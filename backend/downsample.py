@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+
+# Rows /telemetry?max_points= reads before downsampling
+LTTB_SOURCE_ROWS = int(os.getenv("TELEMETRY_LTTB_SOURCE_ROWS", "20000"))
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of the n_out points Largest-Triangle-Three-Buckets keeps from
+    the series (x ascending). The first and last points are always kept;
+    each bucket in between contributes the point forming the largest
+    triangle with the previously kept point and the next bucket's mean.
+    Bucket bounds and means are computed for all buckets at once; only the
+    choice of point, which depends on the previous choice, is sequential.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # n_out - 2 buckets over the interior points 1 .. n-2
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # the point each bucket is measured against: the next bucket's mean,
+    # or the last point for the final bucket
+    cx = np.append(mean_x[1:], x[-1])
+    cy = np.append(mean_y[1:], y[-1])
+
+    keep = np.empty(n_out, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs(
+            (ax - cx[b]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy[b] - ay)
+        )
+        a = lo + int(np.argmax(area))
+        keep[b + 1] = a
+    return keep
+
+
+def series(columns: list[str], rows: list, x_column: str, metrics,
+           max_points: int) -> dict:
+    """
+    Downsample each metric of time-ordered rows to at most max_points with
+    LTTB. Rows where a metric is NULL are left out of that metric's series.
+    Returns {metric: {"t": [x...], "v": [value...]}}.
+    """
+    if not rows:
+        return {metric: {"t": [], "v": []} for metric in metrics}
+    table = np.array(rows, dtype=object)
+    x_all = table[:, columns.index(x_column)].astype(np.float64)
+    out = {}
+    for metric in metrics:
+        y = table[:, columns.index(metric)].astype(np.float64)
+        valid = ~(np.isnan(y) | np.isnan(x_all))
+        x, y = x_all[valid], y[valid]
+        keep = lttb(x, y, max_points)
+        out[metric] = {
+            "t": x[keep].astype(np.int64).tolist(),
+            "v": y[keep].tolist(),
+        }
+    return out
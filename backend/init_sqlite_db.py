@@ -1,13 +1,128 @@
 import os
 import sqlite3
+import argparse
+
+from storage.spatial import backfill_positions
+from storage.timestamps import backfill_small_tables, iso_to_ms_sql
 
 HERE = os.path.abspath(os.path.dirname(__file__))
 DB_NAME = os.getenv("DB_NAME", "lora.db")
 DB_PATH = os.path.join(HERE, DB_NAME)
 SCHEMA_PATH = os.path.join(HERE, "sqlite_schema.sql")
 
+EPOCH_COLUMNS = (
+    ("telemetry", "ts_ms"),
+    ("telemetry", "device_ts_ms"),
+    ("nodes", "last_seen_ms"),
+    ("node_latest", "ts_ms"),
+    ("node_latest", "device_ts_ms"),
+)
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _has_index(conn, name):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)
+    ).fetchone()
+    return row is not None
+
+
+def migrate(conn):
+    """
+    Bring tables created by an older schema up to date. Runs before the schema
+    script so that its CREATE INDEX statements find the columns they need.
+    """
+    telemetry_cols = _columns(conn, "telemetry")
+    if not telemetry_cols:
+        return  # fresh database, the schema script creates everything
+
+    if "f_cnt" not in telemetry_cols:
+        conn.execute("ALTER TABLE telemetry ADD COLUMN f_cnt INTEGER")
+
+    # Epoch-ms columns; existing rows are converted by the online backfill
+    for table, column in EPOCH_COLUMNS:
+        cols = telemetry_cols if table == "telemetry" else _columns(conn, table)
+        if cols and column not in cols:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+
+    if not _has_index(conn, "ux_telemetry_uplink"):
+        # Repeated polls stored the same uplink many times; keep the first copy
+        cur = conn.execute(
+            """
+            DELETE FROM telemetry
+            WHERE id NOT IN (
+              SELECT MIN(id) FROM telemetry GROUP BY device_eui, timestamp
+            )
+            """
+        )
+        if cur.rowcount:
+            print(f"Removed {cur.rowcount} duplicate telemetry row(s).")
+
+    # Same columns as ux_telemetry_uplink, which now covers its lookups
+    conn.execute("DROP INDEX IF EXISTS idx_telemetry_device_time")
+
+    # Invalidation triggers for scopes no cache subscribes to
+    for table in ("user_node_subscriptions", "alert_preferences"):
+        for op in ("insert", "update", "delete"):
+            conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_{op}_invalidate")
+
+
+def backfill_node_latest(conn):
+    """
+    One-shot fill of node_latest from the telemetry history.
+    Only runs while node_latest is empty, so repeated startups stay cheap.
+    Returns the number of rows inserted.
+    """
+    if conn.execute("SELECT 1 FROM node_latest LIMIT 1").fetchone():
+        return 0
+
+    cur = conn.execute(
+        f"""
+        INSERT OR IGNORE INTO node_latest
+          (device_eui, gateway_id, timestamp, device_timestamp,
+           ts_ms, device_ts_ms,
+           latitude, longitude, altitude,
+           temperature_c, humidity_pct, battery_level,
+           rssi, snr, smoke_detected)
+        SELECT
+          device_eui, gateway_id, timestamp, device_timestamp,
+          {iso_to_ms_sql("timestamp")}, {iso_to_ms_sql("device_timestamp")},
+          latitude, longitude, altitude,
+          temperature_c, humidity_pct, battery_level,
+          rssi, snr, smoke_detected
+        FROM latest_telemetry
+        """
+    )
+    return cur.rowcount
+
+
+def enable_incremental_vacuum(conn):
+    """
+    Switch an existing database to auto_vacuum=INCREMENTAL so retention can
+    shrink the file. The mode only changes with a full VACUUM, which
+    rewrites the file under an exclusive lock, so this runs only on request.
+    Returns True if the database was converted.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    conn.commit()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create or upgrade the SQLite DB.")
+    parser.add_argument(
+        "--incremental-vacuum", action="store_true",
+        help="convert an existing database to auto_vacuum=INCREMENTAL "
+             "(full VACUUM; stop the services first)",
+    )
+    args = parser.parse_args(argv)
 
-def main():
     os.makedirs(HERE, exist_ok=True)
 
     if not os.path.exists(SCHEMA_PATH):
@@ -18,6 +133,11 @@ def main():
 
     conn = sqlite3.connect(DB_PATH)
     try:
+        # Lets storage.retention shrink the file; only takes effect on a new
+        # database (an existing one is switched by --incremental-vacuum)
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        migrate(conn)
+        conn.commit()
         conn.executescript(schema_sql)
 
         # ensure SYSTEM node exists for API error alerts
@@ -28,7 +148,23 @@ def main():
             """
         )
 
+        backfilled = backfill_node_latest(conn)
+        if backfilled:
+            print(f"Backfilled node_latest with {backfilled} node(s).")
+        backfill_small_tables(conn)
+        indexed = backfill_positions(conn)
+        if indexed:
+            print(f"Indexed {indexed} node position(s).")
+
         conn.commit()
+        if args.incremental_vacuum:
+            if enable_incremental_vacuum(conn):
+                print("Switched to auto_vacuum=INCREMENTAL.")
+        elif conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            print(
+                "auto_vacuum is not INCREMENTAL, so retention cannot shrink "
+                "the file; rerun with --incremental-vacuum to switch it."
+            )
         print(f"SQLite DB created at: {DB_PATH}")
     finally:
         conn.close()
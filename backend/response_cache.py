@@ -0,0 +1,102 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+# How long a cached response may be served while its data versions still match
+RESPONSE_CACHE_TTL_MS = int(os.getenv("RESPONSE_CACHE_TTL_MS", "2000"))
+RESPONSE_CACHE_ENTRIES = int(os.getenv("RESPONSE_CACHE_ENTRIES", "256"))
+
+HIT, MISS, COALESCED = "hit", "miss", "coalesced"
+
+
+class _Flight:
+    """One in-progress computation that concurrent callers wait on."""
+
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlightCache:
+    """
+    Thread-safe micro-cache with request coalescing.
+
+    An entry is served while its `tag` (e.g. an ETag built from data
+    versions) equals the caller's and it is younger than `ttl_ms`. On a miss
+    the first caller computes the value; callers arriving with the same key
+    and tag while it runs wait for that result instead of computing their
+    own. Failures are handed to the waiting callers and not cached. At most
+    `max_entries` keys are kept, least recently used first out.
+    """
+
+    def __init__(
+        self,
+        ttl_ms: int = RESPONSE_CACHE_TTL_MS,
+        max_entries: int = RESPONSE_CACHE_ENTRIES,
+    ):
+        self.ttl = ttl_ms / 1000
+        self.max_entries = max(1, max_entries)
+        self._entries: OrderedDict[Hashable, tuple[Hashable, float, Any]] = (
+            OrderedDict()
+        )
+        self._flights: dict[tuple[Hashable, Hashable], _Flight] = {}
+        self._lock = threading.Lock()
+        self.counters = {HIT: 0, MISS: 0, COALESCED: 0}
+
+    def get(
+        self, key: Hashable, tag: Hashable, compute: Callable[[], Any]
+    ) -> tuple[Any, str]:
+        """The value for (key, tag) and whether it was a hit, miss or coalesced."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == tag and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.counters[HIT] += 1
+                return entry[2], HIT
+            flight = self._flights.get((key, tag))
+            leader = flight is None
+            if leader:
+                flight = self._flights[(key, tag)] = _Flight()
+                self.counters[MISS] += 1
+            else:
+                self.counters[COALESCED] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, COALESCED
+
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            with self._lock:
+                self._entries[key] = (tag, time.monotonic() + self.ttl, flight.value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._flights[(key, tag)]
+            flight.done.set()
+        return flight.value, MISS
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+responses = SingleFlightCache()
+
+
+def stats() -> dict[str, int]:
+    with responses._lock:
+        return {**responses.counters, "entries": len(responses._entries)}
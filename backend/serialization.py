@@ -0,0 +1,109 @@
+import io
+import csv
+import zlib
+import base64
+import sqlite3
+from typing import Any, Iterable, Iterator, Optional
+
+import orjson
+from fastapi import Response
+
+FORMAT_PATTERN = "^(rows|columnar)$"
+
+
+def encode(content: Any) -> bytes:
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ORJSONResponse(Response):
+    """JSON response rendered by orjson; bytes are taken as already encoded."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return encode(content)
+
+
+def fetch(conn: sqlite3.Connection, sql: str, params=()) -> tuple[list[str], list]:
+    """
+    Column names and plain row tuples, skipping sqlite3.Row objects so the
+    rows can go to orjson as they are.
+    """
+    cur = conn.cursor()
+    cur.row_factory = None
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    return [d[0] for d in cur.description], rows
+
+
+def shape(columns: list[str], rows: list, fmt: str = "rows"):
+    """
+    "rows": a list of objects, the default JSON shape of every endpoint.
+    "columnar": {"columns": [...], "data": [[...], ...]}, which names each
+    column once instead of in every row.
+    """
+    if fmt == "columnar":
+        return {"columns": columns, "data": rows}
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def respond(content: Any, response: Optional[Response] = None) -> ORJSONResponse:
+    """
+    Serialize with orjson, bypassing FastAPI's jsonable_encoder. Headers set
+    on the endpoint's injected `response` are carried over.
+    """
+    out = ORJSONResponse(content)
+    if response is not None:
+        for name, value in response.headers.items():
+            if name not in ("content-length", "content-type"):
+                out.headers[name] = value
+    return out
+
+
+def encode_cursor(*key: Any) -> str:
+    """Opaque, URL-safe pagination cursor for a keyset position."""
+    return base64.urlsafe_b64encode(orjson.dumps(key)).rstrip(b"=").decode()
+
+
+def decode_cursor(token: str) -> list:
+    """Inverse of encode_cursor; ValueError for anything it did not produce."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        value = orjson.loads(raw)
+    except (ValueError, orjson.JSONDecodeError):
+        raise ValueError("malformed cursor")
+    if not isinstance(value, list):
+        raise ValueError("malformed cursor")
+    return value
+
+
+def ndjson_stream(columns, chunks: Iterable[list]) -> Iterator[bytes]:
+    """One JSON object per line, one bytes block per chunk of rows."""
+    for rows in chunks:
+        yield b"".join(orjson.dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+def csv_stream(columns, chunks: Iterable[list]) -> Iterator[bytes]:
+    """Header line, then one bytes block per chunk of rows."""
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+def gzip_stream(blocks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a byte stream incrementally into a single gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for block in blocks:
+        out = compressor.compress(block)
+        if out:
+            yield out
+    yield compressor.flush()
@@ -8,16 +8,23 @@ CREATE TABLE IF NOT EXISTS nodes (
   device_eui TEXT PRIMARY KEY,
   node_id TEXT,
   last_seen TEXT,
+  last_seen_ms INTEGER,
   gateway_id TEXT,
   FOREIGN KEY (gateway_id) REFERENCES gateways(gateway_id)
 );
 
+CREATE INDEX IF NOT EXISTS idx_nodes_last_seen_ms
+ON nodes(last_seen_ms);
+
 CREATE TABLE IF NOT EXISTS telemetry (
   id INTEGER PRIMARY KEY,
   device_eui TEXT NOT NULL,
   gateway_id TEXT,
+  f_cnt INTEGER,
   timestamp TEXT NOT NULL,
   device_timestamp TEXT,
+  ts_ms INTEGER,
+  device_ts_ms INTEGER,
   latitude REAL,
   longitude REAL,
   altitude REAL,
@@ -31,9 +38,158 @@ CREATE TABLE IF NOT EXISTS telemetry (
   FOREIGN KEY (gateway_id) REFERENCES gateways(gateway_id)
 );
 
-CREATE INDEX IF NOT EXISTS idx_telemetry_device_time
+-- Epoch-millisecond copies of the ISO columns, used for range filters and
+-- ordering. Rows written before they existed are filled in the background
+-- by storage.timestamps.run_backfill.
+CREATE INDEX IF NOT EXISTS idx_telemetry_device_ts_ms
+ON telemetry(device_eui, ts_ms);
+
+CREATE INDEX IF NOT EXISTS idx_telemetry_ts_ms
+ON telemetry(ts_ms);
+
+-- Uplink identity: the live API re-serves the last uplink on every poll.
+-- (f_cnt alone is not unique: it resets whenever a device rejoins.)
+-- It also serves (device_eui, timestamp) lookups.
+CREATE UNIQUE INDEX IF NOT EXISTS ux_telemetry_uplink
 ON telemetry(device_eui, timestamp);
 
+-- -------------------------
+-- Telemetry rollups (1 minute, 1 hour, 1 day buckets)
+-- Maintained incrementally by data_listener.upsert; bucket_ms is the UTC
+-- bucket start in epoch ms. Averages are <metric>_sum / <metric>_n, where
+-- <metric>_n counts non-NULL samples.
+-- -------------------------
+CREATE TABLE IF NOT EXISTS telemetry_1m (
+  device_eui TEXT NOT NULL,
+  bucket_ms INTEGER NOT NULL,
+  samples INTEGER NOT NULL,
+  smoke_count INTEGER NOT NULL DEFAULT 0,
+  temperature_c_min REAL,
+  temperature_c_max REAL,
+  temperature_c_sum REAL,
+  temperature_c_n INTEGER NOT NULL DEFAULT 0,
+  humidity_pct_min REAL,
+  humidity_pct_max REAL,
+  humidity_pct_sum REAL,
+  humidity_pct_n INTEGER NOT NULL DEFAULT 0,
+  battery_level_min REAL,
+  battery_level_max REAL,
+  battery_level_sum REAL,
+  battery_level_n INTEGER NOT NULL DEFAULT 0,
+  rssi_min REAL,
+  rssi_max REAL,
+  rssi_sum REAL,
+  rssi_n INTEGER NOT NULL DEFAULT 0,
+  snr_min REAL,
+  snr_max REAL,
+  snr_sum REAL,
+  snr_n INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (device_eui, bucket_ms)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_telemetry_1m_bucket
+ON telemetry_1m(bucket_ms);
+
+CREATE TABLE IF NOT EXISTS telemetry_1h (
+  device_eui TEXT NOT NULL,
+  bucket_ms INTEGER NOT NULL,
+  samples INTEGER NOT NULL,
+  smoke_count INTEGER NOT NULL DEFAULT 0,
+  temperature_c_min REAL,
+  temperature_c_max REAL,
+  temperature_c_sum REAL,
+  temperature_c_n INTEGER NOT NULL DEFAULT 0,
+  humidity_pct_min REAL,
+  humidity_pct_max REAL,
+  humidity_pct_sum REAL,
+  humidity_pct_n INTEGER NOT NULL DEFAULT 0,
+  battery_level_min REAL,
+  battery_level_max REAL,
+  battery_level_sum REAL,
+  battery_level_n INTEGER NOT NULL DEFAULT 0,
+  rssi_min REAL,
+  rssi_max REAL,
+  rssi_sum REAL,
+  rssi_n INTEGER NOT NULL DEFAULT 0,
+  snr_min REAL,
+  snr_max REAL,
+  snr_sum REAL,
+  snr_n INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (device_eui, bucket_ms)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_telemetry_1h_bucket
+ON telemetry_1h(bucket_ms);
+
+CREATE TABLE IF NOT EXISTS telemetry_1d (
+  device_eui TEXT NOT NULL,
+  bucket_ms INTEGER NOT NULL,
+  samples INTEGER NOT NULL,
+  smoke_count INTEGER NOT NULL DEFAULT 0,
+  temperature_c_min REAL,
+  temperature_c_max REAL,
+  temperature_c_sum REAL,
+  temperature_c_n INTEGER NOT NULL DEFAULT 0,
+  humidity_pct_min REAL,
+  humidity_pct_max REAL,
+  humidity_pct_sum REAL,
+  humidity_pct_n INTEGER NOT NULL DEFAULT 0,
+  battery_level_min REAL,
+  battery_level_max REAL,
+  battery_level_sum REAL,
+  battery_level_n INTEGER NOT NULL DEFAULT 0,
+  rssi_min REAL,
+  rssi_max REAL,
+  rssi_sum REAL,
+  rssi_n INTEGER NOT NULL DEFAULT 0,
+  snr_min REAL,
+  snr_max REAL,
+  snr_sum REAL,
+  snr_n INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (device_eui, bucket_ms)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_telemetry_1d_bucket
+ON telemetry_1d(bucket_ms);
+
+-- -------------------------
+-- Latest state per node
+-- Maintained by data_listener.upsert in the same transaction as the telemetry
+-- insert, so reads cost O(nodes) instead of scanning the telemetry history.
+-- -------------------------
+CREATE TABLE IF NOT EXISTS node_latest (
+  device_eui TEXT PRIMARY KEY,
+  gateway_id TEXT,
+  timestamp TEXT NOT NULL,
+  device_timestamp TEXT,
+  ts_ms INTEGER,
+  device_ts_ms INTEGER,
+  latitude REAL,
+  longitude REAL,
+  altitude REAL,
+  temperature_c REAL,
+  humidity_pct REAL,
+  battery_level REAL,
+  smoke_detected INTEGER DEFAULT 0,
+  rssi REAL,
+  snr REAL,
+  FOREIGN KEY (device_eui) REFERENCES nodes(device_eui)
+);
+
+-- Spatial index of node_latest positions for viewport and nearest-node
+-- queries. id is storage.spatial.position_id(device_eui); the exact
+-- coordinates are kept as auxiliary columns because R*Tree boxes are
+-- stored as 32-bit floats.
+CREATE VIRTUAL TABLE IF NOT EXISTS node_positions USING rtree(
+  id,
+  min_lat, max_lat,
+  min_lon, max_lon,
+  +device_eui TEXT,
+  +lat REAL,
+  +lon REAL
+);
+
+-- Kept for ad-hoc queries and for backfilling node_latest on older databases.
 CREATE VIEW IF NOT EXISTS latest_telemetry AS
 SELECT t.*
 FROM telemetry t
@@ -45,6 +201,36 @@ JOIN (
 ON t.device_eui = latest.device_eui
 AND t.timestamp = latest.max_ts;
 
+-- -------------------------
+-- Change events for GET /stream
+-- Filled by triggers so every writer (listener, API, workers) is captured.
+-- AUTOINCREMENT keeps ids increasing after retention deletes old rows, so
+-- the id is usable as an SSE resume cursor.
+-- -------------------------
+CREATE TABLE IF NOT EXISTS events (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  kind TEXT NOT NULL,
+  device_eui TEXT NOT NULL,
+  ref_id INTEGER,
+  created_ms INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_node_latest_insert_event
+AFTER INSERT ON node_latest
+BEGIN
+  INSERT INTO events (kind, device_eui, created_ms)
+  VALUES ('node', NEW.device_eui,
+          CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_node_latest_update_event
+AFTER UPDATE ON node_latest
+BEGIN
+  INSERT INTO events (kind, device_eui, created_ms)
+  VALUES ('node', NEW.device_eui,
+          CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
+END;
+
 -- -------------------------
 -- Users
 -- -------------------------
@@ -94,12 +280,49 @@ ON alerts(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_alerts_dev_eui_type
 ON alerts(dev_eui, alert_type);
 
+-- per-node alert lists (node overview, /alerts?dev_eui=) in display order
+CREATE INDEX IF NOT EXISTS idx_alerts_dev_eui_created
+ON alerts(dev_eui, created_at DESC);
+
 CREATE INDEX IF NOT EXISTS idx_alerts_ack
 ON alerts(acknowledged);
 
 CREATE INDEX IF NOT EXISTS idx_alerts_type
 ON alerts(alert_type);
 
+CREATE TRIGGER IF NOT EXISTS trg_alerts_insert_event
+AFTER INSERT ON alerts
+BEGIN
+  INSERT INTO events (kind, device_eui, ref_id, created_ms)
+  VALUES ('alert', NEW.dev_eui, NEW.id,
+          CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_alerts_ack_event
+AFTER UPDATE OF acknowledged ON alerts
+WHEN NEW.acknowledged IS NOT OLD.acknowledged
+BEGIN
+  INSERT INTO events (kind, device_eui, ref_id, created_ms)
+  VALUES ('alert', NEW.dev_eui, NEW.id,
+          CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
+END;
+
+-- Acknowledged alerts moved out by storage.retention. Columns mirror alerts
+-- in the same order (rows are copied with SELECT *), plus archived_at.
+CREATE TABLE IF NOT EXISTS alerts_archive (
+  id INTEGER PRIMARY KEY,
+  dev_eui TEXT NOT NULL,
+  alert_type TEXT NOT NULL,
+  message TEXT NOT NULL,
+  created_at INTEGER NOT NULL,
+  acknowledged INTEGER NOT NULL DEFAULT 0,
+  acknowledged_at INTEGER,
+  archived_at INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_alerts_archive_dev_created
+ON alerts_archive(dev_eui, created_at);
+
 -- -------------------------
 -- Alert Preferences
 -- -------------------------
@@ -203,3 +426,166 @@ CREATE TABLE IF NOT EXISTS alert_queue (
 
 CREATE INDEX IF NOT EXISTS idx_alert_queue_queueable
 ON alert_queue(processed, in_progress, created_at);
+
+-- -------------------------
+-- Data versions for ETags (storage.versions)
+-- One counter per source table, bumped by triggers on every change, so a
+-- conditional GET is answered from this table without running its query.
+-- -------------------------
+CREATE TABLE IF NOT EXISTS data_versions (
+  name TEXT PRIMARY KEY,
+  version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO data_versions (name) VALUES
+  ('node_latest'), ('alerts'), ('user_node_subscriptions'), ('alert_preferences');
+
+CREATE TRIGGER IF NOT EXISTS trg_node_latest_insert_version
+AFTER INSERT ON node_latest
+BEGIN
+  UPDATE data_versions SET version = version + 1 WHERE name = 'node_latest';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_node_latest_update_version
+AFTER UPDATE ON node_latest
+BEGIN
+  UPDATE data_versions SET version = version + 1 WHERE name = 'node_latest';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_node_latest_delete_version
+AFTER DELETE ON node_latest
+BEGIN
+  UPDATE data_versions SET version = version + 1 WHERE name = 'node_latest';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_alerts_insert_version
+AFTER INSERT ON alerts
+BEGIN
+  UPDATE data_versions SET version = version + 1 WHERE name = 'alerts';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_alerts_update_version
+AFTER UPDATE ON alerts
+BEGIN
+  UPDATE data_versions SET version = version + 1 WHERE name = 'alerts';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_alerts_delete_version
+AFTER DELETE ON alerts
+BEGIN
+  UPDATE data_versions SET version = version + 1 WHERE name = 'alerts';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_node_subscriptions_insert_version
+AFTER INSERT ON user_node_subscriptions
+BEGIN
+  UPDATE data_versions SET version = version + 1 WHERE name = 'user_node_subscriptions';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_node_subscriptions_update_version
+AFTER UPDATE ON user_node_subscriptions
+BEGIN
+  UPDATE data_versions SET version = version + 1 WHERE name = 'user_node_subscriptions';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_node_subscriptions_delete_version
+AFTER DELETE ON user_node_subscriptions
+BEGIN
+  UPDATE data_versions SET version = version + 1 WHERE name = 'user_node_subscriptions';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_alert_preferences_insert_version
+AFTER INSERT ON alert_preferences
+BEGIN
+  UPDATE data_versions SET version = version + 1 WHERE name = 'alert_preferences';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_alert_preferences_update_version
+AFTER UPDATE ON alert_preferences
+BEGIN
+  UPDATE data_versions SET version = version + 1 WHERE name = 'alert_preferences';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_alert_preferences_delete_version
+AFTER DELETE ON alert_preferences
+BEGIN
+  UPDATE data_versions SET version = version + 1 WHERE name = 'alert_preferences';
+END;
+
+-- -------------------------
+-- Cache invalidation log (storage.invalidation)
+-- Every API worker keeps its own in-memory caches; triggers record which
+-- (scope, key) changed and each worker replays new rows into its caches.
+-- key NULL invalidates the whole scope. AUTOINCREMENT keeps ids usable as
+-- a replay cursor after retention deletes old rows.
+-- -------------------------
+CREATE TABLE IF NOT EXISTS cache_invalidations (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  scope TEXT NOT NULL,
+  key TEXT,
+  created_ms INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_org_role_settings_insert_invalidate
+AFTER INSERT ON org_role_settings
+BEGIN
+  INSERT INTO cache_invalidations (scope, key, created_ms)
+  VALUES ('org_permissions', NEW.org_id, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_org_role_settings_update_invalidate
+AFTER UPDATE ON org_role_settings
+BEGIN
+  INSERT INTO cache_invalidations (scope, key, created_ms)
+  VALUES ('org_permissions', NEW.org_id, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_org_role_settings_delete_invalidate
+AFTER DELETE ON org_role_settings
+BEGIN
+  INSERT INTO cache_invalidations (scope, key, created_ms)
+  VALUES ('org_permissions', OLD.org_id, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_org_member_roles_insert_invalidate
+AFTER INSERT ON org_member_roles
+BEGIN
+  INSERT INTO cache_invalidations (scope, key, created_ms)
+  VALUES ('org_member', NEW.user_id, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_org_member_roles_update_invalidate
+AFTER UPDATE ON org_member_roles
+BEGIN
+  INSERT INTO cache_invalidations (scope, key, created_ms)
+  VALUES ('org_member', NEW.user_id, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_org_member_roles_delete_invalidate
+AFTER DELETE ON org_member_roles
+BEGIN
+  INSERT INTO cache_invalidations (scope, key, created_ms)
+  VALUES ('org_member', OLD.user_id, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_users_insert_invalidate
+AFTER INSERT ON users
+BEGIN
+  INSERT INTO cache_invalidations (scope, key, created_ms)
+  VALUES ('user', NEW.auth_sub, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_users_update_invalidate
+AFTER UPDATE ON users
+BEGIN
+  INSERT INTO cache_invalidations (scope, key, created_ms)
+  VALUES ('user', NEW.auth_sub, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_users_delete_invalidate
+AFTER DELETE ON users
+BEGIN
+  INSERT INTO cache_invalidations (scope, key, created_ms)
+  VALUES ('user', OLD.auth_sub, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
+END;
+
@@ -0,0 +1,283 @@
+import os
+import json
+import asyncio
+import logging
+import sqlite3
+from collections import deque
+
+from . import pool
+
+log = logging.getLogger("storage.events")
+
+STREAM_POLL_MS = float(os.getenv("STREAM_POLL_MS", "500"))
+STREAM_BUFFER_SIZE = int(os.getenv("STREAM_BUFFER_SIZE", "1024"))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+STREAM_RETRY_MS = int(os.getenv("STREAM_RETRY_MS", "3000"))
+READ_BATCH_SIZE = 500
+
+NODE_COLUMNS = (
+    "device_eui", "timestamp", "latitude", "longitude", "temperature_c",
+    "humidity_pct", "battery_level", "smoke_detected", "rssi", "snr",
+)
+ALERT_COLUMNS = (
+    "id", "dev_eui", "alert_type", "message", "created_at",
+    "acknowledged", "acknowledged_at",
+)
+
+
+def head(conn: sqlite3.Connection) -> int:
+    """Id of the newest event, 0 when none were ever written."""
+    row = conn.execute(
+        "SELECT seq FROM sqlite_sequence WHERE name = 'events'"
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def covers(conn: sqlite3.Connection, since: int, upto: int) -> bool:
+    """
+    Whether every event in (since, upto] is still in the table, i.e. a
+    delta from `since` is complete. False once retention pruned past it.
+    """
+    if since >= upto:
+        return True
+    oldest = conn.execute("SELECT MIN(id) FROM events").fetchone()[0]
+    return oldest is not None and oldest <= since + 1
+
+
+def read_range(
+    conn: sqlite3.Connection,
+    after: int,
+    upto: int | None = None,
+    limit: int = READ_BATCH_SIZE,
+    device_euis: set[str] | None = None,
+) -> tuple[list[dict], int]:
+    """
+    Events with after < id <= upto, oldest first, with their payloads.
+
+    Node events carry the node's current node_latest row, so several events
+    for one node in the batch collapse into the last of them. Returns the
+    events and the id of the last event examined (the next `after`).
+    """
+    clauses = ["id > ?"]
+    params: list = [after]
+    if upto is not None:
+        clauses.append("id <= ?")
+        params.append(upto)
+    if device_euis is not None:
+        if not device_euis:
+            return [], after if upto is None else upto
+        clauses.append(f"device_eui IN ({', '.join('?' for _ in device_euis)})")
+        params.extend(device_euis)
+    params.append(limit)
+    rows = conn.execute(
+        f"""
+        SELECT id, kind, device_eui, ref_id FROM events
+        WHERE {" AND ".join(clauses)}
+        ORDER BY id
+        LIMIT ?
+        """,
+        params,
+    ).fetchall()
+    if not rows:
+        return [], after if upto is None else upto
+    last_id = rows[-1]["id"]
+    if len(rows) < limit and upto is not None:
+        last_id = upto
+
+    last_node_event = {r["device_eui"]: r["id"] for r in rows if r["kind"] == "node"}
+    node_euis = list(last_node_event)
+    alert_ids = [r["ref_id"] for r in rows if r["kind"] == "alert"]
+    nodes = _rows_by(conn, "node_latest", NODE_COLUMNS, "device_eui", node_euis)
+    alerts = _rows_by(conn, "alerts", ALERT_COLUMNS, "id", alert_ids)
+
+    events = []
+    for r in rows:
+        if r["kind"] == "node":
+            data = nodes.get(r["device_eui"])
+            if last_node_event[r["device_eui"]] != r["id"]:
+                continue
+        else:
+            data = alerts.get(r["ref_id"])
+        if data is not None:
+            events.append({
+                "id": r["id"], "event": r["kind"],
+                "device_eui": r["device_eui"], "data": data,
+            })
+    return events, last_id
+
+
+def replay(
+    conn: sqlite3.Connection,
+    after: int,
+    upto: int,
+    device_euis: set[str] | None = None,
+) -> tuple[list[dict], int]:
+    """
+    read_range() for a client resuming from `after`. When retention has
+    pruned events past it, returns a single "reset" event at `upto` instead,
+    telling the client to refetch its state and continue from there.
+    """
+    if not covers(conn, after, upto):
+        reset = {"id": upto, "event": "reset", "device_eui": None,
+                 "data": {"cursor": upto}}
+        return [reset], upto
+    return read_range(conn, after, upto, READ_BATCH_SIZE, device_euis)
+
+
+def _rows_by(conn, table, columns, key, values) -> dict:
+    if not values:
+        return {}
+    marks = ", ".join("?" for _ in values)
+    rows = conn.execute(
+        f"SELECT {', '.join(columns)} FROM {table} WHERE {key} IN ({marks})",
+        values,
+    ).fetchall()
+    return {r[key]: dict(r) for r in rows}
+
+
+def format_sse(event: dict) -> str:
+    data = json.dumps(event["data"], separators=(",", ":"))
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {data}\n\n"
+
+
+class EventHub:
+    """
+    Per-process fan-out of the events table. One task polls the table every
+    poll_ms and keeps the newest events in memory, so any number of /stream
+    clients costs one query per interval. Clients resuming from further back
+    than the buffer reaches are replayed from the table, or sent a "reset"
+    event when retention has already pruned past their cursor.
+    """
+
+    def __init__(self, db_path: str, poll_ms: float = STREAM_POLL_MS,
+                 buffer_size: int = STREAM_BUFFER_SIZE):
+        self.db_path = db_path
+        self.poll_ms = poll_ms
+        self.buffer: deque = deque(maxlen=max(1, buffer_size))
+        self.head = 0
+        # the buffer answers every cursor >= floor
+        self.floor = 0
+        self.counters = {"polls": 0, "events": 0, "subscribers": 0}
+        self._loop = None
+        self._task = None
+        self._changed: asyncio.Event | None = None
+
+    def _read(self, fn, *args):
+        with pool.connect(self.db_path, readonly=True) as conn:
+            return fn(conn, *args)
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._changed = asyncio.Event()
+        self.buffer.clear()
+        self.head = self.floor = await asyncio.to_thread(self._read, head)
+        self._task = loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.poll()
+            except Exception:
+                log.exception("[events] poll failed")
+            await asyncio.sleep(self.poll_ms / 1000.0)
+
+    async def poll(self) -> int:
+        """Pull events past head into the buffer and wake subscribers."""
+        self.counters["polls"] += 1
+        new: list[dict] = []
+        cursor = self.head
+        while True:
+            batch, last = await asyncio.to_thread(self._read, read_range, cursor)
+            if last == cursor:
+                break
+            new.extend(batch)
+            cursor = last
+        if cursor == self.head:
+            return 0
+        for event in new:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.floor = self.buffer[0]["id"]
+            self.buffer.append(event)
+        self.head = cursor
+        self.counters["events"] += len(new)
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+        return len(new)
+
+    def _from_buffer(self, cursor: int, device_euis: set[str] | None) -> list[dict]:
+        return [
+            e for e in self.buffer
+            if e["id"] > cursor
+            and (device_euis is None or e["device_eui"] in device_euis)
+        ]
+
+    async def subscribe(self, cursor: int | None = None,
+                        device_euis: set[str] | None = None,
+                        heartbeat_seconds: float = STREAM_HEARTBEAT_SECONDS):
+        """
+        Async iterator of event batches after `cursor` (None: from now on).
+        Yields an empty list when nothing arrived for heartbeat_seconds.
+        """
+        await self.start()
+        cursor = self.head if cursor is None else cursor
+        self.counters["subscribers"] += 1
+        try:
+            while True:
+                changed = self._changed
+                if cursor < self.floor:
+                    batch, cursor = await asyncio.to_thread(
+                        self._read, replay, cursor, self.head, device_euis,
+                    )
+                else:
+                    batch = self._from_buffer(cursor, device_euis)
+                    cursor = max(cursor, self.head)
+                if batch:
+                    yield batch
+                    continue
+                try:
+                    await asyncio.wait_for(changed.wait(), heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield []
+        finally:
+            self.counters["subscribers"] -= 1
+
+
+async def sse(hub: EventHub, cursor: int | None, device_euis: set[str] | None):
+    """text/event-stream body for hub.subscribe()."""
+    yield f"retry: {STREAM_RETRY_MS}\n\n"
+    async for batch in hub.subscribe(cursor, device_euis):
+        if not batch:
+            yield ": keep-alive\n\n"
+            continue
+        yield "".join(format_sse(e) for e in batch)
+
+
+_hubs: dict[str, EventHub] = {}
+
+
+def get_hub(db_path: str) -> EventHub:
+    hub = _hubs.get(db_path)
+    if hub is None:
+        hub = _hubs[db_path] = EventHub(db_path)
+    return hub
+
+
+def stats() -> dict:
+    return {path: dict(hub.counters) for path, hub in _hubs.items()}
+
+
+def reset() -> None:
+    """Forget every hub; their poll tasks end with their event loops."""
+    _hubs.clear()
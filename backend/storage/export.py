@@ -0,0 +1,81 @@
+import os
+from typing import Iterator
+
+from . import pool
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+
+TELEMETRY_COLUMNS = (
+    "device_eui", "gateway_id", "timestamp", "ts_ms", "device_timestamp",
+    "latitude", "longitude", "altitude", "temperature_c", "humidity_pct",
+    "battery_level", "smoke_detected", "rssi", "snr",
+)
+_TS_MS = TELEMETRY_COLUMNS.index("ts_ms")
+
+
+def _chunks(db_path: str, where: list[str], params: list,
+            chunk_rows: int) -> Iterator[list[tuple]]:
+    """
+    Keyset pagination on (ts_ms, id): every chunk is a fresh short read
+    that resumes after the last row sent, so no read transaction stays open
+    for the length of the export and memory holds one chunk at a time.
+    """
+    columns = ", ".join(TELEMETRY_COLUMNS)
+    base = " AND ".join(["ts_ms IS NOT NULL", *where])
+    last: tuple | None = None
+    while True:
+        clause, args = base, list(params)
+        if last is not None:
+            clause += " AND (ts_ms, id) > (?, ?)"
+            args += last
+        with pool.connect(db_path, readonly=True) as conn:
+            cur = conn.cursor()
+            cur.row_factory = None
+            rows = cur.execute(
+                f"""
+                SELECT {columns}, id FROM telemetry
+                WHERE {clause}
+                ORDER BY ts_ms, id
+                LIMIT ?
+                """,
+                (*args, chunk_rows),
+            ).fetchall()
+        if not rows:
+            return
+        last = [rows[-1][_TS_MS], rows[-1][-1]]
+        yield [row[:-1] for row in rows]
+        if len(rows) < chunk_rows:
+            return
+
+
+def iter_telemetry(
+    db_path: str,
+    device_euis: list[str] | None = None,
+    from_ms: int | None = None,
+    to_ms: int | None = None,
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+) -> Iterator[list[tuple]]:
+    """
+    Telemetry rows (TELEMETRY_COLUMNS) in chunks of up to chunk_rows.
+    The fleet or a single device comes out in time order; several devices
+    come out one device after another, each in time order, so every read
+    follows the (device_eui, ts_ms) or (ts_ms) index. Rows whose ts_ms has
+    not been backfilled yet are skipped.
+    """
+    where: list[str] = []
+    params: list = []
+    if from_ms is not None:
+        where.append("ts_ms >= ?")
+        params.append(from_ms)
+    if to_ms is not None:
+        where.append("ts_ms <= ?")
+        params.append(to_ms)
+    chunk_rows = max(1, chunk_rows)
+
+    if not device_euis:
+        yield from _chunks(db_path, where, params, chunk_rows)
+        return
+    for dev_eui in dict.fromkeys(device_euis):
+        yield from _chunks(
+            db_path, ["device_eui = ?", *where], [dev_eui, *params], chunk_rows
+        )
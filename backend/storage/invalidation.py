@@ -0,0 +1,138 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Callable
+
+from . import pool
+
+log = logging.getLogger("storage.invalidation")
+
+# Longest a worker serves a cache entry after another process changed it
+CACHE_INVALIDATION_POLL_MS = float(os.getenv("CACHE_INVALIDATION_POLL_MS", "500"))
+
+Handler = Callable[[str | None], None]
+
+_handlers: dict[str, list[Handler]] = {}
+_handlers_lock = threading.Lock()
+
+
+def subscribe(scope: str, handler: Handler) -> None:
+    """
+    Call handler(key) whenever `scope` is invalidated for `key`, in any
+    process; key is None when the whole scope must be dropped.
+    """
+    with _handlers_lock:
+        _handlers.setdefault(scope, []).append(handler)
+
+
+def head(conn: sqlite3.Connection) -> int:
+    """Id of the newest invalidation, 0 when none were ever written."""
+    row = conn.execute(
+        "SELECT seq FROM sqlite_sequence WHERE name = 'cache_invalidations'"
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def _dispatch(scope: str, key: str | None) -> None:
+    with _handlers_lock:
+        handlers = list(_handlers.get(scope, ()))
+    for handler in handlers:
+        try:
+            handler(key)
+        except Exception:
+            log.exception("Cache invalidation handler failed for %s", scope)
+
+
+class Invalidator:
+    """
+    Applies the invalidation log of one database to this process's caches.
+
+    Caches call sync() before they read. At most once per poll interval it
+    reads the rows logged since the last sync, by this process or any
+    other, and hands each distinct (scope, key) to the subscribed handlers.
+    An entry is therefore never served more than poll_ms after a write
+    committed elsewhere. If retention pruned rows this process had not yet
+    applied, every scope is dropped instead.
+    """
+
+    def __init__(self, db_path: str, poll_ms: float = CACHE_INVALIDATION_POLL_MS):
+        self.db_path = db_path
+        self.interval = poll_ms / 1000
+        self.cursor: int | None = None
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
+        self.counters = {"syncs": 0, "invalidations": 0, "resets": 0}
+
+    def due(self) -> bool:
+        """Whether sync() would read the log now; takes no lock."""
+        return time.monotonic() >= self._next_sync
+
+    def sync(self, force: bool = False) -> None:
+        if not force and time.monotonic() < self._next_sync:
+            return
+        with self._lock:
+            if not force and time.monotonic() < self._next_sync:
+                return
+            changes: list[tuple[str, str | None]] = []
+            reset = False
+            with pool.connect(self.db_path, readonly=True) as conn:
+                top = head(conn)
+                if self.cursor is not None and top > self.cursor:
+                    oldest = conn.execute(
+                        "SELECT MIN(id) FROM cache_invalidations"
+                    ).fetchone()[0]
+                    reset = oldest is None or oldest > self.cursor + 1
+                    if not reset:
+                        changes = conn.execute(
+                            "SELECT DISTINCT scope, key FROM cache_invalidations "
+                            "WHERE id > ? AND id <= ?",
+                            (self.cursor, top),
+                        ).fetchall()
+            # the first sync only marks the position: nothing was cached yet
+            self.cursor = top
+            self.counters["syncs"] += 1
+            if reset:
+                self.counters["resets"] += 1
+                with _handlers_lock:
+                    scopes = list(_handlers)
+                changes = [(scope, None) for scope in scopes]
+            self.counters["invalidations"] += len(changes)
+            for scope, key in changes:
+                _dispatch(scope, key)
+            self._next_sync = time.monotonic() + self.interval
+
+
+_invalidators: dict[str, Invalidator] = {}
+_invalidators_lock = threading.Lock()
+
+
+def get_invalidator(db_path: str) -> Invalidator:
+    with _invalidators_lock:
+        invalidator = _invalidators.get(db_path)
+        if invalidator is None:
+            invalidator = _invalidators[db_path] = Invalidator(db_path)
+        return invalidator
+
+
+def sync(db_path: str) -> None:
+    """Bring this process's caches up to date with `db_path`'s log."""
+    get_invalidator(db_path).sync()
+
+
+def stats() -> dict[str, int]:
+    totals = {"syncs": 0, "invalidations": 0, "resets": 0}
+    with _invalidators_lock:
+        invalidators = list(_invalidators.values())
+    for invalidator in invalidators:
+        with invalidator._lock:
+            for name, value in invalidator.counters.items():
+                totals[name] += value
+    return totals
+
+
+def reset() -> None:
+    """Forget every database's replay position."""
+    with _invalidators_lock:
+        _invalidators.clear()
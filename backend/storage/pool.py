@@ -0,0 +1,199 @@
+import os
+import queue
+import sqlite3
+import threading
+import urllib.request
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+
+
+@dataclass(frozen=True)
+class PragmaProfile:
+    """PRAGMAs applied once to every pooled connection when it is opened."""
+
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    busy_timeout_ms: int = 5000
+    mmap_size: int = 256 * 1024 * 1024
+    cache_size: int = -16000  # negative = KiB, i.e. 16 MiB per connection
+    temp_store: str = "MEMORY"
+
+    @classmethod
+    def from_env(cls) -> "PragmaProfile":
+        return cls(
+            journal_mode=os.getenv("SQLITE_JOURNAL_MODE", cls.journal_mode),
+            synchronous=os.getenv("SQLITE_SYNCHRONOUS", cls.synchronous),
+            busy_timeout_ms=int(
+                os.getenv("SQLITE_BUSY_TIMEOUT_MS", str(cls.busy_timeout_ms))
+            ),
+            mmap_size=int(os.getenv("SQLITE_MMAP_SIZE", str(cls.mmap_size))),
+            cache_size=int(os.getenv("SQLITE_CACHE_SIZE", str(cls.cache_size))),
+            temp_store=os.getenv("SQLITE_TEMP_STORE", cls.temp_store),
+        )
+
+    def statements(self, readonly: bool) -> list[str]:
+        stmts = [
+            f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}",
+            "PRAGMA foreign_keys = ON",
+            f"PRAGMA synchronous = {self.synchronous}",
+            f"PRAGMA mmap_size = {int(self.mmap_size)}",
+            f"PRAGMA cache_size = {int(self.cache_size)}",
+            f"PRAGMA temp_store = {self.temp_store}",
+        ]
+        if readonly:
+            stmts.append("PRAGMA query_only = ON")
+        else:
+            # journal_mode is stored in the database file; needs a writable handle
+            stmts.insert(0, f"PRAGMA journal_mode = {self.journal_mode}")
+        return stmts
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of SQLite connections to one database file.
+
+    Connections are opened lazily, configured once with the PRAGMA profile
+    and handed out one thread at a time. At most `size` idle connections are
+    kept; extra ones opened under load are closed when returned.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        readonly: bool = False,
+        size: int = POOL_SIZE,
+        profile: PragmaProfile | None = None,
+    ):
+        self.db_path = db_path
+        self.readonly = readonly
+        self.size = max(1, size)
+        self.profile = profile or PragmaProfile.from_env()
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue(
+            maxsize=self.size
+        )
+        self._lock = threading.Lock()
+        self.counters = {"opens": 0, "pragmas": 0, "checkouts": 0}
+
+    def _incr(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    def _open(self) -> sqlite3.Connection:
+        if self.readonly:
+            uri = "file:" + urllib.request.pathname2url(
+                os.path.abspath(self.db_path)
+            )
+            conn = sqlite3.connect(
+                f"{uri}?mode=ro", uri=True, check_same_thread=False
+            )
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        stmts = self.profile.statements(self.readonly)
+        for stmt in stmts:
+            conn.execute(stmt)
+        self._incr("opens")
+        self._incr("pragmas", len(stmts))
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        self._incr("checkouts")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._open()
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except (queue.Full, sqlite3.Error):
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection. Like `with sqlite3.connect(...)`, a clean exit
+        commits any open transaction and an exception rolls it back.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class RequestConnection:
+    """
+    Connection handle for one request, borrowed from `pool` on first use and
+    returned by close(). Its dependencies and endpoint share a single
+    checkout, and a request answered entirely from caches borrows nothing.
+    Use it from one thread at a time.
+    """
+
+    def __init__(self, pool: ConnectionPool):
+        self._pool = pool
+        self._conn: sqlite3.Connection | None = None
+
+    def __getattr__(self, name: str):
+        if self._conn is None:
+            self._conn = self._pool.acquire()
+        return getattr(self._conn, name)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+
+_pools: dict[tuple[str, bool], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str, readonly: bool = False) -> ConnectionPool:
+    key = (os.path.abspath(db_path), readonly)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_path, readonly=readonly)
+        return pool
+
+
+def connect(db_path: str, readonly: bool = False):
+    """Context manager yielding a pooled connection to `db_path`."""
+    return get_pool(db_path, readonly).connection()
+
+
+def stats() -> dict[str, int]:
+    totals = {"opens": 0, "pragmas": 0, "checkouts": 0}
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        with pool._lock:
+            for name, value in pool.counters.items():
+                totals[name] += value
+    return totals
+
+
+def close_all() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,251 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass
+
+from . import writer
+from .timestamps import now_ms
+
+log = logging.getLogger("storage.retention")
+
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "1").strip().lower() in (
+    "1", "true", "yes", "on"
+)
+RETENTION_INTERVAL_SECONDS = float(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+RETENTION_PAUSE_MS = float(os.getenv("RETENTION_PAUSE_MS", "50"))
+VACUUM_PAGES_PER_STEP = int(os.getenv("RETENTION_VACUUM_PAGES", "256"))
+
+DAY_MS = 86_400_000
+
+# alerts columns kept in alerts_archive
+ALERT_ARCHIVE_COLUMNS = (
+    "id", "dev_eui", "alert_type", "message", "created_at",
+    "acknowledged", "acknowledged_at",
+)
+
+
+@dataclass(frozen=True)
+class Policy:
+    """
+    Rows of `table` matching `where` (with the cutoff bound to its single
+    parameter) are removed once older than `days`; days <= 0 disables the
+    policy. With `archive_table` set, rows are copied there first: its
+    `archive_columns` from the table, plus archived_at.
+    """
+    name: str
+    table: str
+    key: str
+    where: str
+    days: float
+    millis: bool = False
+    archive_table: str | None = None
+    archive_columns: tuple[str, ...] = ()
+
+    def cutoff(self, now: int) -> int:
+        """Cutoff in the table's own unit (epoch ms or epoch seconds)."""
+        age_ms = int(self.days * DAY_MS)
+        return now - age_ms if self.millis else (now - age_ms) // 1000
+
+
+def default_policies() -> list[Policy]:
+    return [
+        # raw rows only go once their day is in the daily rollup
+        Policy(
+            name="telemetry",
+            table="telemetry",
+            key="id",
+            where="""
+                ts_ms < ?
+                AND EXISTS (
+                  SELECT 1 FROM telemetry_1d d
+                  WHERE d.device_eui = telemetry.device_eui
+                    AND d.bucket_ms = (telemetry.ts_ms / 86400000) * 86400000
+                )
+            """,
+            days=float(os.getenv("RETENTION_TELEMETRY_DAYS", "30")),
+            millis=True,
+        ),
+        Policy(
+            name="alert_queue",
+            table="alert_queue",
+            key="id",
+            where="processed = 1 AND processed_at < ?",
+            days=float(os.getenv("RETENTION_ALERT_QUEUE_DAYS", "7")),
+        ),
+        Policy(
+            name="alerts",
+            table="alerts",
+            key="id",
+            where="acknowledged = 1 AND acknowledged_at < ?",
+            days=float(os.getenv("RETENTION_ALERTS_DAYS", "90")),
+            archive_table="alerts_archive",
+            archive_columns=ALERT_ARCHIVE_COLUMNS,
+        ),
+        # /stream replays from here; older cursors get a reset event
+        Policy(
+            name="events",
+            table="events",
+            key="id",
+            where="created_ms < ?",
+            days=float(os.getenv("RETENTION_EVENTS_DAYS", "1")),
+            millis=True,
+        ),
+        # workers that fall behind the pruned log drop their caches
+        Policy(
+            name="cache_invalidations",
+            table="cache_invalidations",
+            key="id",
+            where="created_ms < ?",
+            days=float(os.getenv("RETENTION_CACHE_INVALIDATIONS_DAYS", "1")),
+            millis=True,
+        ),
+    ]
+
+
+def _free_pages(conn: sqlite3.Connection) -> tuple[int, int]:
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return page_size, free
+
+
+def purge_batch(conn: sqlite3.Connection, policy: Policy, cutoff: int,
+                batch_size: int, archived_at: int) -> int:
+    """Archive (if configured) and delete one batch. Returns rows removed."""
+    keys = [
+        row[0] for row in conn.execute(
+            f"SELECT {policy.key} FROM {policy.table} WHERE {policy.where} "
+            f"ORDER BY {policy.key} LIMIT ?",
+            (cutoff, batch_size),
+        )
+    ]
+    if not keys:
+        return 0
+    marks = ", ".join("?" for _ in keys)
+    if policy.archive_table:
+        columns = ", ".join(policy.archive_columns)
+        conn.execute(
+            f"INSERT OR REPLACE INTO {policy.archive_table} ({columns}, archived_at) "
+            f"SELECT {columns}, ? FROM {policy.table} "
+            f"WHERE {policy.key} IN ({marks})",
+            (archived_at, *keys),
+        )
+    conn.execute(
+        f"DELETE FROM {policy.table} WHERE {policy.key} IN ({marks})", keys
+    )
+    return len(keys)
+
+
+def _auto_vacuum(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+
+def check_auto_vacuum(db_path: str) -> bool:
+    """
+    Whether the database can be shrunk by incremental_vacuum(). Logs a
+    warning when it cannot, since space reclaim is then silently off.
+    """
+    if writer.run_write(db_path, _auto_vacuum) == 2:
+        return True
+    log.warning(
+        "[retention] %s is not in auto_vacuum=INCREMENTAL mode; freed pages "
+        "stay in the file. Run init_sqlite_db.py --incremental-vacuum once "
+        "to enable space reclaim",
+        db_path,
+    )
+    return False
+
+
+def incremental_vacuum(db_path: str, pages: int = VACUUM_PAGES_PER_STEP,
+                       pause_ms: float = RETENTION_PAUSE_MS) -> int:
+    """
+    Return free pages to the filesystem a few at a time. Only works on
+    databases in auto_vacuum=INCREMENTAL mode; otherwise freed pages stay
+    in the file for reuse. Returns the bytes released.
+    """
+    if writer.run_write(db_path, _auto_vacuum) != 2:
+        return 0
+
+    def step(conn):
+        page_size, before = _free_pages(conn)
+        conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+        _, after = _free_pages(conn)
+        return (before - after) * page_size, after
+
+    released = 0
+    while True:
+        freed, remaining = writer.run_write(db_path, step)
+        released += freed
+        if not remaining or not freed:
+            return released
+        if pause_ms > 0:
+            time.sleep(pause_ms / 1000.0)
+
+
+def run_once(
+    db_path: str,
+    policies: list[Policy] | None = None,
+    batch_size: int = RETENTION_BATCH_SIZE,
+    pause_ms: float = RETENTION_PAUSE_MS,
+) -> dict:
+    """
+    Apply every policy in small write transactions, pausing between batches
+    so ingestion keeps the write lock most of the time, then run an
+    incremental vacuum. Returns rows and bytes reclaimed per table plus the
+    bytes the vacuum returned to the filesystem.
+    """
+    now = now_ms()
+    report: dict = {"tables": {}, "vacuumed_bytes": 0}
+    batch_size = max(1, batch_size)
+
+    for policy in policies if policies is not None else default_policies():
+        if policy.days <= 0:
+            continue
+        cutoff = policy.cutoff(now)
+        page_size, free_before = writer.run_write(db_path, _free_pages)
+        rows = 0
+        while True:
+            n = writer.run_write(
+                db_path,
+                lambda conn: purge_batch(conn, policy, cutoff, batch_size, now // 1000),
+            )
+            rows += n
+            if n < batch_size:
+                break
+            if pause_ms > 0:
+                time.sleep(pause_ms / 1000.0)
+        _, free_after = writer.run_write(db_path, _free_pages)
+        report["tables"][policy.name] = {
+            "rows": rows,
+            "bytes": max(0, free_after - free_before) * page_size,
+        }
+
+    report["vacuumed_bytes"] = incremental_vacuum(db_path, pause_ms=pause_ms)
+    return report
+
+
+def retention_loop(db_path: str) -> None:
+    log.info(
+        "[retention] scheduler started (interval=%ss)", RETENTION_INTERVAL_SECONDS
+    )
+    while True:
+        try:
+            report = run_once(db_path)
+            log.info("[retention] %s", report)
+        except Exception:
+            log.exception("[retention] unexpected error in retention_loop")
+        time.sleep(RETENTION_INTERVAL_SECONDS)
+
+
+def start_retention(db_path: str) -> threading.Thread | None:
+    if not RETENTION_ENABLED:
+        log.info("[retention] disabled (RETENTION_ENABLED=0)")
+        return None
+    check_auto_vacuum(db_path)
+    t = threading.Thread(
+        target=retention_loop, args=(db_path,), daemon=True, name="retention"
+    )
+    t.start()
+    return t
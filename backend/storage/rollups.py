@@ -0,0 +1,199 @@
+import os
+import sqlite3
+
+from . import writer
+from .timestamps import now_ms, to_epoch_ms
+
+# Bucket width in milliseconds, finest first
+RESOLUTIONS = {"1m": 60_000, "1h": 3_600_000, "1d": 86_400_000}
+METRICS = ("temperature_c", "humidity_pct", "battery_level", "rssi", "snr")
+DAY_MS = RESOLUTIONS["1d"]
+
+# /telemetry?resolution=auto serves raw rows for ranges up to this long
+AUTO_RAW_MAX_SPAN_MS = int(os.getenv("TELEMETRY_AUTO_RAW_MAX_HOURS", "6")) * 3_600_000
+
+
+def _metric_columns() -> list[str]:
+    return [f"{m}_{part}" for m in METRICS for part in ("min", "max", "sum", "n")]
+
+
+_COLUMNS = ["device_eui", "bucket_ms", "samples", "smoke_count", *_metric_columns()]
+
+
+def _merge(m: str) -> str:
+    # min()/max() with two arguments return NULL if either is NULL
+    return (
+        f"{m}_min = min(coalesce({m}_min, excluded.{m}_min), "
+        f"coalesce(excluded.{m}_min, {m}_min)),\n"
+        f"  {m}_max = max(coalesce({m}_max, excluded.{m}_max), "
+        f"coalesce(excluded.{m}_max, {m}_max)),\n"
+        f"  {m}_sum = {m}_sum + excluded.{m}_sum,\n"
+        f"  {m}_n = {m}_n + excluded.{m}_n"
+    )
+
+
+def _upsert_sql(table: str) -> str:
+    placeholders = ", ".join("?" for _ in _COLUMNS)
+    merges = ",\n  ".join(_merge(m) for m in METRICS)
+    return f"""
+        INSERT INTO {table} ({", ".join(_COLUMNS)})
+        VALUES ({placeholders})
+        ON CONFLICT(device_eui, bucket_ms) DO UPDATE SET
+          samples = samples + excluded.samples,
+          smoke_count = smoke_count + excluded.smoke_count,
+          {merges}
+    """
+
+
+def _rebuild_sql(table: str, width: int) -> str:
+    aggregates = ", ".join(
+        f"MIN({m}), MAX({m}), TOTAL({m}), COUNT({m})" for m in METRICS
+    )
+    return f"""
+        INSERT INTO {table} ({", ".join(_COLUMNS)})
+        SELECT
+          device_eui, (ts_ms / {width}) * {width} AS bucket,
+          COUNT(*), COALESCE(SUM(smoke_detected = 1), 0),
+          {aggregates}
+        FROM telemetry
+        WHERE ts_ms >= ? AND ts_ms < ?
+        GROUP BY device_eui, bucket
+    """
+
+
+_UPSERT = {res: _upsert_sql(f"telemetry_{res}") for res in RESOLUTIONS}
+_REBUILD = {
+    res: _rebuild_sql(f"telemetry_{res}", width) for res, width in RESOLUTIONS.items()
+}
+
+
+def apply(conn: sqlite3.Connection, rows: list[dict]) -> None:
+    """
+    Fold newly stored telemetry rows into every rollup. Call in the same
+    transaction as the telemetry insert, with only the rows actually
+    inserted, so each uplink is counted once.
+    """
+    samples = []
+    for r in rows:
+        ts_ms = to_epoch_ms(r["timestamp"])
+        if ts_ms is None:
+            continue
+        values = []
+        for m in METRICS:
+            v = r.get(m)
+            # sums start at 0.0 like TOTAL() in rebuild_range
+            values += [v, v, 0.0 if v is None else v, 0 if v is None else 1]
+        samples.append((r["device_eui"], ts_ms, 1 if r.get("smoke_detected") else 0,
+                        values))
+    if not samples:
+        return
+    for res, width in RESOLUTIONS.items():
+        conn.executemany(
+            _UPSERT[res],
+            [
+                (dev_eui, (ts_ms // width) * width, 1, smoke, *values)
+                for dev_eui, ts_ms, smoke, values in samples
+            ],
+        )
+
+
+def rebuild_range(conn: sqlite3.Connection, from_ms: int, to_ms: int) -> int:
+    """
+    Recompute every rollup bucket in [from_ms, to_ms) from raw telemetry.
+    Both bounds are rounded out to whole days so all three tables cover the
+    same rows. Idempotent. Returns the number of 1m buckets written.
+    """
+    from_ms = (from_ms // DAY_MS) * DAY_MS
+    to_ms = -(-to_ms // DAY_MS) * DAY_MS
+    written = 0
+    for res in RESOLUTIONS:
+        table = f"telemetry_{res}"
+        conn.execute(
+            f"DELETE FROM {table} WHERE bucket_ms >= ? AND bucket_ms < ?",
+            (from_ms, to_ms),
+        )
+        cur = conn.execute(_REBUILD[res], (from_ms, to_ms))
+        if res == "1m":
+            written = cur.rowcount
+    return written
+
+
+def run_backfill(db_path: str) -> int:
+    """
+    Roll up history stored before the rollup tables existed, one day per
+    write transaction, newest day first. Every day after the earliest daily
+    bucket is then covered, so an interrupted run resumes where it stopped
+    and this is a no-op once history is covered.
+    Returns the number of 1m buckets written.
+    """
+    def bounds(conn):
+        return conn.execute(
+            """
+            SELECT
+              (SELECT MIN(ts_ms) FROM telemetry),
+              (SELECT MAX(ts_ms) FROM telemetry),
+              (SELECT MIN(bucket_ms) FROM telemetry_1d)
+            """
+        ).fetchone()
+
+    raw_start, raw_end, rolled_start = writer.run_write(db_path, bounds)
+    if raw_start is None:
+        return 0
+    if rolled_start is None:
+        day = (raw_end // DAY_MS) * DAY_MS
+    elif raw_start < rolled_start:
+        # the earliest rolled-up day may hold only live rows or be where an
+        # earlier run stopped; rebuild it too
+        day = rolled_start
+    else:
+        return 0
+
+    written = 0
+    first = (raw_start // DAY_MS) * DAY_MS
+    while day >= first:
+        written += writer.run_write(
+            db_path, lambda conn: rebuild_range(conn, day, day + DAY_MS)
+        )
+        day -= DAY_MS
+    return written
+
+
+def select_resolution(requested: str, from_ms: int | None, to_ms: int | None,
+                      limit: int) -> str:
+    """
+    Table to serve a /telemetry request from. "auto" picks raw rows for
+    short or open-ended ranges, otherwise the finest rollup whose bucket
+    count for the range fits in `limit`.
+    """
+    if requested != "auto":
+        return requested
+    if from_ms is None:
+        return "raw"
+    span = max(0, (to_ms if to_ms is not None else now_ms()) - from_ms)
+    if span <= AUTO_RAW_MAX_SPAN_MS:
+        return "raw"
+    for res, width in RESOLUTIONS.items():
+        if span // width <= limit:
+            return res
+    return "1d"
+
+
+def query_sql(resolution: str, where: str, order: str) -> str:
+    """SELECT for one rollup table, shaped like raw /telemetry rows."""
+    metrics = ",\n          ".join(
+        f"{m}_sum / NULLIF({m}_n, 0) AS {m}, {m}_min, {m}_max" for m in METRICS
+    )
+    return f"""
+        SELECT
+          device_eui,
+          strftime('%Y-%m-%dT%H:%M:%S+00:00', bucket_ms / 1000, 'unixepoch')
+            AS timestamp,
+          bucket_ms,
+          samples,
+          smoke_count,
+          {metrics}
+        FROM telemetry_{resolution}
+        {where}
+        ORDER BY bucket_ms {order}, device_eui {order}
+        LIMIT ?
+    """
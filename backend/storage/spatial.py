@@ -0,0 +1,170 @@
+import math
+import hashlib
+import sqlite3
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def position_id(device_eui: str) -> int:
+    """
+    R*Tree row id for a node. A 64-bit DevEUI is used directly (as a signed
+    integer); anything else falls back to a 64-bit hash of the identifier.
+    """
+    if len(device_eui) == 16:
+        try:
+            value = int(device_eui, 16)
+        except ValueError:
+            pass
+        else:
+            return value - (1 << 64) if value >= 1 << 63 else value
+    digest = hashlib.blake2b(device_eui.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def sync_positions(conn: sqlite3.Connection, device_euis) -> int:
+    """
+    Copy node_latest coordinates into node_positions for the given nodes,
+    touching the R*Tree only where the position actually changed; nodes
+    whose latest row has no position are dropped from the index.
+    Returns the number of index rows written or removed.
+    """
+    written = 0
+    for dev_eui in set(device_euis):
+        pid = position_id(dev_eui)
+        written += conn.execute(
+            """
+            DELETE FROM node_positions
+            WHERE id = ? AND EXISTS (
+              SELECT 1 FROM node_latest
+              WHERE device_eui = ? AND (latitude IS NULL OR longitude IS NULL)
+            )
+            """,
+            (pid, dev_eui),
+        ).rowcount
+        cur = conn.execute(
+            """
+            INSERT OR REPLACE INTO node_positions
+              (id, min_lat, max_lat, min_lon, max_lon, device_eui, lat, lon)
+            SELECT ?, latitude, latitude, longitude, longitude,
+                   device_eui, latitude, longitude
+            FROM node_latest nl
+            WHERE nl.device_eui = ?
+              AND nl.latitude IS NOT NULL
+              AND nl.longitude IS NOT NULL
+              AND NOT EXISTS (
+                SELECT 1 FROM node_positions p
+                WHERE p.id = ? AND p.lat = nl.latitude AND p.lon = nl.longitude
+              )
+            """,
+            (pid, dev_eui, pid),
+        )
+        written += cur.rowcount
+    return written
+
+
+def backfill_positions(conn: sqlite3.Connection) -> int:
+    """Index every node_latest position not yet in node_positions."""
+    device_euis = [
+        row[0] for row in conn.execute(
+            "SELECT device_eui FROM node_latest "
+            "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+        )
+    ]
+    return sync_positions(conn, device_euis)
+
+
+# R*Tree boxes are stored as 32-bit floats rounded outwards, so the index
+# narrows candidates and the exact lat/lon auxiliary columns decide.
+BBOX_SQL = """
+    SELECT
+      nl.device_eui,
+      nl.timestamp,
+      nl.latitude,
+      nl.longitude,
+      nl.temperature_c,
+      nl.humidity_pct,
+      nl.battery_level,
+      nl.smoke_detected
+    FROM node_positions p
+    JOIN node_latest nl ON nl.device_eui = p.device_eui
+    WHERE p.max_lat >= ? AND p.min_lat <= ?
+      AND p.max_lon >= ? AND p.min_lon <= ?
+      AND p.lat BETWEEN ? AND ?
+      AND p.lon BETWEEN ? AND ?
+    ORDER BY nl.device_eui
+    LIMIT ?
+"""
+
+
+def bbox_params(min_lat, max_lat, min_lon, max_lon, limit) -> tuple:
+    return (
+        min_lat, max_lat, min_lon, max_lon,
+        min_lat, max_lat, min_lon, max_lon,
+        limit,
+    )
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _search_box(lat: float, lon: float, radius_km: float):
+    """
+    Smallest lat/lon box containing the spherical cap of radius_km around
+    the point, or None once the cap covers the whole globe.
+    """
+    r = radius_km / EARTH_RADIUS_KM
+    if r >= math.pi:
+        return None
+    d_lat = math.degrees(r)
+    s = math.sin(r) / max(math.cos(math.radians(lat)), 1e-12)
+    if s >= 1 or lat + d_lat >= 90 or lat - d_lat <= -90:
+        # the cap reaches a pole: every longitude is in range
+        return lat - d_lat, lat + d_lat, -180.0, 180.0
+    d_lon = math.degrees(math.asin(s))
+    if lon - d_lon < -180 or lon + d_lon > 180:
+        return lat - d_lat, lat + d_lat, -180.0, 180.0  # crosses the antimeridian
+    return lat - d_lat, lat + d_lat, lon - d_lon, lon + d_lon
+
+
+def nearest(conn: sqlite3.Connection, lat: float, lon: float, n: int,
+            start_km: float = 5.0) -> list[dict]:
+    """
+    The n nodes closest to (lat, lon), nearest first, each with distance_km.
+
+    Looks up a box around the point in the R*Tree and doubles its radius
+    until n nodes lie within that radius, so only nodes near the point are
+    read.
+    """
+    radius_km = start_km
+    while True:
+        box = _search_box(lat, lon, radius_km)
+        if box is None:
+            rows = conn.execute(
+                "SELECT device_eui, lat, lon FROM node_positions"
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                """
+                SELECT device_eui, lat, lon FROM node_positions
+                WHERE max_lat >= ? AND min_lat <= ?
+                  AND max_lon >= ? AND min_lon <= ?
+                """,
+                box,
+            ).fetchall()
+        found = sorted(
+            (haversine_km(lat, lon, r["lat"], r["lon"]), r["device_eui"])
+            for r in rows
+        )
+        if box is not None:
+            found = [f for f in found if f[0] <= radius_km]
+        if box is None or len(found) >= n:
+            return [
+                {"device_eui": dev_eui, "distance_km": round(dist, 3)}
+                for dist, dev_eui in found[:n]
+            ]
+        radius_km *= 2
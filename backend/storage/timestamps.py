@@ -0,0 +1,124 @@
+import os
+import time
+import sqlite3
+import datetime
+
+from . import writer
+
+BACKFILL_BATCH_SIZE = int(os.getenv("EPOCH_BACKFILL_BATCH_SIZE", "2000"))
+BACKFILL_PAUSE_MS = float(os.getenv("EPOCH_BACKFILL_PAUSE_MS", "50"))
+
+
+def iso_to_ms_sql(column: str) -> str:
+    """
+    SQL expression converting an ISO-8601 TEXT column to epoch milliseconds.
+    julianday() understands "Z" and "+HH:MM" suffixes and reads naive values
+    as UTC; unparseable text yields NULL.
+    """
+    return f"CAST(ROUND((julianday({column}) - 2440587.5) * 86400000) AS INTEGER)"
+
+
+def to_epoch_ms(value: datetime.datetime | None) -> int | None:
+    """Epoch milliseconds for a datetime; naive values are taken as UTC."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.UTC)
+    return int(round(value.timestamp() * 1000))
+
+
+def from_epoch_ms(ms: int | None) -> datetime.datetime | None:
+    if ms is None:
+        return None
+    return datetime.datetime.fromtimestamp(ms / 1000, tz=datetime.UTC)
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def parse_time_param(value: str | None) -> int | None:
+    """
+    Parse a time query parameter into epoch milliseconds. Accepts integer
+    epoch milliseconds or ISO-8601 ("Z", an offset, or naive UTC).
+    Raises ValueError for anything else.
+    """
+    if value is None or not value.strip():
+        return None
+    value = value.strip()
+    if value.lstrip("-").isdigit():
+        return int(value)
+    return to_epoch_ms(datetime.datetime.fromisoformat(value.replace("Z", "+00:00")))
+
+
+def backfill_small_tables(conn: sqlite3.Connection) -> int:
+    """
+    Fill the epoch columns of nodes and node_latest, which hold one row per
+    device and are cheap to convert in a single statement.
+    Returns the number of rows updated.
+    """
+    updated = conn.execute(
+        f"""
+        UPDATE nodes SET last_seen_ms = {iso_to_ms_sql("last_seen")}
+        WHERE last_seen_ms IS NULL AND last_seen IS NOT NULL
+        """
+    ).rowcount
+    updated += conn.execute(
+        f"""
+        UPDATE node_latest
+        SET ts_ms = {iso_to_ms_sql("timestamp")},
+            device_ts_ms = {iso_to_ms_sql("device_timestamp")}
+        WHERE ts_ms IS NULL
+        """
+    ).rowcount
+    return updated
+
+
+def backfill_telemetry_batch(conn: sqlite3.Connection, hi_id: int, lo_id: int) -> int:
+    """Convert telemetry rows with lo_id < id <= hi_id. Returns rows updated."""
+    cur = conn.execute(
+        f"""
+        UPDATE telemetry
+        SET ts_ms = {iso_to_ms_sql("timestamp")},
+            device_ts_ms = {iso_to_ms_sql("device_timestamp")}
+        WHERE id > ? AND id <= ? AND ts_ms IS NULL
+        """,
+        (lo_id, hi_id),
+    )
+    return cur.rowcount
+
+
+def run_backfill(
+    db_path: str,
+    batch_size: int = BACKFILL_BATCH_SIZE,
+    pause_ms: float = BACKFILL_PAUSE_MS,
+) -> int:
+    """
+    Convert legacy ISO timestamps to epoch milliseconds without blocking
+    ingestion: telemetry is walked by rowid from newest to oldest, one short
+    write transaction per batch, with a pause between batches so the
+    listener's own writes interleave. Newest rows go first because they are
+    the ones range queries and dashboards ask for.
+    Returns the number of rows converted.
+    """
+    total = writer.run_write(db_path, backfill_small_tables)
+
+    def bounds(conn):
+        return conn.execute(
+            "SELECT MIN(id), MAX(id) FROM telemetry WHERE ts_ms IS NULL"
+        ).fetchone()
+
+    lo, hi = writer.run_write(db_path, bounds)
+    if hi is None:
+        return total
+
+    batch_size = max(1, batch_size)
+    while hi >= lo:
+        floor = hi - batch_size
+        total += writer.run_write(
+            db_path, lambda conn: backfill_telemetry_batch(conn, hi, floor)
+        )
+        hi = floor
+        if pause_ms > 0:
+            time.sleep(pause_ms / 1000.0)
+    return total
@@ -0,0 +1,36 @@
+import hashlib
+import sqlite3
+
+
+def current(conn: sqlite3.Connection, names: tuple[str, ...]) -> tuple[int, ...]:
+    """Version counters for the given source tables, in the order asked."""
+    marks = ", ".join("?" for _ in names)
+    found = dict(
+        conn.execute(
+            f"SELECT name, version FROM data_versions WHERE name IN ({marks})",
+            names,
+        ).fetchall()
+    )
+    return tuple(found.get(name, 0) for name in names)
+
+
+def etag(versions: tuple[int, ...], *scope: object) -> str:
+    """
+    Strong ETag for a response built from tables at `versions`. `scope` is
+    whatever else selects the payload (path, query string, user), so equal
+    data versions never collide across different requests.
+    """
+    key = "|".join(str(part) for part in (*versions, *scope))
+    digest = hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def matches(if_none_match: str | None, tag: str) -> bool:
+    """True when an If-None-Match header names `tag` (weak tags compare too)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == tag:
+            return True
+    return False
@@ -0,0 +1,326 @@
+import os
+import time
+import queue
+import sqlite3
+import threading
+import logging
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from . import pool
+
+log = logging.getLogger("storage.writer")
+
+# Off by default: every caller writes on its own pooled connection
+SINGLE_WRITER = os.getenv("SQLITE_SINGLE_WRITER", "0").strip().lower() in (
+    "1", "true", "yes", "on"
+)
+GROUP_COMMIT_MAX_JOBS = int(os.getenv("SQLITE_GROUP_COMMIT_MAX_JOBS", "64"))
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("SQLITE_GROUP_COMMIT_WINDOW_MS", "2"))
+# Longest a transaction() block may hold the writer before it is rolled back
+WRITE_LEASE_TIMEOUT_MS = float(os.getenv("SQLITE_WRITE_LEASE_TIMEOUT_MS", "5000"))
+
+
+class _JobConnection:
+    """
+    Connection handed to a write job. commit() and rollback() are no-ops so
+    existing helpers that commit can run unchanged: the writer commits the
+    whole group, and a job that raises is rolled back to its own savepoint.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class _LeasedConnection(_JobConnection):
+    """
+    Job connection lent to a transaction() block in the caller's thread.
+    Once the lease is revoked every call raises, so a block that overran
+    its lease cannot touch the connection while the writer moves on.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        super().__init__(conn)
+        self._guard = threading.Lock()
+        self._revoked = False
+
+    def revoke(self) -> None:
+        with self._guard:
+            self._revoked = True
+
+    def __getattr__(self, name):
+        attr = getattr(self._conn, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self._guard:
+                if self._revoked:
+                    raise TimeoutError("write lease expired; the block was rolled back")
+                return attr(*args, **kwargs)
+        return call
+
+
+class WriteService:
+    """
+    Single thread that owns the write connection for one database.
+
+    Jobs are callables taking a connection. The writer takes the first queued
+    job, gathers whatever else arrives within GROUP_COMMIT_WINDOW_MS (up to
+    GROUP_COMMIT_MAX_JOBS), runs each in its own SAVEPOINT and commits the
+    batch once, so N concurrent writers cost one fsync instead of N and never
+    contend for the database lock with each other.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_jobs: int = GROUP_COMMIT_MAX_JOBS,
+        window_ms: float = GROUP_COMMIT_WINDOW_MS,
+    ):
+        self.db_path = db_path
+        self.max_jobs = max(1, max_jobs)
+        self.window = max(0.0, window_ms) / 1000.0
+        self._jobs: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name="sqlite-writer"
+        )
+        self._lock = threading.Lock()
+        # thread running a transaction() block on the writer's connection
+        self.lease_owner: int | None = None
+        self.counters = {"jobs": 0, "batches": 0, "failed_jobs": 0, "largest_batch": 0}
+
+    def start(self) -> "WriteService":
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._jobs.put(None)
+        self._thread.join(timeout)
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        # the writer is blocked on this thread, so the job could never run
+        if threading.get_ident() in (self.lease_owner, self._thread.ident):
+            raise RuntimeError(
+                "nested write on the single-writer connection; "
+                "use the connection already held"
+            )
+        future: Future = Future()
+        self._jobs.put((future, fn, args, kwargs))
+        return future
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_jobs:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    job = self._jobs.get(timeout=remaining)
+                else:
+                    job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                self._jobs.put(None)  # finish this batch, then stop
+                break
+            batch.append(job)
+        return batch
+
+    def _run_batch(self, conn: sqlite3.Connection, batch: list) -> None:
+        job_conn = _JobConnection(conn)
+        results = []
+        conn.execute("BEGIN IMMEDIATE")
+        for future, fn, args, kwargs in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            conn.execute("SAVEPOINT job")
+            try:
+                result = fn(job_conn, *args, **kwargs)
+            except Exception as e:
+                conn.execute("ROLLBACK TO job")
+                conn.execute("RELEASE job")
+                results.append((future, None, e))
+            else:
+                conn.execute("RELEASE job")
+                results.append((future, result, None))
+        try:
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            results = [(f, None, err or e) for f, _, err in results]
+
+        failed = 0
+        for future, result, error in results:
+            if error is not None:
+                failed += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        with self._lock:
+            self.counters["jobs"] += len(results)
+            self.counters["batches"] += 1
+            self.counters["failed_jobs"] += failed
+            self.counters["largest_batch"] = max(
+                self.counters["largest_batch"], len(results)
+            )
+
+    def _run(self) -> None:
+        db_pool = pool.get_pool(self.db_path)
+        conn = db_pool.acquire()
+        # explicit BEGIN/SAVEPOINT/COMMIT only; no implicit transactions
+        conn.isolation_level = None
+        try:
+            while True:
+                first = self._jobs.get()
+                if first is None:
+                    return
+                batch = self._collect(first)
+                try:
+                    self._run_batch(conn, batch)
+                except Exception as e:
+                    log.exception("[writer] batch failed")
+                    for future, *_ in batch:
+                        if not future.done():
+                            future.set_exception(e)
+        finally:
+            conn.isolation_level = ""
+            db_pool.release(conn)
+
+
+_writers: dict[str, WriteService] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(db_path: str) -> WriteService | None:
+    """The running writer for `db_path`, or None when SINGLE_WRITER is off."""
+    if not SINGLE_WRITER:
+        return None
+    key = os.path.abspath(db_path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = WriteService(
+                db_path, GROUP_COMMIT_MAX_JOBS, GROUP_COMMIT_WINDOW_MS
+            ).start()
+        return writer
+
+
+def submit_write(db_path: str, fn, conn_factory=None) -> Future:
+    """
+    Queue fn(conn) as one write transaction and return a Future for its
+    result. Without the single writer the job runs immediately on a pooled
+    connection (or `conn_factory()`), and the returned future is already done.
+    """
+    writer = get_writer(db_path)
+    if writer is not None:
+        return writer.submit(fn)
+
+    future: Future = Future()
+    try:
+        factory = conn_factory or (lambda: pool.connect(db_path))
+        with factory() as conn:
+            result = fn(conn)
+            conn.commit()
+    except Exception as e:
+        future.set_exception(e)
+    else:
+        future.set_result(result)
+    return future
+
+
+def run_write(db_path: str, fn, conn_factory=None):
+    """Run fn(conn) as one write transaction and return its result."""
+    return submit_write(db_path, fn, conn_factory).result()
+
+
+@contextmanager
+def transaction(db_path: str, conn_factory=None):
+    """
+    Borrow the write connection for a with-block, for code that interleaves
+    reads, checks and writes. With the single writer on, the block is leased
+    one slot in the current group: the writer thread waits while the block
+    runs in the caller's thread, an exception rolls back to the block's
+    savepoint and re-raises, and the group commits once the block exits.
+    A block still running after WRITE_LEASE_TIMEOUT_MS is rolled back and
+    the group moves on; opening a second write inside one raises.
+    """
+    writer = get_writer(db_path)
+    if writer is None:
+        factory = conn_factory or (lambda: pool.connect(db_path))
+        with factory() as conn:
+            yield conn
+        return
+
+    leased = threading.Event()
+    finished = threading.Event()
+    lease: dict = {}
+
+    def job(conn):
+        leased_conn = lease["conn"] = _LeasedConnection(conn)
+        leased.set()
+        done = finished.wait(WRITE_LEASE_TIMEOUT_MS / 1000.0)
+        leased_conn.revoke()
+        if not done:
+            log.warning("[writer] write block overran its lease; rolled back")
+            raise TimeoutError("write lease expired; the block was rolled back")
+        error = lease.get("error")
+        if isinstance(error, Exception):
+            raise error
+        if error is not None:
+            raise RuntimeError("write block aborted") from error
+
+    future = writer.submit(job)
+    future.add_done_callback(lambda _: leased.set())
+    leased.wait()
+    if "conn" not in lease:
+        future.result()  # the batch failed before reaching this job
+
+    owner = writer.lease_owner = threading.get_ident()
+    try:
+        yield lease["conn"]
+    except BaseException as e:
+        lease["error"] = e
+        raise
+    finally:
+        # an expired lease may already belong to another thread
+        if writer.lease_owner == owner:
+            writer.lease_owner = None
+        finished.set()
+        try:
+            future.result()
+        except BaseException:
+            if "error" not in lease:
+                raise
+
+
+def stats() -> dict[str, int]:
+    totals = {"jobs": 0, "batches": 0, "failed_jobs": 0, "largest_batch": 0}
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        with writer._lock:
+            for name, value in writer.counters.items():
+                if name == "largest_batch":
+                    totals[name] = max(totals[name], value)
+                else:
+                    totals[name] += value
+    return totals
+
+
+def stop_all() -> None:
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.stop()
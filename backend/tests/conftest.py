@@ -3,6 +3,8 @@ import sqlite3
 import pytest
 from unittest.mock import patch
 
+from storage import pool, writer
+
 SCHEMA_PATH = os.path.join(
     os.path.abspath(os.path.dirname(__file__)), "..", "sqlite_schema.sql"
 )
@@ -32,6 +34,14 @@ def _seed(conn: sqlite3.Connection) -> None:
     conn.commit()
 
 
+@pytest.fixture(autouse=True)
+def _close_pools():
+    # pools are keyed by database path; each test uses its own tmp database
+    yield
+    writer.stop_all()
+    pool.close_all()
+
+
 @pytest.fixture
 def db_conn():
     conn = sqlite3.connect(":memory:", check_same_thread=False)
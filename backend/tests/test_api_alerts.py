@@ -138,6 +138,87 @@ class TestGetAlerts:
         ids = [d["id"] for d in data]
         assert ids.index(id2) < ids.index(id1)
 
+    def test_etag_revalidation(self, api_client):
+        client, db_path = api_client
+        aid = _insert_alert(db_path, DEV_EUI)
+        first = client.get("/alerts")
+        tag = first.headers["ETag"]
+        again = client.get("/alerts", headers={"If-None-Match": tag})
+        assert again.status_code == 304
+        assert again.content == b""
+        assert client.get(
+            "/alerts?acknowledged=false", headers={"If-None-Match": tag}
+        ).status_code == 200
+
+        client.put(f"/alerts/{aid}/ack")
+        changed = client.get("/alerts", headers={"If-None-Match": tag})
+        assert changed.status_code == 200
+        assert changed.json()[0]["acknowledged"] == 1
+
+    def test_keyset_pages_split_equal_created_at(self, api_client):
+        client, db_path = api_client
+        ids = [_insert_alert(db_path, DEV_EUI, created_at=1_000) for _ in range(3)]
+        newest = _insert_alert(db_path, DEV_EUI, created_at=2_000)
+        first = client.get("/alerts?limit=2&paged=true").json()
+        assert [a["id"] for a in first["alerts"]] == [newest, ids[0]]
+        second = client.get(
+            f"/alerts?limit=2&paged=true&cursor={first['next_cursor']}"
+        ).json()
+        assert [a["id"] for a in second["alerts"]] == ids[1:]
+        assert second["next_cursor"] is None
+
+    def test_cursor_header_and_errors(self, api_client):
+        client, db_path = api_client
+        _insert_alert(db_path, DEV_EUI)
+        _insert_alert(db_path, DEV_EUI)
+        resp = client.get("/alerts?limit=1")
+        assert len(resp.json()) == 1
+        token = resp.headers["X-Next-Cursor"]
+        rest = client.get(f"/alerts?limit=1&cursor={token}")
+        assert isinstance(rest.json(), list) and len(rest.json()) == 1
+        assert "X-Next-Cursor" not in rest.headers
+        assert client.get(f"/alerts?cursor={token}&since=0").status_code == 400
+        assert client.get("/alerts?paged=true&since=0").status_code == 400
+        assert client.get("/alerts?cursor=e30").status_code == 400
+
+    def test_since_returns_delta_envelope(self, api_client):
+        client, db_path = api_client
+        _insert_alert(db_path, DEV_EUI)
+        body = client.get("/alerts?since=0").json()
+        assert set(body) == {"cursor", "reset", "has_more", "alerts"}
+        assert isinstance(body["alerts"], list)
+
+    def test_since_returns_created_and_acknowledged(self, api_client):
+        client, db_path = api_client
+        aid = _insert_alert(db_path, DEV_EUI)
+        start = client.get("/alerts?since=0").json()
+        assert [a["id"] for a in start["alerts"]] == [aid]
+
+        other = _insert_alert(db_path, DEV_EUI)
+        client.put(f"/alerts/{aid}/ack")
+        delta = client.get(f"/alerts?since={start['cursor']}").json()
+        assert [(a["id"], a["acknowledged"]) for a in delta["alerts"]] == [
+            (other, 0), (aid, 1),
+        ]
+        assert delta["has_more"] is False
+
+    def test_since_pages_with_limit(self, api_client):
+        client, db_path = api_client
+        ids = [_insert_alert(db_path, DEV_EUI) for _ in range(3)]
+        page = client.get("/alerts?since=0&limit=2").json()
+        assert [a["id"] for a in page["alerts"]] == ids[:2]
+        assert page["has_more"] is True
+        rest = client.get(f"/alerts?since={page['cursor']}&limit=2").json()
+        assert [a["id"] for a in rest["alerts"]] == ids[2:]
+        assert rest["has_more"] is False
+
+    def test_since_columnar_hides_event_id(self, api_client):
+        client, db_path = api_client
+        _insert_alert(db_path, DEV_EUI)
+        body = client.get("/alerts?since=0&format=columnar").json()
+        assert "event_id" not in body["alerts"]["columns"]
+        assert body["alerts"]["columns"][0] == "id"
+
 
 class TestAcknowledgeAlert:
 
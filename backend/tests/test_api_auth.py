@@ -0,0 +1,214 @@
+import time
+
+import pytest
+
+from storage import pool
+
+USER_ID = "test_user_123"
+
+
+@pytest.fixture
+def auth_client(api_client, monkeypatch):
+    """API client running the real token and user dependencies."""
+    import backend_api
+
+    client, db_path = api_client
+    backend_api.app.dependency_overrides.pop(backend_api.get_clerk_user_id, None)
+    backend_api._jwt_cache.clear()
+    backend_api._user_cache.clear()
+
+    decoded = []
+
+    def fake_decode(token, *args, **kwargs):
+        decoded.append(token)
+        if token.startswith("bad"):
+            raise ValueError("signature verification failed")
+        exp = time.time() + (-1 if token.startswith("expired") else 600)
+        return {"sub": USER_ID, "exp": exp}
+
+    monkeypatch.setattr(backend_api.pyjwt, "decode", fake_decode)
+    yield client, decoded
+    backend_api._jwt_cache.clear()
+    backend_api._user_cache.clear()
+
+
+def _get(client, token):
+    return client.get("/subscriptions", headers={"Authorization": f"Bearer {token}"})
+
+
+class TestJwtCache:
+
+    def test_token_verified_once(self, auth_client):
+        client, decoded = auth_client
+        assert _get(client, "good").status_code == 200
+        assert _get(client, "good").status_code == 200
+        assert decoded == ["good"]
+
+    def test_tokens_are_cached_separately(self, auth_client):
+        client, decoded = auth_client
+        _get(client, "good")
+        _get(client, "other")
+        assert decoded == ["good", "other"]
+
+    def test_failures_and_expired_tokens_are_not_cached(self, auth_client):
+        client, decoded = auth_client
+        assert _get(client, "bad").status_code == 401
+        assert _get(client, "bad").status_code == 401
+        _get(client, "expired")
+        _get(client, "expired")
+        assert decoded == ["bad", "bad", "expired", "expired"]
+
+
+class TestUserCache:
+
+    def test_known_user_skips_the_users_query(self, auth_client, monkeypatch):
+        import backend_api
+
+        client, _ = auth_client
+        _get(client, "good")
+        assert backend_api._user_cache.get(USER_ID) == "test@example.com"
+
+        async def no_lookup(*args, **kwargs):
+            raise AssertionError("users row looked up again")
+
+        monkeypatch.setattr(backend_api, "fetch_clerk_email", no_lookup)
+        backend_api.invalidation.get_invalidator(backend_api.DB_PATH).interval = 60
+        before = pool.stats()["checkouts"]
+        resp = _get(client, "good")
+        assert resp.status_code == 200
+        # only the /subscriptions query itself
+        assert pool.stats()["checkouts"] - before == 1
+
+    def test_user_row_change_drops_cached_user(self, auth_client):
+        import backend_api
+        from storage import invalidation
+
+        client, _ = auth_client
+        _get(client, "good")
+        worker = invalidation.get_invalidator(backend_api.DB_PATH)
+        with backend_api.db() as conn:
+            conn.execute(
+                "UPDATE users SET email = 'new@example.com' WHERE auth_sub = ?",
+                (USER_ID,),
+            )
+        worker.sync(force=True)
+        assert backend_api._user_cache.get(USER_ID) is None
+        _get(client, "good")
+        assert backend_api._user_cache.get(USER_ID) == "new@example.com"
+
+
+@pytest.fixture
+def org_client(api_client):
+    """API client whose caller has `role` in org_1."""
+    import backend_api
+
+    client, db_path = api_client
+    role = {"value": "org:member"}
+    backend_api.app.dependency_overrides[backend_api._decode_clerk_jwt] = lambda: {
+        "sub": USER_ID, "org_id": "org_1", "org_role": role["value"],
+    }
+    backend_api._permission_cache.clear()
+    yield client, role
+    backend_api._permission_cache.clear()
+
+
+def _grant(db_path, *perms):
+    import sqlite3
+
+    # a plain connection stands in for another worker process
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO org_role_settings (org_id, clerk_role, permission) "
+        "VALUES ('org_1', 'org:member', ?)",
+        [(p,) for p in perms],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _permissions(client):
+    return client.get("/org/me/permissions").json()["permissions"]
+
+
+class TestPermissionCache:
+
+    def test_masks(self):
+        import backend_api
+
+        mask = backend_api.permission_mask(["view_nodes", "ack_alerts", "unknown"])
+        assert backend_api.permission_names(mask) == {"view_nodes", "ack_alerts"}
+        assert backend_api.permission_names(backend_api.ALL_PERMISSIONS_MASK) == (
+            backend_api.ALL_PERMISSIONS
+        )
+
+    def test_settings_are_read_once_until_invalidated(self, org_client):
+        import backend_api
+
+        client, _ = org_client
+        worker = backend_api.invalidation.get_invalidator(backend_api.DB_PATH)
+        worker.sync(force=True)
+        worker.interval = 60
+        assert client.get("/nodes").status_code == 403
+
+        _grant(backend_api.DB_PATH, "view_nodes")
+        assert client.get("/nodes").status_code == 403
+        worker.sync(force=True)
+        assert client.get("/nodes").status_code == 200
+        assert _permissions(client) == ["view_nodes"]
+
+    def test_role_settings_update_writes_through(self, org_client):
+        import backend_api
+
+        client, role = org_client
+        assert _permissions(client) == []
+        role["value"] = "org:admin"
+        resp = client.put(
+            "/org/role-settings/org:member",
+            json={"permissions": ["view_nodes", "ack_alerts"]},
+        )
+        assert resp.status_code == 200
+        assert backend_api._permission_cache.get(("org_1", "org:member")) == (
+            backend_api.permission_mask(["view_nodes", "ack_alerts"])
+        )
+        role["value"] = "org:member"
+        assert _permissions(client) == ["ack_alerts", "view_nodes"]
+
+    def test_invalidation_is_per_org(self, org_client):
+        import backend_api
+
+        cache = backend_api._permission_cache
+        cache.set(("org_1", "org:member"), 1)
+        cache.set(("org_2", "org:member"), 1)
+        backend_api._drop_org_permissions("org_1")
+        assert cache.get(("org_1", "org:member")) is None
+        assert cache.get(("org_2", "org:member")) == 1
+
+
+class TestRequestConnection:
+
+    def test_dependencies_and_endpoint_share_one_checkout(self, org_client):
+        import backend_api
+
+        client, _ = org_client
+        _grant(backend_api.DB_PATH, "view_nodes")
+        backend_api.app.dependency_overrides.pop(backend_api.get_clerk_user_id, None)
+        backend_api._user_cache.clear()
+        worker = backend_api.invalidation.get_invalidator(backend_api.DB_PATH)
+        worker.sync(force=True)
+        worker.interval = 60
+
+        # user row, role settings, ETag versions and the endpoint queries
+        before = pool.stats()["checkouts"]
+        assert client.get("/latest").status_code == 200
+        assert pool.stats()["checkouts"] - before == 1
+        backend_api._user_cache.clear()
+
+    def test_cached_answers_borrow_nothing(self, org_client):
+        import backend_api
+
+        client, _ = org_client
+        backend_api.invalidation.get_invalidator(backend_api.DB_PATH).interval = 60
+        assert _permissions(client) == []
+        before = pool.stats()["checkouts"]
+        assert _permissions(client) == []
+        assert pool.stats()["checkouts"] - before == 0
@@ -0,0 +1,118 @@
+import hashlib
+import hmac
+import json
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+import data_listener
+
+SECRET = b"test-ingest-secret"
+DEV_EUI = "AABBCCDD00000001"
+
+
+def _open(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _uplink(time="2025-06-01T12:00:00Z", smoke=False):
+    return {
+        "deviceInfo": {"devEui": DEV_EUI},
+        "devAddr": "01ab02cd",
+        "fCnt": 7,
+        "time": time,
+        "rxInfo": [{"gatewayId": "GW001", "rssi": -80, "snr": 7.5}],
+        "object": {"temperature": 2150, "smoke_detected": smoke},
+    }
+
+
+def _post(client, payload, secret=SECRET, path="/ingest/uplinks"):
+    body = json.dumps(payload).encode()
+    sig = "sha256=" + hmac.new(secret, body, hashlib.sha256).hexdigest()
+    return client.post(
+        path,
+        content=body,
+        headers={"X-Ingest-Signature": sig, "Content-Type": "application/json"},
+    )
+
+
+def _telemetry_count(db_path):
+    conn = _open(db_path)
+    n = conn.execute("SELECT COUNT(*) FROM telemetry").fetchone()[0]
+    conn.close()
+    return n
+
+
+@pytest.fixture
+def client(api_client, monkeypatch):
+    monkeypatch.setattr("backend_api.INGEST_SECRET", SECRET)
+    monkeypatch.setattr(
+        data_listener, "recent_uplinks", data_listener.RecentUplinks(maxsize=16)
+    )
+    with patch.object(data_listener, "process_row_for_alerts") as alerts:
+        client, db_path = api_client
+        yield client, db_path, alerts
+
+
+class TestIngestUplinks:
+
+    def test_single_uplink_is_stored(self, client):
+        client, db_path, alerts = client
+        resp = _post(client, _uplink())
+        assert resp.status_code == 202
+        assert resp.json()["accepted"] == 1
+        assert _telemetry_count(db_path) == 1
+        assert alerts.call_count == 1
+
+    def test_batch_of_uplinks_is_stored(self, client):
+        client, db_path, alerts = client
+        resp = _post(client, [
+            _uplink(time="2025-06-01T12:00:00Z"),
+            _uplink(time="2025-06-01T12:01:00Z"),
+        ])
+        assert resp.status_code == 202
+        assert _telemetry_count(db_path) == 2
+
+    def test_repeated_push_stored_once(self, client):
+        client, db_path, alerts = client
+        _post(client, _uplink())
+        _post(client, _uplink())
+        assert _telemetry_count(db_path) == 1
+        assert alerts.call_count == 1
+
+    def test_bad_signature_rejected(self, client):
+        client, db_path, _ = client
+        resp = _post(client, _uplink(), secret=b"wrong")
+        assert resp.status_code == 403
+        assert _telemetry_count(db_path) == 0
+
+    def test_missing_signature_rejected(self, client):
+        client, _, _ = client
+        resp = client.post("/ingest/uplinks", json=_uplink())
+        assert resp.status_code == 403
+
+    def test_unconfigured_secret_returns_503(self, client, monkeypatch):
+        client, _, _ = client
+        monkeypatch.setattr("backend_api.INGEST_SECRET", b"")
+        resp = _post(client, _uplink())
+        assert resp.status_code == 503
+
+    def test_invalid_json_returns_400(self, client):
+        client, _, _ = client
+        body = b"not json"
+        sig = "sha256=" + hmac.new(SECRET, body, hashlib.sha256).hexdigest()
+        resp = client.post(
+            "/ingest/uplinks", content=body, headers={"X-Ingest-Signature": sig}
+        )
+        assert resp.status_code == 400
+
+    def test_non_uplink_event_ignored(self, client):
+        client, db_path, _ = client
+        resp = _post(client, {"deviceInfo": {"devEui": DEV_EUI}},
+                     path="/ingest/uplinks?event=join")
+        assert resp.status_code == 202
+        assert resp.json()["accepted"] == 0
+        assert _telemetry_count(db_path) == 0
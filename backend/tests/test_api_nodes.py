@@ -0,0 +1,561 @@
+import sqlite3
+
+import pytest
+
+from storage import spatial
+
+DEV_EUI = "AABBCCDD00000001"
+USER_ID = "test_user_123"
+
+
+def _open(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON;")
+    return conn
+
+
+def _insert_latest(db_path, dev_eui=DEV_EUI, timestamp="2025-06-01T12:00:00+00:00",
+                   latitude=44.56, longitude=-123.26, temperature_c=21.5):
+    conn = _open(db_path)
+    conn.execute(
+        "INSERT OR IGNORE INTO nodes (device_eui, node_id, last_seen) "
+        "VALUES (?, NULL, ?)",
+        (dev_eui, timestamp),
+    )
+    conn.execute(
+        """
+        INSERT INTO node_latest
+          (device_eui, gateway_id, timestamp, latitude, longitude,
+           temperature_c, humidity_pct, battery_level, smoke_detected)
+        VALUES (?, 'GW001', ?, ?, ?, ?, 40, 90, 0)
+        """,
+        (dev_eui, timestamp, latitude, longitude, temperature_c),
+    )
+    spatial.sync_positions(conn, [dev_eui])
+    conn.commit()
+    conn.close()
+
+
+def _insert_telemetry(db_path, timestamp, ts_ms, dev_eui=DEV_EUI):
+    conn = _open(db_path)
+    conn.execute(
+        "INSERT INTO telemetry (device_eui, timestamp, ts_ms) VALUES (?, ?, ?)",
+        (dev_eui, timestamp, ts_ms),
+    )
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def client(api_client):
+    import backend_api
+
+    client, db_path = api_client
+    backend_api.app.dependency_overrides[
+        backend_api._decode_clerk_jwt
+    ] = lambda: {"sub": USER_ID}
+    return client, db_path
+
+
+class TestSummary:
+
+    def test_empty_when_no_latest_rows(self, client):
+        client, db_path = client
+        resp = client.get("/summary")
+        assert resp.status_code == 200
+        assert resp.json() == []
+
+    def test_returns_one_row_per_node(self, client):
+        client, db_path = client
+        _insert_latest(db_path)
+        _insert_latest(db_path, dev_eui="AABBCCDD00000002")
+        resp = client.get("/summary")
+        assert resp.status_code == 200
+        data = resp.json()
+        assert [r["device_eui"] for r in data] == [DEV_EUI, "AABBCCDD00000002"]
+        assert data[0]["temperature_c"] == 21.5
+
+
+class TestTelemetryExport:
+
+    def test_csv_export(self, client):
+        client, db_path = client
+        _insert_telemetry(db_path, "2025-06-01T12:00:00+00:00", 1748779200000)
+        _insert_telemetry(db_path, "2025-06-01T13:00:00+00:00", 1748782800000)
+        resp = client.get(f"/telemetry/export?format=csv&device_eui={DEV_EUI}")
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/csv")
+        lines = resp.text.splitlines()
+        assert lines[0].startswith("device_eui,gateway_id,timestamp,ts_ms")
+        assert len(lines) == 3
+
+    def test_gzipped_ndjson_range(self, client):
+        import gzip
+        import json
+
+        client, db_path = client
+        _insert_telemetry(db_path, "2025-06-01T12:00:00+00:00", 1748779200000)
+        _insert_telemetry(db_path, "2025-06-02T12:00:00+00:00", 1748865600000)
+        resp = client.get(
+            "/telemetry/export?gzip=true&t_from=2025-06-02T00:00:00Z",
+            headers={"Accept-Encoding": "identity"},
+        )
+        assert resp.headers["content-type"] == "application/gzip"
+        assert "telemetry.ndjson.gz" in resp.headers["content-disposition"]
+        rows = [json.loads(line) for line in gzip.decompress(resp.content).splitlines()]
+        assert [r["ts_ms"] for r in rows] == [1748865600000]
+
+    def test_inverted_range_is_rejected(self, client):
+        client, _ = client
+        resp = client.get("/telemetry/export?t_from=2000&t_to=1000")
+        assert resp.status_code == 400
+
+
+class TestColumnarFormat:
+
+    def test_summary_columnar(self, client):
+        client, db_path = client
+        _insert_latest(db_path)
+        rows = client.get("/summary").json()
+        body = client.get("/summary?format=columnar").json()
+        assert body["columns"][0] == "device_eui"
+        assert [dict(zip(body["columns"], r)) for r in body["data"]] == rows
+
+    def test_telemetry_columnar_keeps_resolution_header(self, client):
+        client, db_path = client
+        _insert_telemetry(db_path, "2025-06-01T12:00:00+00:00", 1748779200000)
+        resp = client.get("/telemetry?format=columnar&resolution=raw")
+        assert resp.headers["X-Telemetry-Resolution"] == "raw"
+        body = resp.json()
+        assert body["data"][0][body["columns"].index("device_eui")] == DEV_EUI
+
+    def test_map_nodes_columnar_and_bad_format(self, client):
+        client, db_path = client
+        _insert_latest(db_path)
+        body = client.get("/map/nodes?format=columnar&min_lat=0&max_lat=50").json()
+        assert len(body["data"]) == 1
+        assert client.get("/map/nodes?format=xml").status_code == 422
+
+    def test_summary_delta_columnar(self, client):
+        client, db_path = client
+        _insert_latest(db_path)
+        body = client.get("/summary?since=0&format=columnar").json()
+        assert body["nodes"]["data"][0][0] == DEV_EUI
+
+
+class TestSummaryDelta:
+
+    def test_only_changed_nodes_after_cursor(self, client):
+        client, db_path = client
+        _insert_latest(db_path)
+        first = client.get("/summary?since=0").json()
+        assert [r["device_eui"] for r in first["nodes"]] == [DEV_EUI]
+        assert first["reset"] is False
+
+        _insert_latest(db_path, dev_eui="AABBCCDD00000002")
+        delta = client.get(f"/summary?since={first['cursor']}").json()
+        assert [r["device_eui"] for r in delta["nodes"]] == ["AABBCCDD00000002"]
+        assert delta["cursor"] > first["cursor"]
+
+        idle = client.get(f"/summary?since={delta['cursor']}").json()
+        assert idle == {"cursor": delta["cursor"], "reset": False, "nodes": []}
+
+    def test_expired_cursor_resets(self, client):
+        client, db_path = client
+        _insert_latest(db_path)
+        _insert_latest(db_path, dev_eui="AABBCCDD00000002")
+        conn = _open(db_path)
+        conn.execute("DELETE FROM events WHERE id = 1")
+        conn.commit()
+        conn.close()
+        body = client.get("/summary?since=0").json()
+        assert body["reset"] is True
+        assert len(body["nodes"]) == 2
+
+
+class TestConditionalGet:
+
+    def test_summary_304_until_a_node_changes(self, client):
+        client, db_path = client
+        _insert_latest(db_path)
+        tag = client.get("/summary").headers["ETag"]
+        resp = client.get("/summary", headers={"If-None-Match": f"W/{tag}"})
+        assert resp.status_code == 304
+        assert resp.headers["ETag"] == tag
+
+        _insert_latest(db_path, dev_eui="AABBCCDD00000002")
+        resp = client.get("/summary", headers={"If-None-Match": tag})
+        assert resp.status_code == 200
+        assert len(resp.json()) == 2
+        assert resp.headers["ETag"] != tag
+
+    def test_latest_follows_subscriptions(self, client):
+        client, db_path = client
+        _insert_latest(db_path)
+        tag = client.get("/latest").headers["ETag"]
+        assert client.get(
+            "/latest", headers={"If-None-Match": tag}
+        ).status_code == 304
+        client.post("/subscriptions/unsubscribe", json={"device_eui": DEV_EUI})
+        resp = client.get("/latest", headers={"If-None-Match": tag})
+        assert resp.status_code == 200
+        assert resp.json() == []
+
+    def test_node_latest_tag_is_per_node(self, client):
+        client, db_path = client
+        _insert_latest(db_path)
+        _insert_telemetry(db_path, "2025-06-01T12:00:00+00:00", 1748779200000)
+        tag = client.get(f"/nodes/{DEV_EUI}/latest").headers["ETag"]
+        assert client.get(
+            "/nodes/AABBCCDD00000002/latest", headers={"If-None-Match": tag}
+        ).status_code == 404
+
+
+class TestMicroCache:
+
+    def test_summary_served_from_cache_until_data_changes(self, client):
+        client, db_path = client
+        _insert_latest(db_path)
+        first = client.get("/summary")
+        second = client.get("/summary")
+        assert first.headers["X-Cache"] == "miss"
+        assert second.headers["X-Cache"] == "hit"
+        assert second.json() == first.json()
+        assert second.headers["ETag"] == first.headers["ETag"]
+
+        _insert_latest(db_path, dev_eui="AABBCCDD00000002")
+        third = client.get("/summary")
+        assert third.headers["X-Cache"] == "miss"
+        assert len(third.json()) == 2
+
+    def test_map_entries_are_per_query(self, client):
+        client, db_path = client
+        _insert_latest(db_path)
+        assert client.get("/map/nodes").headers["X-Cache"] == "miss"
+        resp = client.get("/map/nodes?format=columnar")
+        assert resp.headers["X-Cache"] == "miss"
+        assert resp.json()["columns"][0] == "device_eui"
+        assert client.get("/map/nodes").headers["X-Cache"] == "hit"
+
+
+class TestNodeOverview:
+
+    def _alert(self, db_path, created_at):
+        conn = _open(db_path)
+        conn.execute(
+            "INSERT INTO alerts (dev_eui, alert_type, message, created_at) "
+            "VALUES (?, 'SMOKE', 'smoke', ?)",
+            (DEV_EUI, created_at),
+        )
+        conn.commit()
+        conn.close()
+
+    def test_combines_node_panel_data(self, client):
+        client, db_path = client
+        _insert_latest(db_path)
+        _insert_telemetry(db_path, "2025-06-01T11:00:00+00:00", 1748775600000)
+        _insert_telemetry(db_path, "2025-06-01T12:00:00+00:00", 1748779200000)
+        self._alert(db_path, 1000)
+        self._alert(db_path, 2000)
+        client.post("/alert-preferences", json={"dev_eui": DEV_EUI,
+                                                "temp_over_c": 50})
+
+        resp = client.get(f"/nodes/{DEV_EUI}/overview?telemetry_limit=1")
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["latest"]["temperature_c"] == 21.5
+        assert [r["timestamp"] for r in data["telemetry"]] == [
+            "2025-06-01T12:00:00+00:00"
+        ]
+        assert [a["created_at"] for a in data["alerts"]] == [2000, 1000]
+        assert data["subscribed"] is True
+        assert data["preference"]["temp_over_c"] == 50
+
+    def test_node_without_data(self, client):
+        client, db_path = client
+        client.post("/subscriptions/unsubscribe", json={"device_eui": DEV_EUI})
+        data = client.get(f"/nodes/{DEV_EUI}/overview").json()
+        assert data == {
+            "device_eui": DEV_EUI, "latest": None, "telemetry": [],
+            "alerts": [], "subscribed": False, "preference": None,
+        }
+
+    def test_unknown_node(self, client):
+        client, _ = client
+        assert client.get("/nodes/FFFF000000000000/overview").status_code == 404
+
+    def test_304_until_preference_changes(self, client):
+        client, db_path = client
+        _insert_latest(db_path)
+        tag = client.get(f"/nodes/{DEV_EUI}/overview").headers["ETag"]
+        assert client.get(
+            f"/nodes/{DEV_EUI}/overview", headers={"If-None-Match": tag}
+        ).status_code == 304
+        client.post("/alert-preferences", json={"dev_eui": DEV_EUI,
+                                                "smoke_detected": True})
+        resp = client.get(
+            f"/nodes/{DEV_EUI}/overview", headers={"If-None-Match": tag}
+        )
+        assert resp.status_code == 200
+        assert resp.json()["preference"]["dev_eui"] == DEV_EUI
+
+
+class TestMapNodes:
+
+    def test_filters_by_bounds(self, client):
+        client, db_path = client
+        _insert_latest(db_path)
+        _insert_latest(db_path, dev_eui="AABBCCDD00000002",
+                       latitude=10.0, longitude=10.0)
+        resp = client.get(
+            "/map/nodes?min_lat=40&max_lat=50&min_lon=-130&max_lon=-120"
+        )
+        assert resp.status_code == 200
+        assert [r["device_eui"] for r in resp.json()] == [DEV_EUI]
+
+    def test_single_axis_bounds(self, client):
+        client, db_path = client
+        _insert_latest(db_path)
+        _insert_latest(db_path, dev_eui="AABBCCDD00000002",
+                       latitude=10.0, longitude=-123.0)
+        resp = client.get("/map/nodes?min_lat=40&max_lat=50")
+        assert [r["device_eui"] for r in resp.json()] == [DEV_EUI]
+
+
+class TestNearestNodes:
+
+    def test_orders_by_distance(self, client):
+        client, db_path = client
+        _insert_latest(db_path, dev_eui="AABBCCDD00000002", latitude=44.0,
+                       longitude=-123.0)
+        _insert_latest(db_path, dev_eui=DEV_EUI, latitude=44.5, longitude=-123.3)
+        _insert_latest(db_path, dev_eui="AABBCCDD00000003", latitude=10.0,
+                       longitude=10.0)
+        resp = client.get("/map/nodes/nearest?lat=44.56&lon=-123.26&n=2")
+        assert resp.status_code == 200
+        data = resp.json()
+        assert [r["device_eui"] for r in data] == [DEV_EUI, "AABBCCDD00000002"]
+        assert data[0]["distance_km"] < data[1]["distance_km"]
+        assert data[0]["temperature_c"] == 21.5
+
+
+class TestLatest:
+
+    def test_only_subscribed_nodes(self, client):
+        client, db_path = client
+        _insert_latest(db_path)
+        _insert_latest(db_path, dev_eui="AABBCCDD00000002")
+        resp = client.get("/latest")
+        assert resp.status_code == 200
+        assert [r["device_eui"] for r in resp.json()] == [DEV_EUI]
+
+
+class TestTelemetryTimeRange:
+
+    NOON_MS = 1748779200000  # 2025-06-01T12:00:00Z
+
+    def _seed(self, db_path):
+        _insert_telemetry(db_path, "2025-06-01T11:00:00+00:00", self.NOON_MS - 3600000)
+        _insert_telemetry(db_path, "2025-06-01T12:00:00+00:00", self.NOON_MS)
+        _insert_telemetry(db_path, "2025-06-01T13:00:00+00:00", self.NOON_MS + 3600000)
+
+    def test_iso_and_epoch_ms_bounds_match(self, client):
+        client, db_path = client
+        self._seed(db_path)
+        iso = client.get(
+            "/telemetry?t_from=2025-06-01T13:30:00%2B02:00&t_to=2025-06-01T12:30:00Z"
+        )
+        ms = client.get(
+            f"/telemetry?t_from={self.NOON_MS - 1800000}&t_to={self.NOON_MS + 1800000}"
+        )
+        assert iso.status_code == 200
+        assert [r["timestamp"] for r in iso.json()] == ["2025-06-01T12:00:00+00:00"]
+        assert ms.json() == iso.json()
+
+    def test_orders_by_epoch(self, client):
+        client, db_path = client
+        self._seed(db_path)
+        resp = client.get("/telemetry?newest_first=false")
+        assert [r["timestamp"][11:13] for r in resp.json()] == ["11", "12", "13"]
+
+    def test_invalid_time_is_400(self, client):
+        client, _ = client
+        resp = client.get("/telemetry?t_from=yesterday")
+        assert resp.status_code == 400
+
+
+class TestTelemetryPagination:
+
+    NOON_MS = 1748779200000
+
+    def _seed(self, db_path, n=5):
+        conn = _open(db_path)
+        for i in range(n):
+            # pairs of rows share a ts_ms, so pages must split on id
+            conn.execute(
+                "INSERT INTO telemetry (device_eui, timestamp, ts_ms) VALUES (?, ?, ?)",
+                (DEV_EUI, f"t{i}", self.NOON_MS + (i // 2) * 1000),
+            )
+        conn.commit()
+        conn.close()
+
+    def _pages(self, client, url):
+        seen, cursor = [], ""
+        while cursor is not None:
+            body = client.get(f"{url}&paged=true&cursor={cursor}").json()
+            seen.append([r["timestamp"] for r in body["telemetry"]])
+            cursor = body["next_cursor"]
+        return seen
+
+    def test_raw_pages_cover_every_row_once(self, client):
+        client, db_path = client
+        self._seed(db_path)
+        pages = self._pages(client, "/telemetry?resolution=raw&limit=2")
+        assert [len(p) for p in pages] == [2, 2, 1]
+        assert sorted(t for p in pages for t in p) == [f"t{i}" for i in range(5)]
+        assert pages[0] == ["t4", "t3"]
+
+    def test_oldest_first_pages(self, client):
+        client, db_path = client
+        self._seed(db_path)
+        pages = self._pages(
+            client, "/telemetry?resolution=raw&limit=3&newest_first=false"
+        )
+        assert pages == [["t0", "t1", "t2"], ["t3", "t4"]]
+
+    def test_header_cursor_keeps_plain_list(self, client):
+        client, db_path = client
+        self._seed(db_path)
+        first = client.get("/telemetry?resolution=raw&limit=4")
+        assert isinstance(first.json(), list)
+        token = first.headers["X-Next-Cursor"]
+        rest = client.get(f"/telemetry?resolution=raw&limit=4&cursor={token}")
+        assert [r["timestamp"] for r in rest.json()] == ["t0"]
+        assert "X-Next-Cursor" not in rest.headers
+
+    def test_paged_envelope_on_every_page(self, client):
+        client, db_path = client
+        self._seed(db_path)
+        first = client.get("/telemetry?resolution=raw&limit=4&paged=true").json()
+        assert set(first) == {"telemetry", "next_cursor"}
+        rest = client.get(
+            f"/telemetry?resolution=raw&limit=4&paged=true"
+            f"&cursor={first['next_cursor']}"
+        ).json()
+        assert rest == {"telemetry": rest["telemetry"], "next_cursor": None}
+        assert [r["timestamp"] for r in rest["telemetry"]] == ["t0"]
+
+    def test_rollup_pages_keep_resolution(self, client):
+        from storage import rollups
+
+        client, db_path = client
+        conn = _open(db_path)
+        conn.execute("INSERT INTO nodes (device_eui) VALUES ('AABBCCDD00000002')")
+        for dev in (DEV_EUI, "AABBCCDD00000002"):
+            for h in range(2):
+                conn.execute(
+                    "INSERT INTO telemetry (device_eui, timestamp, ts_ms) "
+                    "VALUES (?, ?, ?)",
+                    (dev, f"h{h}", self.NOON_MS + h * 3_600_000),
+                )
+        rollups.rebuild_range(conn, self.NOON_MS, self.NOON_MS + 1)
+        conn.commit()
+        conn.close()
+        first = client.get("/telemetry?resolution=1h&limit=3&paged=true").json()
+        token = first["next_cursor"]
+        resp = client.get(f"/telemetry?limit=3&paged=true&cursor={token}")
+        assert resp.headers["X-Telemetry-Resolution"] == "1h"
+        assert len(first["telemetry"]) + len(resp.json()["telemetry"]) == 4
+
+    def test_bad_cursors(self, client):
+        client, db_path = client
+        self._seed(db_path)
+        assert client.get("/telemetry?cursor=nonsense").status_code == 400
+        token = client.get(
+            "/telemetry?resolution=raw&limit=1"
+        ).headers["X-Next-Cursor"]
+        resp = client.get(f"/telemetry?newest_first=false&cursor={token}")
+        assert resp.status_code == 400
+
+
+class TestTelemetryDownsampling:
+
+    def test_max_points_returns_series(self, client):
+        client, db_path = client
+        conn = _open(db_path)
+        base = 1748779200000
+        conn.executemany(
+            "INSERT INTO telemetry (device_eui, timestamp, ts_ms, temperature_c) "
+            "VALUES (?, ?, ?, ?)",
+            [(DEV_EUI, f"t{i}", base + i * 1000, float(i % 7)) for i in range(200)],
+        )
+        conn.commit()
+        conn.close()
+        resp = client.get(
+            f"/telemetry?device_eui={DEV_EUI}&resolution=raw&max_points=20"
+        )
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["source_points"] == 200
+        temps = body["series"]["temperature_c"]
+        assert len(temps["t"]) == 20
+        assert temps["t"][0] == base and temps["t"][-1] == base + 199_000
+        assert body["series"]["rssi"] == {"t": [], "v": []}
+
+    def test_max_points_needs_one_device(self, client):
+        client, _ = client
+        assert client.get("/telemetry?max_points=10").status_code == 400
+
+
+class TestTelemetryResolution:
+
+    NOON_MS = 1748779200000  # 2025-06-01T12:00:00Z
+    HOUR_MS = 3_600_000
+
+    def _seed(self, db_path):
+        from storage import rollups
+
+        conn = _open(db_path)
+        for i in range(4):
+            conn.execute(
+                "INSERT INTO telemetry (device_eui, timestamp, ts_ms, temperature_c) "
+                "VALUES (?, ?, ?, ?)",
+                (DEV_EUI, f"t{i}", self.NOON_MS + i * 1800000, 20.0 + i),
+            )
+        rollups.rebuild_range(conn, self.NOON_MS, self.NOON_MS + 1)
+        conn.commit()
+        conn.close()
+
+    def test_explicit_hourly_buckets(self, client):
+        client, db_path = client
+        self._seed(db_path)
+        resp = client.get("/telemetry?resolution=1h&newest_first=false")
+        assert resp.status_code == 200
+        assert resp.headers["X-Telemetry-Resolution"] == "1h"
+        data = resp.json()
+        assert [r["samples"] for r in data] == [2, 2]
+        assert data[0]["timestamp"] == "2025-06-01T12:00:00+00:00"
+        assert data[0]["temperature_c"] == 20.5
+        assert data[0]["temperature_c_max"] == 21.0
+
+    def test_auto_uses_rollup_for_long_ranges(self, client):
+        client, db_path = client
+        self._seed(db_path)
+        week = self.NOON_MS + 7 * 24 * self.HOUR_MS
+        resp = client.get(f"/telemetry?t_from={self.NOON_MS}&t_to={week}")
+        assert resp.headers["X-Telemetry-Resolution"] == "1h"
+        assert len(resp.json()) == 2
+
+    def test_auto_uses_raw_for_short_ranges(self, client):
+        client, db_path = client
+        self._seed(db_path)
+        resp = client.get(
+            f"/telemetry?t_from={self.NOON_MS}&t_to={self.NOON_MS + self.HOUR_MS}"
+        )
+        assert resp.headers["X-Telemetry-Resolution"] == "raw"
+        assert len(resp.json()) == 3
+
+    def test_unknown_resolution_rejected(self, client):
+        client, _ = client
+        assert client.get("/telemetry?resolution=5m").status_code == 422
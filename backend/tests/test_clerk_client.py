@@ -0,0 +1,374 @@
+import json
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pytest
+
+from clerk_client import ClerkClient, ClerkError, ClerkUnavailable
+
+USER_ID = "user_1"
+
+
+class FakeClerk:
+    """Local stand-in for the Clerk backend API."""
+
+    def __init__(self):
+        self.hits: list[str] = []
+        self.peers: set[int] = set()
+        self.status = 200
+        self.raw: bytes | None = None
+        self.delay = 0.0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self.users = {
+            USER_ID: {
+                "primary_email_address_id": "e2",
+                "email_addresses": [
+                    {"id": "e1", "email_address": "old@example.com"},
+                    {"id": "e2", "email_address": "user@example.com"},
+                ],
+            },
+        }
+        self.memberships = {
+            USER_ID: [
+                {"organization": {"id": "org_1"}, "role": "org:admin"},
+                {"organization": {"id": "org_2"}, "role": "org:member"},
+            ],
+        }
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                with fake._lock:
+                    fake.hits.append(path)
+                    fake.peers.add(self.client_address[1])
+                    fake.active += 1
+                    fake.max_active = max(fake.max_active, fake.active)
+                if fake.delay:
+                    time.sleep(fake.delay)
+                with fake._lock:
+                    fake.active -= 1
+                status, body = fake.respond(path.removeprefix("/v1").split("/"))
+                payload = fake.raw or json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        threading.Thread(
+            target=self.server.serve_forever, args=(0.01,), daemon=True
+        ).start()
+
+    def respond(self, parts):
+        if self.status != 200:
+            return self.status, {"errors": [{"code": "unavailable"}]}
+        match parts:
+            case ["", "users", user_id] if user_id in self.users:
+                return 200, self.users[user_id]
+            case ["", "users", user_id, "organization_memberships"]:
+                return 200, {"data": self.memberships.get(user_id, [])}
+            case ["", "organizations", _, "memberships"]:
+                return 200, {"data": [{"role": "org:member"}]}
+        return 404, {"errors": [{"code": "resource_not_found"}]}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_clerk():
+    fake = FakeClerk()
+    yield fake
+    fake.close()
+
+
+def _client(fake, **kwargs):
+    kwargs.setdefault("timeout", 2)
+    return ClerkClient("sk_test", base_url=fake.url, **kwargs)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestLookups:
+
+    def test_email_is_fetched_once(self, fake_clerk):
+        clerk = _client(fake_clerk)
+
+        async def scenario():
+            assert await clerk.user_email(USER_ID) == "user@example.com"
+            assert await clerk.user_email(USER_ID) == "user@example.com"
+
+        run(scenario())
+        assert fake_clerk.hits == [f"/v1/users/{USER_ID}"]
+
+    def test_one_membership_call_serves_every_org(self, fake_clerk):
+        clerk = _client(fake_clerk)
+
+        async def scenario():
+            assert await clerk.org_role(USER_ID, "org_1") == "org:admin"
+            assert await clerk.org_role(USER_ID, "org_2") == "org:member"
+            assert await clerk.org_role(USER_ID, "org_3") is None
+
+        run(scenario())
+        assert len(fake_clerk.hits) == 1
+
+    def test_memberships_are_not_cached(self, fake_clerk):
+        clerk = _client(fake_clerk)
+
+        async def scenario():
+            await clerk.org_memberships("org_1")
+            await clerk.org_memberships("org_1")
+
+        run(scenario())
+        assert len(fake_clerk.hits) == 2
+
+    def test_lru_bound(self, fake_clerk):
+        fake_clerk.users["user_2"] = {"email_addresses": [
+            {"id": "e", "email_address": "two@example.com"},
+        ]}
+        clerk = _client(fake_clerk, cache_size=1)
+
+        async def scenario():
+            await clerk.user_email(USER_ID)
+            assert await clerk.user_email("user_2") == "two@example.com"
+            await clerk.user_email(USER_ID)
+
+        run(scenario())
+        assert len(fake_clerk.hits) == 3
+
+    def test_forget_user(self, fake_clerk):
+        clerk = _client(fake_clerk)
+        run(clerk.user_email(USER_ID))
+        clerk.forget_user(USER_ID)
+        run(clerk.user_email(USER_ID))
+        assert len(fake_clerk.hits) == 2
+
+
+class TestPooling:
+
+    def test_connections_are_reused(self, fake_clerk):
+        clerk = _client(fake_clerk)
+        ports = set()
+
+        async def scenario():
+            for _ in range(3):
+                await clerk.org_memberships("org_1")
+                ports.update(fake_clerk.peers)
+            await clerk.aclose()
+
+        run(scenario())
+        assert len(fake_clerk.hits) == 3
+        assert len(ports) == 1
+
+    def test_concurrency_is_bounded(self, fake_clerk):
+        fake_clerk.delay = 0.1
+        clerk = _client(fake_clerk, max_connections=2)
+
+        async def scenario():
+            await asyncio.gather(
+                *(clerk.org_memberships("org_1") for _ in range(6))
+            )
+
+        run(scenario())
+        assert len(fake_clerk.hits) == 6
+        assert fake_clerk.max_active == 2
+
+
+class TestNegativeCaching:
+
+    def test_failures_are_cached_briefly(self, fake_clerk):
+        clerk = _client(fake_clerk, negative_ttl=0.05)
+        for _ in range(3):
+            with pytest.raises(ClerkError) as exc:
+                run(clerk.user_email("missing"))
+            assert exc.value.status == 404
+        assert len(fake_clerk.hits) == 1
+
+        time.sleep(0.1)
+        with pytest.raises(ClerkError):
+            run(clerk.user_email("missing"))
+        assert len(fake_clerk.hits) == 2
+
+
+class TestSingleFlight:
+
+    def test_concurrent_lookups_share_one_call(self, fake_clerk):
+        fake_clerk.delay = 0.2
+        clerk = _client(fake_clerk)
+
+        async def scenario():
+            return await asyncio.gather(
+                *(clerk.org_role(USER_ID, "org_1") for _ in range(8))
+            )
+
+        assert run(scenario()) == ["org:admin"] * 8
+        assert len(fake_clerk.hits) == 1
+        assert clerk.stats()["coalesced"] == 7
+
+    def test_cancelled_caller_does_not_cancel_the_lookup(self, fake_clerk):
+        fake_clerk.delay = 0.1
+        clerk = _client(fake_clerk)
+
+        async def scenario():
+            first = asyncio.ensure_future(clerk.user_email(USER_ID))
+            second = asyncio.ensure_future(clerk.user_email(USER_ID))
+            await asyncio.sleep(0.02)
+            first.cancel()
+            return await second
+
+        assert run(scenario()) == "user@example.com"
+        assert len(fake_clerk.hits) == 1
+
+
+class TestCircuitBreaker:
+
+    def test_opens_after_failures_and_fails_fast(self, fake_clerk):
+        fake_clerk.status = 503
+        clerk = _client(fake_clerk, negative_ttl=0, breaker_failures=2,
+                        breaker_reset_seconds=60)
+        for _ in range(2):
+            with pytest.raises(ClerkError):
+                run(clerk.org_memberships("org_1"))
+        with pytest.raises(ClerkUnavailable):
+            run(clerk.user_email(USER_ID))
+        assert len(fake_clerk.hits) == 2
+        assert clerk.stats()["breaker"] == "open"
+        assert clerk.stats()["rejected"] == 1
+
+    def test_slow_calls_open_it(self, fake_clerk):
+        fake_clerk.delay = 0.05
+        clerk = _client(fake_clerk, slow_call_seconds=0.01, breaker_failures=2)
+        run(clerk.org_memberships("org_1"))
+        run(clerk.org_memberships("org_1"))
+        with pytest.raises(ClerkUnavailable):
+            run(clerk.org_memberships("org_1"))
+
+    def test_timeouts_count(self, fake_clerk):
+        fake_clerk.delay = 0.3
+        clerk = _client(fake_clerk, timeout=0.05, breaker_failures=1)
+        with pytest.raises(ClerkError) as exc:
+            run(clerk.org_memberships("org_1"))
+        assert exc.value.status is None
+        assert clerk.stats()["breaker"] == "open"
+
+    def test_half_open_trial_closes_it(self, fake_clerk):
+        fake_clerk.status = 500
+        clerk = _client(fake_clerk, breaker_failures=1, breaker_reset_seconds=0.05)
+        with pytest.raises(ClerkError):
+            run(clerk.org_memberships("org_1"))
+        with pytest.raises(ClerkUnavailable):
+            run(clerk.org_memberships("org_1"))
+
+        time.sleep(0.1)
+        fake_clerk.status = 200
+        assert clerk.stats()["breaker"] == "half_open"
+        assert run(clerk.org_memberships("org_1")) == [{"role": "org:member"}]
+        assert clerk.stats()["breaker"] == "closed"
+
+    def test_unexpected_error_ends_half_open_trial(self, fake_clerk):
+        class Broken:
+            async def get(self, *args, **kwargs):
+                raise RuntimeError("boom")
+
+        fake_clerk.status = 500
+        clerk = _client(fake_clerk, breaker_failures=1, breaker_reset_seconds=0.05)
+        with pytest.raises(ClerkError):
+            run(clerk.org_memberships("org_1"))
+
+        time.sleep(0.1)
+        clerk._client = Broken
+        with pytest.raises(RuntimeError):
+            run(clerk.org_memberships("org_1"))
+        del clerk._client
+        assert clerk.stats()["breaker"] == "open"
+
+        time.sleep(0.1)
+        fake_clerk.status = 200
+        assert run(clerk.org_memberships("org_1")) == [{"role": "org:member"}]
+        assert clerk.stats()["breaker"] == "closed"
+
+    def test_non_json_body_is_a_clerk_error(self, fake_clerk):
+        fake_clerk.raw = b"<html>maintenance</html>"
+        clerk = _client(fake_clerk)
+        for _ in range(2):
+            with pytest.raises(ClerkError) as exc:
+                run(clerk.user_email(USER_ID))
+            assert exc.value.status == 200
+        assert len(fake_clerk.hits) == 1
+        assert clerk.stats()["failures"] == 1
+
+    @pytest.mark.parametrize("raw", [b"null", b"[]", b'"ok"'])
+    def test_body_that_is_not_an_object_is_a_clerk_error(self, fake_clerk, raw):
+        fake_clerk.raw = raw
+        clerk = _client(fake_clerk, negative_ttl=0)
+        with pytest.raises(ClerkError) as exc:
+            run(clerk.org_memberships("org_1"))
+        assert exc.value.status == 200
+        with pytest.raises(ClerkError):
+            run(clerk.org_role(USER_ID, "org_1"))
+        assert clerk.stats()["failures"] == 2
+
+    def test_cancelled_trial_is_not_a_failure(self, fake_clerk):
+        fake_clerk.status = 500
+        clerk = _client(fake_clerk, breaker_failures=1, breaker_reset_seconds=0.05)
+        with pytest.raises(ClerkError):
+            run(clerk.org_memberships("org_1"))
+
+        time.sleep(0.1)
+        fake_clerk.status = 200
+        fake_clerk.delay = 0.3
+
+        async def cancel_trial():
+            task = asyncio.ensure_future(clerk.org_memberships("org_1"))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        run(cancel_trial())
+        assert clerk.stats()["failures"] == 1
+        assert clerk.stats()["breaker"] == "half_open"
+        fake_clerk.delay = 0.0
+        assert run(clerk.org_memberships("org_1")) == [{"role": "org:member"}]
+        assert clerk.stats()["breaker"] == "closed"
+
+    def test_not_found_does_not_count(self, fake_clerk):
+        clerk = _client(fake_clerk, negative_ttl=0, breaker_failures=1)
+        with pytest.raises(ClerkError):
+            run(clerk.user_email("missing"))
+        assert run(clerk.user_email(USER_ID)) == "user@example.com"
+
+
+class TestApiErrors:
+
+    def test_clerk_outage_is_503(self, fake_clerk, file_db, monkeypatch):
+        import backend_api
+        from fastapi import HTTPException
+
+        fake_clerk.status = 503
+        clerk = _client(fake_clerk, breaker_failures=1)
+        monkeypatch.setattr(backend_api, "clerk", clerk)
+        monkeypatch.setattr(backend_api, "DB_PATH", file_db)
+        with pytest.raises(HTTPException) as first:
+            run(backend_api.fetch_clerk_email("someone"))
+        with pytest.raises(HTTPException) as second:
+            run(backend_api.fetch_clerk_email("someone_else"))
+        assert first.value.status_code == 502
+        assert second.value.status_code == 503
+        assert run(backend_api._fetch_user_org_role("someone", "org_1")) is None
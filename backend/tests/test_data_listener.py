@@ -0,0 +1,297 @@
+import asyncio
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+import data_listener
+from data_listener import Pipeline, RecentUplinks, extract_rows, ingest, upsert
+
+DEV_EUI = "AABBCCDD00000001"
+
+
+def _open_conn(db_path):
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON;")
+    return conn
+
+
+def _uplink(dev_eui=DEV_EUI, time="2025-06-01T12:00:00Z", f_cnt=1,
+            temperature=2150, smoke=False, lat=44.56, lon=-123.26):
+    return {
+        "deviceInfo": {"devEui": dev_eui},
+        "devAddr": "01ab02cd",
+        "fCnt": f_cnt,
+        "time": time,
+        "rxInfo": [{"gatewayId": "GW001", "rssi": -80, "snr": 7.5,
+                    "location": {"altitude": 70}}],
+        "object": {
+            "latitude": lat,
+            "longitude": lon,
+            "battery_level": 88,
+            "humidity": 41,
+            "smoke_detected": smoke,
+            "temperature": temperature,
+            "timestamp": 1748779200,
+        },
+    }
+
+
+@pytest.fixture
+def fresh_ingest_state(monkeypatch):
+    monkeypatch.setattr(data_listener, "recent_uplinks", RecentUplinks(maxsize=16))
+    monkeypatch.setattr(data_listener, "stats", data_listener.IngestStats())
+    return data_listener.stats
+
+
+def _count_telemetry(conn):
+    return conn.execute("SELECT COUNT(*) AS n FROM telemetry").fetchone()["n"]
+
+
+def _node_latest(conn, dev_eui=DEV_EUI):
+    return conn.execute(
+        "SELECT * FROM node_latest WHERE device_eui = ?", (dev_eui,)
+    ).fetchone()
+
+
+class TestExtractRows:
+
+    def test_parses_chirpstack_uplink(self):
+        rows = extract_rows([_uplink()])
+        assert len(rows) == 1
+        row = rows[0]
+        assert row["device_eui"] == DEV_EUI
+        assert row["gateway_id"] == "GW001"
+        assert row["temperature_c"] == 21.5
+        assert row["smoke_detected"] == 0
+
+    def test_skips_uplink_without_dev_eui(self, fresh_ingest_state):
+        obj = _uplink()
+        obj["deviceInfo"] = {}
+        assert extract_rows([obj]) == []
+        assert fresh_ingest_state.as_dict()["dropped"] == 1
+
+    def test_keeps_every_uplink_for_a_device(self):
+        rows = extract_rows([
+            _uplink(time="2025-06-01T12:00:00Z", f_cnt=1),
+            _uplink(time="2025-06-01T12:01:00Z", f_cnt=2),
+        ])
+        assert [r["f_cnt"] for r in rows] == [1, 2]
+
+    def test_falls_back_to_device_time(self):
+        obj = _uplink()
+        del obj["time"]
+        rows = extract_rows([obj])
+        assert rows[0]["timestamp"] == rows[0]["device_timestamp"]
+
+
+class TestUpsertNodeLatest:
+
+    def test_insert_creates_node_latest_row(self, file_db):
+        conn = _open_conn(file_db)
+        upsert(conn, extract_rows([_uplink()]))
+        row = _node_latest(conn)
+        conn.close()
+        assert row is not None
+        assert row["temperature_c"] == 21.5
+        assert row["timestamp"].startswith("2025-06-01T12:00:00")
+
+    def test_newer_row_replaces_latest(self, file_db):
+        conn = _open_conn(file_db)
+        upsert(conn, extract_rows([_uplink()]))
+        upsert(conn, extract_rows(
+            [_uplink(time="2025-06-01T12:05:00Z", temperature=3000)]
+        ))
+        row = _node_latest(conn)
+        conn.close()
+        assert row["temperature_c"] == 30.0
+
+    def test_older_row_does_not_replace_latest(self, file_db):
+        conn = _open_conn(file_db)
+        upsert(conn, extract_rows(
+            [_uplink(time="2025-06-01T12:05:00Z", temperature=3000)]
+        ))
+        upsert(conn, extract_rows([_uplink(time="2025-06-01T11:00:00Z")]))
+        row = _node_latest(conn)
+        conn.close()
+        assert row["temperature_c"] == 30.0
+
+    def test_epoch_ms_columns_written(self, file_db):
+        conn = _open_conn(file_db)
+        upsert(conn, extract_rows([_uplink()]))
+        tel = conn.execute("SELECT ts_ms, device_ts_ms FROM telemetry").fetchone()
+        node = conn.execute(
+            "SELECT last_seen_ms FROM nodes WHERE device_eui = ?", (DEV_EUI,)
+        ).fetchone()
+        latest = _node_latest(conn)
+        conn.close()
+        assert tel["ts_ms"] == 1748779200000
+        assert tel["device_ts_ms"] == 1748779200000
+        assert node["last_seen_ms"] == 1748779200000
+        assert latest["ts_ms"] == 1748779200000
+
+    def test_late_uplink_does_not_rewind_last_seen(self, file_db):
+        conn = _open_conn(file_db)
+        upsert(conn, extract_rows([_uplink(time="2025-06-01T12:05:00Z")]))
+        upsert(conn, extract_rows([_uplink(time="2025-06-01T11:00:00Z")]))
+        upsert(conn, extract_rows([_uplink(time="2025-06-01T12:05:00Z")]))
+        node = conn.execute(
+            "SELECT last_seen, last_seen_ms FROM nodes WHERE device_eui = ?",
+            (DEV_EUI,),
+        ).fetchone()
+        conn.close()
+        assert node["last_seen"].startswith("2025-06-01T12:05:00")
+        assert node["last_seen_ms"] == 1748779500000
+
+    def test_one_row_per_node(self, file_db):
+        conn = _open_conn(file_db)
+        upsert(conn, extract_rows([_uplink()]))
+        upsert(conn, extract_rows([_uplink(time="2025-06-01T12:05:00Z")]))
+        n = conn.execute("SELECT COUNT(*) AS n FROM node_latest").fetchone()["n"]
+        conn.close()
+        assert n == 1
+
+
+class TestIngestDeduplication:
+
+    def test_same_uplink_stored_once(self, file_db, fresh_ingest_state):
+        conn = _open_conn(file_db)
+        first = ingest(extract_rows([_uplink()]), file_db)
+        second = ingest(extract_rows([_uplink()]), file_db)
+        n = _count_telemetry(conn)
+        conn.close()
+        assert len(first) == 1
+        assert second == []
+        assert n == 1
+        assert fresh_ingest_state.as_dict()["duplicates_cached"] == 1
+
+    def test_unique_index_catches_evicted_keys(self, file_db, fresh_ingest_state):
+        conn = _open_conn(file_db)
+        ingest(extract_rows([_uplink()]), file_db)
+        data_listener.recent_uplinks = RecentUplinks(maxsize=16)
+        again = ingest(extract_rows([_uplink()]), file_db)
+        n = _count_telemetry(conn)
+        conn.close()
+        assert again == []
+        assert n == 1
+        assert fresh_ingest_state.as_dict()["duplicates_db"] == 1
+
+    def test_duplicates_within_batch_skipped(self, file_db, fresh_ingest_state):
+        conn = _open_conn(file_db)
+        inserted = ingest(extract_rows([_uplink(), _uplink()]), file_db)
+        conn.close()
+        assert len(inserted) == 1
+
+    def test_distinct_uplinks_all_stored(self, file_db, fresh_ingest_state):
+        conn = _open_conn(file_db)
+        inserted = ingest(extract_rows([
+            _uplink(time="2025-06-01T12:00:00Z", f_cnt=1),
+            _uplink(time="2025-06-01T12:01:00Z", f_cnt=2),
+        ]), file_db)
+        n = _count_telemetry(conn)
+        conn.close()
+        assert len(inserted) == 2
+        assert n == 2
+
+    def test_same_millisecond_uplinks_both_stored(self, file_db, fresh_ingest_state):
+        # the cache keys on the stored ISO time, like ux_telemetry_uplink
+        conn = _open_conn(file_db)
+        inserted = ingest(extract_rows([
+            _uplink(time="2025-06-01T12:00:00.000100Z", f_cnt=1),
+            _uplink(time="2025-06-01T12:00:00.000200Z", f_cnt=2),
+        ]), file_db)
+        n = _count_telemetry(conn)
+        conn.close()
+        assert len(inserted) == 2
+        assert n == 2
+
+
+class TestRecentUplinks:
+
+    def test_evicts_least_recently_used(self):
+        lru = RecentUplinks(maxsize=2)
+        lru.add("a")
+        lru.add("b")
+        assert "a" in lru
+        lru.add("c")
+        assert "b" not in lru
+        assert "a" in lru
+        assert len(lru) == 2
+
+
+class TestPipeline:
+
+    def _run(self, file_db, batches, **kwargs):
+        feed = iter(batches)
+        pipeline = Pipeline(poll_seconds=0, fetch=lambda: next(feed),
+                            max_polls=len(batches), **kwargs)
+        with patch.object(data_listener, "DB_PATH", file_db), \
+                patch.object(data_listener, "process_row_for_alerts") as alerts:
+            asyncio.run(pipeline.run())
+        return pipeline, alerts
+
+    def test_rows_flow_through_all_stages(self, file_db, fresh_ingest_state):
+        _, alerts = self._run(file_db, [
+            [_uplink(time="2025-06-01T12:00:00Z")],
+            [_uplink(time="2025-06-01T12:01:00Z")],
+        ])
+        conn = _open_conn(file_db)
+        n = _count_telemetry(conn)
+        conn.close()
+        assert n == 2
+        assert alerts.call_count == 2
+
+    def test_repeated_uplink_skips_alert_stage(self, file_db, fresh_ingest_state):
+        _, alerts = self._run(file_db, [[_uplink()], [_uplink()], [_uplink()]])
+        assert alerts.call_count == 1
+        assert fresh_ingest_state.as_dict()["duplicates_cached"] == 2
+
+    def test_fetch_error_recorded_and_pipeline_continues(
+        self, file_db, fresh_ingest_state
+    ):
+        def batches():
+            yield [_uplink()]
+            raise RuntimeError("live API down")
+
+        feed = batches()
+        pipeline = Pipeline(poll_seconds=0, fetch=lambda: next(feed), max_polls=2)
+        with patch.object(data_listener, "DB_PATH", file_db), \
+                patch.object(data_listener, "process_row_for_alerts"), \
+                patch.object(data_listener, "record_api_error") as record:
+            asyncio.run(pipeline.run())
+        assert record.call_count == 1
+
+    def test_malformed_uplink_recorded_and_pipeline_continues(
+        self, file_db, fresh_ingest_state
+    ):
+        bad = {"deviceInfo": {"devEui": DEV_EUI}, "time": "garbage"}
+        feed = iter([[bad], [_uplink()]])
+        pipeline = Pipeline(poll_seconds=0, fetch=lambda: next(feed), max_polls=2)
+        with patch.object(data_listener, "DB_PATH", file_db), \
+                patch.object(data_listener, "process_row_for_alerts"), \
+                patch.object(data_listener, "record_api_error") as record:
+            asyncio.run(pipeline.run())
+        assert record.call_count == 1
+        conn = _open_conn(file_db)
+        n = _count_telemetry(conn)
+        conn.close()
+        assert n == 1
+
+    def test_alert_stage_survives_errors(self, file_db, fresh_ingest_state):
+        feed = iter([[_uplink(time="2025-06-01T12:00:00Z")],
+                     [_uplink(time="2025-06-01T12:01:00Z")]])
+        pipeline = Pipeline(poll_seconds=0, fetch=lambda: next(feed), max_polls=2)
+        with patch.object(data_listener, "DB_PATH", file_db), \
+                patch.object(data_listener, "run_alerts",
+                             side_effect=[RuntimeError("boom"), None]) as alerts:
+            asyncio.run(pipeline.run())
+        assert alerts.call_count == 2
+
+    def test_snapshot_reports_queue_depths(self, file_db, fresh_ingest_state):
+        pipeline, _ = self._run(file_db, [[_uplink()]], queue_size=2)
+        snap = pipeline.snapshot()
+        assert snap["queue_size"] == 2
+        assert snap["depth"] == {"fetched": 0, "parsed": 0, "persisted": 0}
+        assert set(snap["blocked_seconds"]) == {"fetch", "parse", "persist"}
+        assert snap["ingest"]["inserted"] == 1
@@ -0,0 +1,70 @@
+import numpy as np
+
+from downsample import lttb, series
+
+
+class TestLttb:
+
+    def test_keeps_endpoints_and_count(self):
+        x = np.arange(1000, dtype=float)
+        y = np.sin(x / 50)
+        keep = lttb(x, y, 100)
+        assert len(keep) == 100
+        assert keep[0] == 0 and keep[-1] == 999
+        assert np.all(np.diff(keep) > 0)
+
+    def test_spike_survives(self):
+        x = np.arange(10_000, dtype=float)
+        y = np.zeros_like(x)
+        y[4321] = 50.0
+        keep = lttb(x, y, 50)
+        assert 4321 in keep
+
+    def test_short_series_untouched(self):
+        x = np.arange(5, dtype=float)
+        assert lttb(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+        assert lttb(x, x, 2).tolist() == [0, 1, 2, 3, 4]
+
+    def test_matches_reference_implementation(self):
+        rng = np.random.default_rng(7)
+        x = np.cumsum(rng.uniform(0.5, 1.5, 503))
+        y = rng.normal(size=503)
+        assert lttb(x, y, 37).tolist() == _reference(x, y, 37)
+
+
+def _reference(x, y, n_out):
+    # straightforward scalar LTTB with the same bucket bounds
+    n = len(x)
+    edges = [int(e) for e in np.linspace(1, n - 1, n_out - 1)]
+    keep, a = [0], 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        if b + 1 < n_out - 2:
+            nlo, nhi = edges[b + 1], edges[b + 2]
+            cx = sum(x[nlo:nhi]) / (nhi - nlo)
+            cy = sum(y[nlo:nhi]) / (nhi - nlo)
+        else:
+            cx, cy = x[-1], y[-1]
+        best, best_area = lo, -1.0
+        for i in range(lo, hi):
+            area = abs((x[a] - cx) * (y[i] - y[a]) - (x[a] - x[i]) * (cy - y[a]))
+            if area > best_area:
+                best, best_area = i, area
+        keep.append(best)
+        a = best
+    return keep + [n - 1]
+
+
+class TestSeries:
+
+    def test_nulls_are_dropped_per_metric(self):
+        columns = ["ts_ms", "temperature_c", "rssi"]
+        rows = [(1000, 20.0, None), (2000, None, -80.0), (3000, 21.0, -81.0)]
+        out = series(columns, rows, "ts_ms", ("temperature_c", "rssi"), 100)
+        assert out["temperature_c"] == {"t": [1000, 3000], "v": [20.0, 21.0]}
+        assert out["rssi"] == {"t": [2000, 3000], "v": [-80.0, -81.0]}
+
+    def test_empty(self):
+        assert series(["ts_ms", "snr"], [], "ts_ms", ("snr",), 10) == {
+            "snr": {"t": [], "v": []}
+        }
@@ -0,0 +1,120 @@
+import sqlite3
+
+from init_sqlite_db import backfill_node_latest, enable_incremental_vacuum, migrate
+
+DEV_EUI = "AABBCCDD00000001"
+
+
+def _open_conn(db_path):
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON;")
+    return conn
+
+
+def _insert_telemetry(conn, timestamp, temperature_c):
+    conn.execute(
+        "INSERT INTO telemetry (device_eui, gateway_id, timestamp, temperature_c) "
+        "VALUES (?, 'GW001', ?, ?)",
+        (DEV_EUI, timestamp, temperature_c),
+    )
+    conn.commit()
+
+
+class TestBackfillNodeLatest:
+
+    def test_fills_latest_row_per_node(self, file_db):
+        conn = _open_conn(file_db)
+        _insert_telemetry(conn, "2025-06-01T12:00:00+00:00", 20.0)
+        _insert_telemetry(conn, "2025-06-01T12:05:00+00:00", 25.0)
+
+        inserted = backfill_node_latest(conn)
+        conn.commit()
+        row = conn.execute(
+            "SELECT timestamp, ts_ms, temperature_c FROM node_latest "
+            "WHERE device_eui = ?",
+            (DEV_EUI,),
+        ).fetchone()
+        conn.close()
+
+        assert inserted == 1
+        assert row["temperature_c"] == 25.0
+        assert row["ts_ms"] == 1748779500000
+
+    def test_noop_when_already_populated(self, file_db):
+        conn = _open_conn(file_db)
+        _insert_telemetry(conn, "2025-06-01T12:00:00+00:00", 20.0)
+        backfill_node_latest(conn)
+        conn.commit()
+        _insert_telemetry(conn, "2025-06-01T12:05:00+00:00", 25.0)
+
+        assert backfill_node_latest(conn) == 0
+        conn.close()
+
+    def test_empty_history_inserts_nothing(self, file_db):
+        conn = _open_conn(file_db)
+        assert backfill_node_latest(conn) == 0
+        conn.close()
+
+
+class TestMigrate:
+
+    def _legacy_db(self, tmp_path):
+        conn = sqlite3.connect(str(tmp_path / "legacy.db"))
+        conn.row_factory = sqlite3.Row
+        conn.execute(
+            "CREATE TABLE telemetry (id INTEGER PRIMARY KEY, "
+            "device_eui TEXT NOT NULL, timestamp TEXT NOT NULL, temperature_c REAL)"
+        )
+        conn.executemany(
+            "INSERT INTO telemetry (device_eui, timestamp, temperature_c) "
+            "VALUES (?, ?, ?)",
+            [
+                (DEV_EUI, "2025-06-01T12:00:00+00:00", 20.0),
+                (DEV_EUI, "2025-06-01T12:00:00+00:00", 20.0),
+                (DEV_EUI, "2025-06-01T12:05:00+00:00", 21.0),
+            ],
+        )
+        conn.commit()
+        return conn
+
+    def test_adds_f_cnt_and_removes_duplicates(self, tmp_path):
+        conn = self._legacy_db(tmp_path)
+        migrate(conn)
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(telemetry)")}
+        ids = [r["id"] for r in conn.execute("SELECT id FROM telemetry ORDER BY id")]
+        conn.close()
+        assert "f_cnt" in cols
+        assert {"ts_ms", "device_ts_ms"} <= cols
+        assert ids == [1, 3]
+
+    def test_noop_on_fresh_database(self, tmp_path):
+        conn = sqlite3.connect(str(tmp_path / "fresh.db"))
+        migrate(conn)
+        tables = conn.execute("SELECT name FROM sqlite_master").fetchall()
+        conn.close()
+        assert tables == []
+
+    def test_drops_redundant_device_time_index(self, tmp_path):
+        conn = self._legacy_db(tmp_path)
+        conn.execute(
+            "CREATE INDEX idx_telemetry_device_time ON telemetry(device_eui, timestamp)"
+        )
+        migrate(conn)
+        names = {r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        )}
+        conn.close()
+        assert "idx_telemetry_device_time" not in names
+
+
+class TestIncrementalVacuum:
+
+    def test_converts_existing_database_once(self, file_db):
+        conn = _open_conn(file_db)
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+        assert enable_incremental_vacuum(conn)
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        assert not enable_incremental_vacuum(conn)
+        assert conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0] == 1
+        conn.close()
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from response_cache import COALESCED, HIT, MISS, SingleFlightCache
+
+
+class TestSingleFlightCache:
+
+    def test_hit_until_tag_changes(self):
+        cache = SingleFlightCache(ttl_ms=60000)
+        assert cache.get("k", 1, lambda: "a") == ("a", MISS)
+        assert cache.get("k", 1, lambda: "b") == ("a", HIT)
+        assert cache.get("k", 2, lambda: "c") == ("c", MISS)
+        assert cache.counters == {HIT: 1, MISS: 2, COALESCED: 0}
+
+    def test_ttl_expiry(self):
+        cache = SingleFlightCache(ttl_ms=10)
+        cache.get("k", 1, lambda: "a")
+        time.sleep(0.03)
+        assert cache.get("k", 1, lambda: "b") == ("b", MISS)
+
+    def test_lru_eviction(self):
+        cache = SingleFlightCache(ttl_ms=60000, max_entries=2)
+        cache.get("a", 1, lambda: 1)
+        cache.get("b", 1, lambda: 2)
+        cache.get("a", 1, lambda: 0)
+        cache.get("c", 1, lambda: 3)
+        assert cache.get("a", 1, lambda: 0) == (1, HIT)
+        assert cache.get("b", 1, lambda: 9) == (9, MISS)
+
+    def test_concurrent_callers_share_one_computation(self):
+        cache = SingleFlightCache(ttl_ms=60000)
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "value"
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(cache.get("k", 1, compute))
+        )
+        leader.start()
+        started.wait(5)
+        followers = [
+            threading.Thread(
+                target=lambda: results.append(cache.get("k", 1, compute))
+            )
+            for _ in range(4)
+        ]
+        for t in followers:
+            t.start()
+        while cache.counters[COALESCED] < 4:
+            time.sleep(0.001)
+        release.set()
+        for t in [leader, *followers]:
+            t.join(5)
+
+        assert len(calls) == 1
+        assert sorted(outcome for _, outcome in results) == [COALESCED] * 4 + [MISS]
+        assert {value for value, _ in results} == {"value"}
+
+    def test_errors_reach_waiters_and_are_not_cached(self):
+        cache = SingleFlightCache(ttl_ms=60000)
+        started, release = threading.Event(), threading.Event()
+
+        def fail():
+            started.set()
+            release.wait(5)
+            raise RuntimeError("boom")
+
+        errors = []
+
+        def call():
+            try:
+                cache.get("k", 1, fail)
+            except RuntimeError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=call)
+        follower.start()
+        while cache.counters[COALESCED] < 1:
+            time.sleep(0.001)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        assert len(errors) == 2
+        assert cache.get("k", 1, lambda: "ok") == ("ok", MISS)
+
+    def test_leader_error_is_raised(self):
+        cache = SingleFlightCache()
+        with pytest.raises(ZeroDivisionError):
+            cache.get("k", 1, lambda: 1 / 0)
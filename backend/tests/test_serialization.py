@@ -0,0 +1,78 @@
+import gzip
+import sqlite3
+
+from fastapi import Response
+
+import pytest
+
+from serialization import (
+    csv_stream, decode_cursor, encode_cursor, fetch, gzip_stream, ndjson_stream,
+    respond, shape,
+)
+
+
+def _conn():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE t (a INTEGER, b TEXT, c REAL)")
+    conn.executemany("INSERT INTO t VALUES (?, ?, ?)", [(1, "x", 0.5), (2, None, None)])
+    return conn
+
+
+class TestFetch:
+
+    def test_plain_tuples_without_changing_connection(self):
+        conn = _conn()
+        columns, rows = fetch(conn, "SELECT a, b, c FROM t ORDER BY a")
+        assert columns == ["a", "b", "c"]
+        assert rows == [(1, "x", 0.5), (2, None, None)]
+        assert isinstance(conn.execute("SELECT a FROM t").fetchone(), sqlite3.Row)
+        conn.close()
+
+    def test_shapes(self):
+        columns, rows = ["a", "b"], [(1, "x")]
+        assert shape(columns, rows) == [{"a": 1, "b": "x"}]
+        assert shape(columns, rows, "columnar") == {
+            "columns": ["a", "b"], "data": [(1, "x")],
+        }
+
+
+class TestRespond:
+
+    def test_orjson_body_and_carried_headers(self):
+        injected = Response()
+        injected.headers["ETag"] = '"abc"'
+        out = respond({"data": [(1, None)]}, injected)
+        assert out.body == b'{"data":[[1,null]]}'
+        assert out.headers["etag"] == '"abc"'
+        assert out.headers["content-type"] == "application/json"
+        assert out.headers["content-length"] == str(len(out.body))
+
+
+class TestStreams:
+
+    def test_ndjson_lines(self):
+        body = b"".join(ndjson_stream(["a", "b"], [[(1, "x")], [(2, None)]]))
+        assert body == b'{"a":1,"b":"x"}\n{"a":2,"b":null}\n'
+
+    def test_csv_header_once(self):
+        body = b"".join(csv_stream(["a", "b"], [[(1, "x,y")], [(2, None)]]))
+        assert body == b'a,b\n1,"x,y"\n2,\n'
+        assert b"".join(csv_stream(["a"], [])) == b"a\n"
+
+    def test_gzip_round_trip(self):
+        blocks = [b"first\n", b"", b"second\n"]
+        assert gzip.decompress(b"".join(gzip_stream(blocks))) == b"first\nsecond\n"
+
+
+class TestCursor:
+
+    def test_round_trip_is_url_safe(self):
+        token = encode_cursor("t", "raw", "DESC", 1748779200000, 42)
+        assert "=" not in token and "/" not in token and "+" not in token
+        assert decode_cursor(token) == ["t", "raw", "DESC", 1748779200000, 42]
+
+    @pytest.mark.parametrize("token", ["", "%%%", "bm90IGpzb24", "e30"])
+    def test_garbage_is_rejected(self, token):
+        with pytest.raises(ValueError):
+            decode_cursor(token)
@@ -0,0 +1,179 @@
+import asyncio
+import sqlite3
+
+from storage import events
+from storage.events import EventHub, covers, format_sse, head, read_range
+
+DEV_EUI = "AABBCCDD00000001"
+OTHER_EUI = "AABBCCDD00000002"
+
+
+def _write(db_path, *statements):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT OR IGNORE INTO nodes (device_eui) VALUES (?)", (OTHER_EUI,))
+    for sql, params in statements:
+        conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+def _latest(dev_eui, temp):
+    return (
+        """
+        INSERT INTO node_latest (device_eui, timestamp, temperature_c)
+        VALUES (?, '2025-06-01T12:00:00Z', ?)
+        ON CONFLICT(device_eui) DO UPDATE SET temperature_c = excluded.temperature_c
+        """,
+        (dev_eui, temp),
+    )
+
+
+def _alert(dev_eui):
+    return (
+        "INSERT INTO alerts (dev_eui, alert_type, message, created_at) "
+        "VALUES (?, 'SMOKE', 'smoke', 1000)",
+        (dev_eui,),
+    )
+
+
+def _open(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class TestTriggers:
+
+    def test_node_and_alert_writes_are_logged(self, file_db):
+        _write(file_db, _latest(DEV_EUI, 20.0), _latest(DEV_EUI, 21.0), _alert(DEV_EUI))
+        conn = _open(file_db)
+        rows = conn.execute(
+            "SELECT kind, device_eui FROM events ORDER BY id"
+        ).fetchall()
+        assert [tuple(r) for r in rows] == [
+            ("node", DEV_EUI), ("node", DEV_EUI), ("alert", DEV_EUI),
+        ]
+        assert head(conn) == 3
+        conn.close()
+
+    def test_ids_keep_increasing_after_purge(self, file_db):
+        _write(file_db, _latest(DEV_EUI, 20.0), ("DELETE FROM events", ()))
+        _write(file_db, _latest(DEV_EUI, 21.0))
+        conn = _open(file_db)
+        assert conn.execute("SELECT id FROM events").fetchone()[0] == 2
+        conn.close()
+
+
+class TestReadRange:
+
+    def test_node_events_collapse_to_latest_state(self, file_db):
+        _write(file_db, _latest(DEV_EUI, 20.0), _alert(DEV_EUI), _latest(DEV_EUI, 21.0))
+        conn = _open(file_db)
+        batch, last = read_range(conn, 0)
+        conn.close()
+        assert last == 3
+        assert [(e["id"], e["event"]) for e in batch] == [(2, "alert"), (3, "node")]
+        assert batch[1]["data"]["temperature_c"] == 21.0
+        assert batch[0]["data"]["alert_type"] == "SMOKE"
+
+    def test_device_filter_and_upper_bound(self, file_db):
+        _write(file_db, _latest(DEV_EUI, 20.0), _latest(OTHER_EUI, 5.0),
+               _latest(DEV_EUI, 21.0))
+        conn = _open(file_db)
+        batch, last = read_range(conn, 0, upto=2, device_euis={OTHER_EUI})
+        assert [e["device_eui"] for e in batch] == [OTHER_EUI]
+        assert last == 2
+        assert read_range(conn, 0, upto=3, device_euis=set()) == ([], 3)
+        conn.close()
+
+    def test_covers_until_pruned(self, file_db):
+        _write(file_db, _alert(DEV_EUI), _alert(DEV_EUI), _alert(DEV_EUI))
+        conn = _open(file_db)
+        assert covers(conn, 0, 3)
+        conn.execute("DELETE FROM events WHERE id < 3")
+        conn.commit()
+        assert not covers(conn, 0, 3)
+        assert covers(conn, 2, 3)
+        assert covers(conn, 3, 3)
+        conn.close()
+
+    def test_ack_is_logged_once(self, file_db):
+        _write(file_db, _alert(DEV_EUI),
+               ("UPDATE alerts SET acknowledged = 1", ()),
+               ("UPDATE alerts SET message = 'edited'", ()))
+        conn = _open(file_db)
+        kinds = [r[0] for r in conn.execute("SELECT kind FROM events")]
+        conn.close()
+        assert kinds == ["alert", "alert"]
+
+    def test_sse_frame(self):
+        frame = format_sse({"id": 7, "event": "node", "data": {"a": 1}})
+        assert frame == 'id: 7\nevent: node\ndata: {"a":1}\n\n'
+
+
+async def _collect(hub, cursor, device_euis=None, writes=(), db_path=None):
+    """First non-empty batch from a subscription, writing after it starts."""
+    stream = hub.subscribe(cursor, device_euis, heartbeat_seconds=0.05)
+    task = asyncio.ensure_future(stream.__anext__())
+    await asyncio.sleep(0.05)
+    if writes:
+        await asyncio.to_thread(_write, db_path, *writes)
+    while True:
+        batch = await asyncio.wait_for(task, 5)
+        if batch:
+            await stream.aclose()
+            await hub.stop()
+            return batch
+        task = asyncio.ensure_future(stream.__anext__())
+
+
+class TestEventHub:
+
+    def test_live_events_reach_subscribers(self, file_db):
+        hub = EventHub(file_db, poll_ms=10)
+        batch = asyncio.run(_collect(
+            hub, None, writes=[_alert(DEV_EUI)], db_path=file_db,
+        ))
+        assert [e["event"] for e in batch] == ["alert"]
+        assert hub.counters["subscribers"] == 0
+
+    def test_resume_replays_from_cursor(self, file_db):
+        _write(file_db, _latest(DEV_EUI, 20.0), _alert(DEV_EUI), _alert(OTHER_EUI))
+        hub = EventHub(file_db, poll_ms=10)
+        batch = asyncio.run(_collect(hub, 1))
+        assert [e["id"] for e in batch] == [2, 3]
+
+    def test_resume_is_filtered_by_device(self, file_db):
+        _write(file_db, _alert(DEV_EUI), _alert(OTHER_EUI))
+        hub = EventHub(file_db, poll_ms=10)
+        batch = asyncio.run(_collect(
+            hub, 0, {OTHER_EUI}, writes=[_latest(OTHER_EUI, 1.0)], db_path=file_db,
+        ))
+        assert [e["device_eui"] for e in batch] == [OTHER_EUI]
+        assert batch[0]["id"] == 2
+
+    def test_pruned_cursor_gets_reset(self, file_db):
+        _write(file_db, _alert(DEV_EUI), _alert(DEV_EUI), _alert(OTHER_EUI))
+        _write(file_db, ("DELETE FROM events WHERE id < 3", ()))
+        hub = EventHub(file_db, poll_ms=10)
+        batch = asyncio.run(_collect(hub, 1, {DEV_EUI}))
+        assert batch == [{"id": 3, "event": "reset", "device_eui": None,
+                          "data": {"cursor": 3}}]
+        assert format_sse(batch[0]) == 'id: 3\nevent: reset\ndata: {"cursor":3}\n\n'
+
+    def test_get_hub_is_per_database(self, file_db):
+        assert events.get_hub(file_db) is events.get_hub(file_db)
+        events.reset()
+
+
+class TestStreamEndpoint:
+
+    def test_bad_last_event_id(self, api_client):
+        import backend_api
+
+        client, _ = api_client
+        backend_api.app.dependency_overrides[
+            backend_api.get_permission_mask
+        ] = lambda: backend_api.PERMISSION_BITS["view_nodes"]
+        resp = client.get("/stream", headers={"Last-Event-ID": "abc"})
+        assert resp.status_code == 400
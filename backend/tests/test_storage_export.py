@@ -0,0 +1,54 @@
+import sqlite3
+
+from storage.export import TELEMETRY_COLUMNS, iter_telemetry
+
+DEV_EUI = "AABBCCDD00000001"
+OTHER_EUI = "AABBCCDD00000002"
+TS = TELEMETRY_COLUMNS.index("ts_ms")
+
+
+def _insert(db_path, rows):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT OR IGNORE INTO nodes (device_eui) VALUES (?)", (OTHER_EUI,))
+    # equal ts_ms with distinct timestamp text, as mixed "Z"/offset forms give
+    conn.executemany(
+        "INSERT INTO telemetry (device_eui, timestamp, ts_ms) VALUES (?, ?, ?)",
+        [(dev_eui, f"t{i}", ts_ms) for i, (dev_eui, ts_ms) in enumerate(rows)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _flatten(chunks):
+    return [(row[0], row[TS]) for chunk in chunks for row in chunk]
+
+
+class TestIterTelemetry:
+
+    def test_chunks_resume_across_equal_timestamps(self, file_db):
+        _insert(file_db, [(DEV_EUI, 1000)] * 5 + [(DEV_EUI, 2000)] * 2)
+        chunks = list(iter_telemetry(file_db, chunk_rows=3))
+        assert [len(c) for c in chunks] == [3, 3, 1]
+        assert _flatten(chunks) == [(DEV_EUI, 1000)] * 5 + [(DEV_EUI, 2000)] * 2
+
+    def test_fleet_in_time_order(self, file_db):
+        _insert(file_db, [(OTHER_EUI, 3000), (DEV_EUI, 1000), (OTHER_EUI, 2000)])
+        assert _flatten(iter_telemetry(file_db)) == [
+            (DEV_EUI, 1000), (OTHER_EUI, 2000), (OTHER_EUI, 3000),
+        ]
+
+    def test_devices_one_after_another_within_range(self, file_db):
+        _insert(file_db, [
+            (OTHER_EUI, 3000), (DEV_EUI, 1000), (OTHER_EUI, 2000), (DEV_EUI, 4000),
+            (DEV_EUI, 9000),
+        ])
+        rows = _flatten(iter_telemetry(
+            file_db, [OTHER_EUI, DEV_EUI, OTHER_EUI], 1000, 5000, chunk_rows=1,
+        ))
+        assert rows == [
+            (OTHER_EUI, 2000), (OTHER_EUI, 3000), (DEV_EUI, 1000), (DEV_EUI, 4000),
+        ]
+
+    def test_rows_without_epoch_are_skipped(self, file_db):
+        _insert(file_db, [(DEV_EUI, None), (DEV_EUI, 1000)])
+        assert _flatten(iter_telemetry(file_db)) == [(DEV_EUI, 1000)]
@@ -0,0 +1,150 @@
+import sqlite3
+
+from storage import invalidation
+from storage.invalidation import Invalidator, head
+
+USER_ID = "test_user_123"
+
+
+def _write(db_path, *statements):
+    # a plain connection stands in for another worker process
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    for sql, params in statements:
+        conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+def _role_setting(org_id, perm="view_nodes"):
+    return (
+        "INSERT INTO org_role_settings (org_id, clerk_role, permission) "
+        "VALUES (?, 'org:member', ?)",
+        (org_id, perm),
+    )
+
+
+class _Recorder:
+
+    def __init__(self, scope):
+        self.keys = []
+        invalidation.subscribe(scope, self.keys.append)
+
+
+class TestTriggers:
+
+    def test_writes_are_logged_per_scope_and_key(self, file_db):
+        _write(
+            file_db,
+            _role_setting("org_1"),
+            ("UPDATE users SET email = 'x@example.com' WHERE auth_sub = ?",
+             (USER_ID,)),
+            ("DELETE FROM user_node_subscriptions WHERE user_id = ?", (USER_ID,)),
+        )
+        conn = sqlite3.connect(file_db)
+        rows = conn.execute(
+            "SELECT scope, key FROM cache_invalidations ORDER BY id"
+        ).fetchall()
+        # subscriptions feed no in-memory cache, so they are not logged
+        assert rows[-2:] == [
+            ("org_permissions", "org_1"),
+            ("user", USER_ID),
+        ]
+        assert head(conn) == len(rows)
+        conn.close()
+
+
+class TestInvalidator:
+
+    def test_other_process_writes_reach_handlers(self, file_db):
+        recorder = _Recorder("org_permissions")
+        worker = Invalidator(file_db, poll_ms=0)
+        worker.sync()
+        assert recorder.keys == []
+
+        _write(file_db, _role_setting("org_a"), _role_setting("org_a", "x"),
+               _role_setting("org_b"))
+        worker.sync()
+        assert sorted(recorder.keys) == ["org_a", "org_b"]
+        assert worker.counters["invalidations"] == 2
+
+        worker.sync()
+        assert len(recorder.keys) == 2
+
+    def test_reads_at_most_once_per_interval(self, file_db):
+        recorder = _Recorder("org_permissions")
+        worker = Invalidator(file_db, poll_ms=60000)
+        worker.sync()
+        _write(file_db, _role_setting("org_c"))
+        worker.sync()
+        assert recorder.keys == []
+        worker.sync(force=True)
+        assert recorder.keys == ["org_c"]
+        assert worker.counters["syncs"] == 2
+
+    def test_due_follows_the_poll_interval(self, file_db):
+        worker = Invalidator(file_db, poll_ms=60000)
+        assert worker.due()
+        worker.sync()
+        assert not worker.due()
+
+    def test_api_polls_off_the_event_loop(self, file_db, monkeypatch):
+        import asyncio
+        import threading
+
+        import backend_api
+
+        monkeypatch.setattr(backend_api, "DB_PATH", file_db)
+        worker = invalidation.get_invalidator(file_db)
+        threads = []
+        real_sync = worker.sync
+        monkeypatch.setattr(
+            worker, "sync",
+            lambda: threads.append(threading.get_ident()) or real_sync(),
+        )
+
+        async def scenario():
+            await backend_api.sync_caches()
+            await backend_api.sync_caches()
+            return threading.get_ident()
+
+        loop_thread = asyncio.run(scenario())
+        assert len(threads) == 1
+        assert threads[0] != loop_thread
+        invalidation.reset()
+
+    def test_pruned_log_drops_whole_scopes(self, file_db):
+        recorder = _Recorder("org_permissions")
+        worker = Invalidator(file_db, poll_ms=0)
+        worker.sync()
+        _write(file_db, _role_setting("org_d"), _role_setting("org_e"),
+               ("DELETE FROM cache_invalidations", ()),
+               _role_setting("org_f"))
+        worker.sync()
+        assert recorder.keys == [None]
+        assert worker.counters["resets"] == 1
+
+
+class TestClerkCache:
+
+    def test_member_role_change_clears_cached_lookups(self, file_db):
+        import backend_api
+
+        cache = backend_api.clerk.cache
+        cache.set(("memberships", USER_ID), {"org_1": "org:member"})
+        cache.set(("memberships", "someone_else"), {"org_1": "org:admin"})
+        worker = invalidation.get_invalidator(file_db)
+        worker.sync(force=True)
+        _write(
+            file_db,
+            ("INSERT INTO org_roles (org_id, name, created_at) "
+             "VALUES ('org_1', 'viewer', 0)", ()),
+            ("INSERT INTO org_member_roles "
+             "(org_id, user_id, role_id, assigned_at, assigned_by) "
+             "VALUES ('org_1', ?, 1, 0, 'admin')", (USER_ID,)),
+        )
+        worker.sync(force=True)
+        assert cache.get(("memberships", USER_ID)) is None
+        assert cache.get(("memberships", "someone_else")) == {"org_1": "org:admin"}
+        cache.clear()
+        invalidation.reset()
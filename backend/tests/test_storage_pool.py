@@ -0,0 +1,133 @@
+import sqlite3
+import threading
+
+import pytest
+
+from storage.pool import (
+    ConnectionPool, PragmaProfile, RequestConnection, connect, get_pool, stats,
+)
+
+
+def _count_nodes(db_path):
+    conn = sqlite3.connect(db_path)
+    n = conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+    conn.close()
+    return n
+
+
+class TestPragmaProfile:
+
+    def test_profile_applied_on_open(self, file_db):
+        with connect(file_db) as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+            assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+    def test_from_env_overrides(self, monkeypatch):
+        monkeypatch.setenv("SQLITE_BUSY_TIMEOUT_MS", "250")
+        monkeypatch.setenv("SQLITE_SYNCHRONOUS", "FULL")
+        profile = PragmaProfile.from_env()
+        assert profile.busy_timeout_ms == 250
+        assert profile.synchronous == "FULL"
+        assert "PRAGMA busy_timeout = 250" in profile.statements(readonly=False)
+
+    def test_readonly_profile_skips_journal_mode(self):
+        stmts = PragmaProfile().statements(readonly=True)
+        assert "PRAGMA query_only = ON" in stmts
+        assert not any("journal_mode" in s for s in stmts)
+
+
+class TestConnectionPool:
+
+    def test_connections_are_reused(self, file_db):
+        p = ConnectionPool(file_db, size=2)
+        with p.connection():
+            pass
+        with p.connection():
+            pass
+        assert p.counters["opens"] == 1
+        assert p.counters["checkouts"] == 2
+        p.close()
+
+    def test_commits_on_clean_exit(self, file_db):
+        with connect(file_db) as conn:
+            conn.execute("INSERT INTO nodes (device_eui) VALUES ('NEW0000000000001')")
+        assert _count_nodes(file_db) == 2
+
+    def test_rolls_back_on_exception(self, file_db):
+        with pytest.raises(RuntimeError):
+            with connect(file_db) as conn:
+                conn.execute(
+                    "INSERT INTO nodes (device_eui) VALUES ('NEW0000000000001')"
+                )
+                raise RuntimeError("boom")
+        assert _count_nodes(file_db) == 1
+
+    def test_readonly_pool_rejects_writes(self, file_db):
+        with pytest.raises(sqlite3.OperationalError):
+            with connect(file_db, readonly=True) as conn:
+                conn.execute(
+                    "INSERT INTO nodes (device_eui) VALUES ('NEW0000000000001')"
+                )
+
+    def test_read_and_write_pools_are_separate(self, file_db):
+        assert get_pool(file_db) is get_pool(file_db)
+        assert get_pool(file_db) is not get_pool(file_db, readonly=True)
+
+    def test_overflow_connections_closed_on_release(self, file_db):
+        p = ConnectionPool(file_db, size=1)
+        a = p.acquire()
+        b = p.acquire()
+        p.release(a)
+        p.release(b)
+        assert p.counters["opens"] == 2
+        with pytest.raises(sqlite3.ProgrammingError):
+            b.execute("SELECT 1")
+        p.close()
+
+    def test_concurrent_threads_get_distinct_connections(self, file_db):
+        p = ConnectionPool(file_db, size=4)
+        barrier = threading.Barrier(4)
+        seen = []
+
+        def work():
+            with p.connection() as conn:
+                barrier.wait(timeout=5)
+                seen.append(id(conn))
+                conn.execute("SELECT COUNT(*) FROM nodes").fetchone()
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(set(seen)) == 4
+        p.close()
+
+    def test_stats_aggregate_across_pools(self, file_db):
+        before = stats()
+        with connect(file_db):
+            pass
+        with connect(file_db, readonly=True):
+            pass
+        after = stats()
+        assert after["checkouts"] - before["checkouts"] == 2
+
+
+class TestRequestConnection:
+
+    def test_borrows_on_first_use_only(self, file_db):
+        p = ConnectionPool(file_db, readonly=True, size=2)
+        conn = RequestConnection(p)
+        conn.close()
+        assert p.counters["checkouts"] == 0
+
+        conn = RequestConnection(p)
+        assert conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0] == 1
+        conn.cursor().execute("SELECT 1")
+        assert p.counters["checkouts"] == 1
+        conn.close()
+        conn.close()
+        assert p._idle.qsize() == 1
+        p.close()
@@ -0,0 +1,144 @@
+import sqlite3
+import time
+
+from storage import rollups
+from storage.retention import (
+    Policy, check_auto_vacuum, default_policies, incremental_vacuum, run_once,
+)
+
+DEV_EUI = "AABBCCDD00000001"
+DAY_MS = 86_400_000
+
+
+def _open_conn(db_path):
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON;")
+    return conn
+
+
+def _count(db_path, table):
+    conn = sqlite3.connect(db_path)
+    n = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.close()
+    return n
+
+
+def _policy(name):
+    return [p for p in default_policies() if p.name == name]
+
+
+class TestTelemetryPolicy:
+
+    def _seed(self, db_path, ages_days, roll_up=True):
+        now = int(time.time() * 1000)
+        conn = _open_conn(db_path)
+        for i, age in enumerate(ages_days):
+            conn.execute(
+                "INSERT INTO telemetry (device_eui, timestamp, ts_ms) VALUES (?, ?, ?)",
+                (DEV_EUI, f"t{i}", now - int(age * DAY_MS)),
+            )
+        if roll_up:
+            rollups.rebuild_range(conn, now - 60 * DAY_MS, now)
+        conn.commit()
+        conn.close()
+
+    def test_deletes_old_rolled_up_rows_in_batches(self, file_db):
+        self._seed(file_db, [45, 40, 35, 1])
+        report = run_once(file_db, _policy("telemetry"), batch_size=2, pause_ms=0)
+        assert report["tables"]["telemetry"]["rows"] == 3
+        assert _count(file_db, "telemetry") == 1
+        assert _count(file_db, "telemetry_1d") == 4  # rollups are kept
+
+    def test_keeps_rows_not_yet_rolled_up(self, file_db):
+        self._seed(file_db, [45], roll_up=False)
+        report = run_once(file_db, _policy("telemetry"), pause_ms=0)
+        assert report["tables"]["telemetry"]["rows"] == 0
+        assert _count(file_db, "telemetry") == 1
+
+
+class TestAlertPolicies:
+
+    def test_processed_queue_rows_expire(self, file_db):
+        now = int(time.time())
+        conn = _open_conn(file_db)
+        conn.executemany(
+            "INSERT INTO alert_queue (email, dev_eui, alert_type, message, "
+            "created_at, processed, processed_at) VALUES ('a@x', ?, 'T', 'm', ?, ?, ?)",
+            [
+                (DEV_EUI, now, 1, now - 8 * 86400),
+                (DEV_EUI, now, 1, now - 86400),
+                (DEV_EUI, now, 0, None),
+            ],
+        )
+        conn.commit()
+        conn.close()
+        report = run_once(file_db, _policy("alert_queue"), pause_ms=0)
+        assert report["tables"]["alert_queue"]["rows"] == 1
+        assert _count(file_db, "alert_queue") == 2
+
+    def test_acknowledged_alerts_are_archived(self, file_db):
+        now = int(time.time())
+        conn = _open_conn(file_db)
+        conn.executemany(
+            "INSERT INTO alerts (dev_eui, alert_type, message, created_at, "
+            "acknowledged, acknowledged_at) VALUES (?, 'T', 'm', ?, ?, ?)",
+            [
+                (DEV_EUI, now - 100 * 86400, 1, now - 95 * 86400),
+                (DEV_EUI, now - 100 * 86400, 0, None),
+            ],
+        )
+        conn.commit()
+        conn.close()
+        run_once(file_db, _policy("alerts"), pause_ms=0)
+        conn = _open_conn(file_db)
+        archived = conn.execute("SELECT * FROM alerts_archive").fetchall()
+        conn.close()
+        assert _count(file_db, "alerts") == 1
+        assert len(archived) == 1
+        assert archived[0]["acknowledged"] == 1
+        assert archived[0]["archived_at"] >= now
+
+    def test_archive_survives_new_alert_columns(self, file_db):
+        now = int(time.time())
+        conn = _open_conn(file_db)
+        conn.execute("ALTER TABLE alerts ADD COLUMN severity TEXT")
+        conn.execute(
+            "INSERT INTO alerts (dev_eui, alert_type, message, created_at, "
+            "acknowledged, acknowledged_at, severity) "
+            "VALUES (?, 'T', 'm', ?, 1, ?, 'high')",
+            (DEV_EUI, now - 100 * 86400, now - 95 * 86400),
+        )
+        conn.commit()
+        conn.close()
+        run_once(file_db, _policy("alerts"), pause_ms=0)
+        assert _count(file_db, "alerts") == 0
+        assert _count(file_db, "alerts_archive") == 1
+
+    def test_zero_days_disables_policy(self, file_db):
+        disabled = Policy(name="alerts", table="alerts", key="id",
+                          where="acknowledged_at < ?", days=0)
+        assert run_once(file_db, [disabled], pause_ms=0)["tables"] == {}
+
+
+class TestIncrementalVacuum:
+
+    def test_releases_pages_when_enabled(self, tmp_path):
+        db_path = str(tmp_path / "vac.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("CREATE TABLE blob (data BLOB)")
+        conn.executemany("INSERT INTO blob VALUES (?)", [(b"x" * 4000,)] * 200)
+        conn.commit()
+        conn.execute("DELETE FROM blob")
+        conn.commit()
+        conn.close()
+        assert incremental_vacuum(db_path, pages=16, pause_ms=0) > 0
+
+    def test_noop_without_incremental_mode(self, file_db):
+        assert incremental_vacuum(file_db, pause_ms=0) == 0
+
+    def test_warns_when_space_reclaim_is_off(self, file_db, caplog):
+        with caplog.at_level("WARNING", logger="storage.retention"):
+            assert not check_auto_vacuum(file_db)
+        assert "--incremental-vacuum" in caplog.text
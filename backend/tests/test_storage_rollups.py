@@ -0,0 +1,165 @@
+import datetime
+import sqlite3
+
+import pytest
+
+from data_listener import extract_rows, upsert
+from storage.rollups import rebuild_range, run_backfill, select_resolution
+
+DEV_EUI = "AABBCCDD00000001"
+NOON_MS = 1748779200000  # 2025-06-01T12:00:00Z
+HOUR_MS = 3_600_000
+
+
+def _open_conn(db_path):
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON;")
+    return conn
+
+
+def _uplink(offset_s, temperature=2000, smoke=False, battery=80):
+    ts = datetime.datetime.fromtimestamp(NOON_MS / 1000 + offset_s, tz=datetime.UTC)
+    return {
+        "deviceInfo": {"devEui": DEV_EUI},
+        "time": ts.isoformat(),
+        "rxInfo": [{"gatewayId": "GW001", "rssi": -80, "snr": 7.5}],
+        "object": {
+            "temperature": temperature,
+            "battery_level": battery,
+            "smoke_detected": smoke,
+        },
+    }
+
+
+def _buckets(conn, table):
+    return [dict(r) for r in conn.execute(
+        f"SELECT * FROM {table} ORDER BY device_eui, bucket_ms"
+    )]
+
+
+class TestIncrementalRollups:
+
+    def test_aggregates_one_minute(self, file_db):
+        conn = _open_conn(file_db)
+        upsert(conn, extract_rows([
+            _uplink(0, temperature=2000),
+            _uplink(3, temperature=3000, smoke=True),
+            _uplink(6, temperature=2500, battery=None),
+        ]))
+        [bucket] = _buckets(conn, "telemetry_1m")
+        conn.close()
+        assert bucket["bucket_ms"] == NOON_MS
+        assert bucket["samples"] == 3
+        assert bucket["smoke_count"] == 1
+        assert bucket["temperature_c_min"] == 20.0
+        assert bucket["temperature_c_max"] == 30.0
+        assert bucket["temperature_c_sum"] / bucket["temperature_c_n"] == 25.0
+        assert bucket["battery_level_n"] == 2
+
+    def test_splits_by_bucket_width(self, file_db):
+        conn = _open_conn(file_db)
+        upsert(conn, extract_rows([_uplink(0), _uplink(90), _uplink(3700)]))
+        minutes = _buckets(conn, "telemetry_1m")
+        hours = _buckets(conn, "telemetry_1h")
+        days = _buckets(conn, "telemetry_1d")
+        conn.close()
+        assert [b["samples"] for b in minutes] == [1, 1, 1]
+        assert [b["samples"] for b in hours] == [2, 1]
+        assert [b["samples"] for b in days] == [3]
+
+    def test_duplicates_are_not_counted(self, file_db):
+        conn = _open_conn(file_db)
+        upsert(conn, extract_rows([_uplink(0)]))
+        upsert(conn, extract_rows([_uplink(0)]))
+        [bucket] = _buckets(conn, "telemetry_1h")
+        conn.close()
+        assert bucket["samples"] == 1
+
+    def test_rebuild_matches_incremental(self, file_db):
+        conn = _open_conn(file_db)
+        upsert(conn, extract_rows([
+            _uplink(0, temperature=2000),
+            _uplink(30, temperature=3000, smoke=True, battery=None),
+            _uplink(4000, temperature=1000),
+        ]))
+        before = {t: _buckets(conn, t) for t in ("telemetry_1m", "telemetry_1d")}
+        rebuild_range(conn, NOON_MS, NOON_MS + 1)
+        after = {t: _buckets(conn, t) for t in ("telemetry_1m", "telemetry_1d")}
+        conn.close()
+        assert after == before
+
+
+class TestBackfill:
+
+    def _legacy_rows(self, db_path, offsets_s):
+        conn = _open_conn(db_path)
+        conn.executemany(
+            "INSERT INTO telemetry (device_eui, timestamp, ts_ms, temperature_c) "
+            "VALUES (?, ?, ?, 20.0)",
+            [(DEV_EUI, f"legacy-{s}", NOON_MS + s * 1000) for s in offsets_s],
+        )
+        conn.commit()
+        conn.close()
+
+    def test_rolls_up_history_once(self, file_db):
+        self._legacy_rows(file_db, [0, 60, 2 * 86400])
+        assert run_backfill(file_db) == 3
+        assert run_backfill(file_db) == 0
+        conn = _open_conn(file_db)
+        days = _buckets(conn, "telemetry_1d")
+        conn.close()
+        assert [d["samples"] for d in days] == [2, 1]
+
+    def test_history_older_than_live_rollups(self, file_db):
+        self._legacy_rows(file_db, [0])
+        conn = _open_conn(file_db)
+        upsert(conn, extract_rows([_uplink(86400)]))
+        conn.close()
+        run_backfill(file_db)
+        conn = _open_conn(file_db)
+        days = _buckets(conn, "telemetry_1d")
+        conn.close()
+        assert [d["samples"] for d in days] == [1, 1]
+
+    def test_interrupted_backfill_resumes(self, file_db, monkeypatch):
+        from storage import rollups
+
+        self._legacy_rows(file_db, [0, 60, 86400, 3 * 86400])
+        calls = []
+
+        def flaky(conn, from_ms, to_ms):
+            if calls:
+                raise RuntimeError("interrupted")
+            calls.append(from_ms)
+            return rebuild_range(conn, from_ms, to_ms)
+
+        monkeypatch.setattr(rollups, "rebuild_range", flaky)
+        with pytest.raises(RuntimeError):
+            run_backfill(file_db)
+        monkeypatch.undo()
+
+        run_backfill(file_db)
+        assert run_backfill(file_db) == 0
+        conn = _open_conn(file_db)
+        days = _buckets(conn, "telemetry_1d")
+        conn.close()
+        assert [d["samples"] for d in days] == [2, 1, 1]
+
+
+class TestSelectResolution:
+
+    @pytest.mark.parametrize("span_ms, expected", [
+        (HOUR_MS, "raw"),
+        (7 * HOUR_MS, "1m"),
+        (7 * 24 * HOUR_MS, "1h"),
+        (365 * 24 * HOUR_MS, "1d"),
+    ])
+    def test_auto_picks_finest_fitting_table(self, span_ms, expected):
+        assert select_resolution("auto", NOON_MS, NOON_MS + span_ms, 500) == expected
+
+    def test_open_range_is_raw(self):
+        assert select_resolution("auto", None, None, 500) == "raw"
+
+    def test_explicit_resolution_wins(self):
+        assert select_resolution("1d", None, None, 500) == "1d"
@@ -0,0 +1,96 @@
+import random
+import sqlite3
+
+import pytest
+
+from storage.spatial import haversine_km, nearest, position_id, sync_positions
+
+DEV_EUI = "AABBCCDD00000001"
+
+
+def _open_conn(db_path):
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON;")
+    return conn
+
+
+def _set_latest(conn, dev_eui, lat, lon):
+    conn.execute(
+        "INSERT OR IGNORE INTO nodes (device_eui) VALUES (?)", (dev_eui,)
+    )
+    conn.execute(
+        """
+        INSERT INTO node_latest (device_eui, timestamp, latitude, longitude)
+        VALUES (?, 't', ?, ?)
+        ON CONFLICT(device_eui) DO UPDATE SET
+          latitude = excluded.latitude, longitude = excluded.longitude
+        """,
+        (dev_eui, lat, lon),
+    )
+
+
+class TestPositionId:
+
+    def test_dev_eui_maps_to_signed_64_bit(self):
+        assert position_id("0000000000000001") == 1
+        assert position_id("FFFFFFFFFFFFFFFF") == -1
+
+    def test_other_ids_are_hashed_stably(self):
+        assert position_id("SYSTEM") == position_id("SYSTEM")
+        assert -(1 << 63) <= position_id("SYSTEM") < 1 << 63
+
+
+class TestSyncPositions:
+
+    def test_writes_only_on_change(self, file_db):
+        conn = _open_conn(file_db)
+        _set_latest(conn, DEV_EUI, 44.56, -123.26)
+        assert sync_positions(conn, [DEV_EUI]) == 1
+        assert sync_positions(conn, [DEV_EUI]) == 0
+        _set_latest(conn, DEV_EUI, 44.60, -123.26)
+        assert sync_positions(conn, [DEV_EUI]) == 1
+        row = conn.execute("SELECT lat, lon FROM node_positions").fetchone()
+        conn.close()
+        assert (row["lat"], row["lon"]) == (44.60, -123.26)
+
+    def test_lost_position_leaves_index(self, file_db):
+        conn = _open_conn(file_db)
+        _set_latest(conn, DEV_EUI, 44.56, -123.26)
+        sync_positions(conn, [DEV_EUI])
+        _set_latest(conn, DEV_EUI, None, None)
+        sync_positions(conn, [DEV_EUI])
+        n = conn.execute("SELECT COUNT(*) FROM node_positions").fetchone()[0]
+        conn.close()
+        assert n == 0
+
+
+class TestNearest:
+
+    def test_matches_brute_force(self, file_db):
+        rng = random.Random(7)
+        conn = _open_conn(file_db)
+        points = {}
+        for i in range(300):
+            dev_eui = f"{i:016X}"
+            lat, lon = rng.uniform(-60, 60), rng.uniform(-179, 179)
+            points[dev_eui] = (lat, lon)
+            _set_latest(conn, dev_eui, lat, lon)
+        sync_positions(conn, points)
+
+        for lat, lon in [(44.5, -123.2), (0.0, 179.9), (-59.0, 10.0)]:
+            expected = sorted(
+                points, key=lambda e: haversine_km(lat, lon, *points[e])
+            )[:5]
+            got = [h["device_eui"] for h in nearest(conn, lat, lon, 5)]
+            assert got == expected
+        conn.close()
+
+    @pytest.mark.parametrize("n", [1, 10])
+    def test_returns_all_when_fewer_nodes(self, file_db, n):
+        conn = _open_conn(file_db)
+        _set_latest(conn, DEV_EUI, 44.56, -123.26)
+        sync_positions(conn, [DEV_EUI])
+        hits = nearest(conn, -44.0, 56.0, n)
+        conn.close()
+        assert [h["device_eui"] for h in hits] == [DEV_EUI]
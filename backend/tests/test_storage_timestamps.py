@@ -0,0 +1,105 @@
+import datetime
+import sqlite3
+
+import pytest
+
+from storage.timestamps import (
+    backfill_small_tables,
+    parse_time_param,
+    run_backfill,
+    to_epoch_ms,
+)
+
+DEV_EUI = "AABBCCDD00000001"
+NOON_MS = 1748779200000  # 2025-06-01T12:00:00Z
+
+
+def _open_conn(db_path):
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class TestParseTimeParam:
+
+    @pytest.mark.parametrize("value", [
+        "2025-06-01T12:00:00Z",
+        "2025-06-01T12:00:00+00:00",
+        "2025-06-01T14:00:00+02:00",
+        "2025-06-01T12:00:00",
+        str(NOON_MS),
+    ])
+    def test_formats_agree(self, value):
+        assert parse_time_param(value) == NOON_MS
+
+    def test_blank_is_none(self):
+        assert parse_time_param(None) is None
+        assert parse_time_param("  ") is None
+
+    def test_rejects_garbage(self):
+        with pytest.raises(ValueError):
+            parse_time_param("yesterday")
+
+    def test_naive_datetime_is_utc(self):
+        assert to_epoch_ms(datetime.datetime(2025, 6, 1, 12)) == NOON_MS
+
+
+class TestBackfill:
+
+    def _legacy_rows(self, db_path, stamps):
+        conn = _open_conn(db_path)
+        conn.executemany(
+            "INSERT INTO telemetry (device_eui, timestamp, device_timestamp) "
+            "VALUES (?, ?, ?)",
+            [(DEV_EUI, ts, ts) for ts in stamps],
+        )
+        conn.execute(
+            "UPDATE nodes SET last_seen = '2025-06-01T12:00:00+00:00' "
+            "WHERE device_eui = ?",
+            (DEV_EUI,),
+        )
+        conn.commit()
+        conn.close()
+
+    def test_converts_every_row_in_batches(self, file_db):
+        stamps = [f"2025-06-01T12:00:0{i}+00:00" for i in range(7)]
+        self._legacy_rows(file_db, stamps)
+
+        converted = run_backfill(file_db, batch_size=3, pause_ms=0)
+
+        conn = _open_conn(file_db)
+        rows = conn.execute(
+            "SELECT ts_ms, device_ts_ms FROM telemetry ORDER BY id"
+        ).fetchall()
+        last_seen_ms = conn.execute(
+            "SELECT last_seen_ms FROM nodes WHERE device_eui = ?", (DEV_EUI,)
+        ).fetchone()[0]
+        conn.close()
+        assert converted == 8  # 7 telemetry rows + 1 node
+        assert [r["ts_ms"] for r in rows] == [NOON_MS + i * 1000 for i in range(7)]
+        assert rows[0]["device_ts_ms"] == NOON_MS
+        assert last_seen_ms == NOON_MS
+
+    def test_mixed_offsets_compare_correctly(self, file_db):
+        self._legacy_rows(
+            file_db, ["2025-06-01T13:30:00+02:00", "2025-06-01T12:00:00Z"]
+        )
+        run_backfill(file_db, pause_ms=0)
+        conn = _open_conn(file_db)
+        ordered = [r[0] for r in conn.execute(
+            "SELECT timestamp FROM telemetry ORDER BY ts_ms"
+        )]
+        conn.close()
+        assert ordered == ["2025-06-01T13:30:00+02:00", "2025-06-01T12:00:00Z"]
+
+    def test_rerun_is_noop(self, file_db):
+        self._legacy_rows(file_db, ["2025-06-01T12:00:00+00:00"])
+        run_backfill(file_db, pause_ms=0)
+        assert run_backfill(file_db, pause_ms=0) == 0
+
+    def test_small_tables_skip_converted_rows(self, file_db):
+        self._legacy_rows(file_db, [])
+        conn = _open_conn(file_db)
+        assert backfill_small_tables(conn) == 1
+        assert backfill_small_tables(conn) == 0
+        conn.close()
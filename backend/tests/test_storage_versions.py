@@ -0,0 +1,65 @@
+import sqlite3
+
+from storage.versions import current, etag, matches
+
+DEV_EUI = "AABBCCDD00000001"
+
+
+def _open(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA foreign_keys = ON;")
+    return conn
+
+
+class TestCounters:
+
+    def test_writes_bump_their_table_only(self, file_db):
+        conn = _open(file_db)
+        tables = ("node_latest", "alerts", "user_node_subscriptions")
+        before = current(conn, tables)
+        conn.execute(
+            "INSERT INTO node_latest (device_eui, timestamp) VALUES (?, 't')",
+            (DEV_EUI,),
+        )
+        conn.execute("UPDATE node_latest SET temperature_c = 20")
+        conn.commit()
+        after = current(conn, tables)
+        conn.close()
+        assert after[0] == before[0] + 2
+        assert after[1:] == before[1:]
+
+    def test_alert_ack_and_delete_bump(self, file_db):
+        conn = _open(file_db)
+        conn.execute(
+            "INSERT INTO alerts (dev_eui, alert_type, message, created_at) "
+            "VALUES (?, 'SMOKE', 'm', 1)",
+            (DEV_EUI,),
+        )
+        conn.execute("UPDATE alerts SET acknowledged = 1")
+        conn.execute("DELETE FROM alerts")
+        conn.commit()
+        assert current(conn, ("alerts",)) == (3,)
+        conn.close()
+
+    def test_unknown_name_reads_zero(self, file_db):
+        conn = _open(file_db)
+        assert current(conn, ("missing",)) == (0,)
+        conn.close()
+
+
+class TestEtag:
+
+    def test_scope_and_versions_change_tag(self):
+        base = etag((1, 2), "/latest", "", "user_a")
+        assert base == etag((1, 2), "/latest", "", "user_a")
+        assert base != etag((1, 3), "/latest", "", "user_a")
+        assert base != etag((1, 2), "/latest", "", "user_b")
+        assert base.startswith('"') and base.endswith('"')
+
+    def test_if_none_match_forms(self):
+        tag = etag((1,), "/summary")
+        assert matches(tag, tag)
+        assert matches(f'"other", W/{tag}', tag)
+        assert matches("*", tag)
+        assert not matches(None, tag)
+        assert not matches('"other"', tag)
@@ -0,0 +1,177 @@
+import sqlite3
+import threading
+
+import pytest
+
+from storage import writer
+from storage.writer import WriteService, run_write, submit_write, transaction
+
+
+def _count_nodes(db_path):
+    conn = sqlite3.connect(db_path)
+    n = conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+    conn.close()
+    return n
+
+
+def _insert_node(dev_eui):
+    def job(conn):
+        conn.execute("INSERT INTO nodes (device_eui) VALUES (?)", (dev_eui,))
+        conn.commit()  # no-op inside the writer; the group commits once
+        return dev_eui
+    return job
+
+
+@pytest.fixture
+def single_writer(monkeypatch):
+    monkeypatch.setattr(writer, "SINGLE_WRITER", True)
+
+
+class TestWriteService:
+
+    def test_queued_jobs_share_one_commit(self, file_db):
+        svc = WriteService(file_db, window_ms=50)
+        futures = [svc.submit(_insert_node(f"NEW000000000000{i}")) for i in range(5)]
+        svc.start()
+        results = [f.result(timeout=5) for f in futures]
+        svc.stop()
+        assert results == [f"NEW000000000000{i}" for i in range(5)]
+        assert svc.counters["batches"] == 1
+        assert svc.counters["largest_batch"] == 5
+        assert _count_nodes(file_db) == 6
+
+    def test_failing_job_rolls_back_only_itself(self, file_db):
+        def broken(conn):
+            conn.execute("INSERT INTO nodes (device_eui) VALUES ('BAD0000000000001')")
+            raise RuntimeError("boom")
+
+        svc = WriteService(file_db, window_ms=50)
+        ok_before = svc.submit(_insert_node("NEW0000000000001"))
+        bad = svc.submit(broken)
+        ok_after = svc.submit(_insert_node("NEW0000000000002"))
+        svc.start()
+        ok_before.result(timeout=5)
+        ok_after.result(timeout=5)
+        with pytest.raises(RuntimeError, match="boom"):
+            bad.result(timeout=5)
+        svc.stop()
+        assert svc.counters["failed_jobs"] == 1
+        assert _count_nodes(file_db) == 3
+
+    def test_batch_size_is_capped(self, file_db):
+        svc = WriteService(file_db, max_jobs=2, window_ms=50)
+        futures = [svc.submit(_insert_node(f"NEW000000000000{i}")) for i in range(5)]
+        svc.start()
+        for f in futures:
+            f.result(timeout=5)
+        svc.stop()
+        assert svc.counters["largest_batch"] == 2
+        assert svc.counters["batches"] == 3
+
+
+class TestRunWrite:
+
+    def test_inline_when_single_writer_off(self, file_db, monkeypatch):
+        monkeypatch.setattr(writer, "SINGLE_WRITER", False)
+        future = submit_write(file_db, _insert_node("NEW0000000000001"))
+        assert future.done()
+        assert writer.get_writer(file_db) is None
+        assert _count_nodes(file_db) == 2
+
+    def test_inline_error_rolls_back(self, file_db):
+        def broken(conn):
+            conn.execute("INSERT INTO nodes (device_eui) VALUES ('BAD0000000000001')")
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            run_write(file_db, broken)
+        assert _count_nodes(file_db) == 1
+
+    def test_concurrent_callers_are_grouped(self, file_db, single_writer, monkeypatch):
+        monkeypatch.setattr(writer, "GROUP_COMMIT_WINDOW_MS", 50)
+        threads = [
+            threading.Thread(
+                target=run_write, args=(file_db, _insert_node(f"NEW000000000000{i}"))
+            )
+            for i in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        totals = writer.stats()
+        assert _count_nodes(file_db) == 9
+        assert totals["jobs"] == 8
+        assert totals["batches"] < 8
+
+
+class TestTransaction:
+
+    def test_block_commits_through_writer(self, file_db, single_writer):
+        with transaction(file_db) as conn:
+            conn.execute("INSERT INTO nodes (device_eui) VALUES ('NEW0000000000001')")
+            conn.commit()
+        assert _count_nodes(file_db) == 2
+        assert writer.stats()["jobs"] == 1
+
+    def test_exception_rolls_back_block(self, file_db, single_writer):
+        with pytest.raises(ValueError):
+            with transaction(file_db) as conn:
+                conn.execute(
+                    "INSERT INTO nodes (device_eui) VALUES ('NEW0000000000001')"
+                )
+                raise ValueError("reject")
+        assert _count_nodes(file_db) == 1
+        with transaction(file_db) as conn:
+            conn.execute("INSERT INTO nodes (device_eui) VALUES ('NEW0000000000002')")
+        assert _count_nodes(file_db) == 2
+
+    def test_nested_write_raises_instead_of_deadlocking(self, file_db, single_writer):
+        with pytest.raises(RuntimeError, match="nested write"):
+            with transaction(file_db) as conn:
+                conn.execute(
+                    "INSERT INTO nodes (device_eui) VALUES ('NEW0000000000001')"
+                )
+                run_write(file_db, _insert_node("NEW0000000000002"))
+        assert _count_nodes(file_db) == 1
+        assert run_write(file_db, _insert_node("NEW0000000000003"))
+        assert _count_nodes(file_db) == 2
+
+    def test_overrunning_block_is_rolled_back(
+        self, file_db, single_writer, monkeypatch
+    ):
+        monkeypatch.setattr(writer, "WRITE_LEASE_TIMEOUT_MS", 50)
+        with pytest.raises(TimeoutError):
+            with transaction(file_db) as conn:
+                conn.execute(
+                    "INSERT INTO nodes (device_eui) VALUES ('NEW0000000000001')"
+                )
+                # other writers go ahead once the lease expires
+                other = []
+                t = threading.Thread(target=lambda: other.append(
+                    run_write(file_db, _insert_node("NEW0000000000002"))
+                ))
+                t.start()
+                t.join(5)
+                assert other == ["NEW0000000000002"]
+                conn.execute(
+                    "INSERT INTO nodes (device_eui) VALUES ('NEW0000000000003')"
+                )
+        assert _count_nodes(file_db) == 2
+
+    def test_api_mutation_uses_writer(self, api_client, single_writer):
+        import backend_api
+
+        client, db_path = api_client
+        backend_api.app.dependency_overrides[
+            backend_api._decode_clerk_jwt
+        ] = lambda: {"sub": "test_user_123"}
+        resp = client.post(
+            "/subscriptions/unsubscribe", json={"device_eui": "AABBCCDD00000001"}
+        )
+        assert resp.status_code == 200
+        assert writer.stats()["jobs"] >= 1
+        conn = sqlite3.connect(db_path)
+        n = conn.execute("SELECT COUNT(*) FROM user_node_subscriptions").fetchone()[0]
+        conn.close()
+        assert n == 0
@@ -0,0 +1,38 @@
+import time
+
+from ttl_cache import TTLCache
+
+
+class TestTTLCache:
+
+    def test_get_set_and_counters(self):
+        cache = TTLCache(max_entries=4, ttl_seconds=60)
+        assert cache.get("a") is None
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.counters == {"hits": 1, "misses": 1}
+
+    def test_entries_expire(self):
+        cache = TTLCache(max_entries=4, ttl_seconds=60)
+        cache.set("a", 1, ttl=0.01)
+        time.sleep(0.03)
+        assert cache.get("a", "gone") == "gone"
+        assert len(cache) == 0
+
+    def test_own_ttl_is_capped_and_past_ttl_is_not_stored(self):
+        cache = TTLCache(max_entries=4, ttl_seconds=0.01)
+        cache.set("a", 1, ttl=3600)
+        cache.set("b", 2, ttl=-5)
+        time.sleep(0.03)
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TTLCache(max_entries=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
@@ -24,69 +24,33 @@ const NodeDetails: React.FC<{
     import.meta.env.VITE_API_URL || "http://localhost:8000";
 
   useEffect(() => {
-    const fetchCurrentNodeData = async () => {
+    // latest state, history and alerts come from one overview request; the
+    // browser revalidates it with its ETag, so unchanged polls are 304s
+    const fetchOverview = async () => {
       if (!nodeEui) {
         setNodeData(null);
-        return;
-      }
-      try {
-        const token = await getToken();
-        const response = await fetch(`${API_URL}/nodes/${nodeEui}/latest`, {
-          headers: token ? { Authorization: `Bearer ${token}` } : {},
-        });
-        const data = await response.json();
-        setNodeData(data);
-      } catch (error) {
-        console.error("Error fetching node data:", error);
-      }
-    };
-
-    const fetchHistoricalData = async () => {
-      if (!nodeEui) {
         setHistoricalData([]);
+        setAlerts([]);
         return;
       }
       try {
         const token = await getToken();
         const response = await fetch(
-          `${API_URL}/telemetry?device_eui=${nodeEui}&limit=50`,
+          `${API_URL}/nodes/${nodeEui}/overview?telemetry_limit=50`,
           { headers: token ? { Authorization: `Bearer ${token}` } : {} },
         );
         const data = await response.json();
-        setHistoricalData(data);
+        setNodeData(data.latest);
+        setHistoricalData(data.telemetry ?? []);
+        setAlerts(data.alerts ?? []);
       } catch (error) {
-        console.error("Error fetching historical data:", error);
+        console.error("Error fetching node overview:", error);
       }
     };
 
-    const fetchNodeAlerts = async () => {
-      if (!nodeEui) {
-        setAlerts([]);
-        return;
-      }
-      try {
-        const token = await getToken();
-        const response = await fetch(`${API_URL}/alerts?dev_eui=${nodeEui}`, {
-          headers: { Authorization: `Bearer ${token}` },
-        });
-        const data = await response.json();
-        setAlerts(data);
-      } catch (error) {
-        console.error("Error fetching node alerts:", error);
-      }
-    };
-
-    fetchCurrentNodeData();
-    fetchHistoricalData();
-    fetchNodeAlerts();
-    const nodeDataInterval = setInterval(fetchCurrentNodeData, 3000);
-    const alertsInterval = setInterval(fetchNodeAlerts, 3000);
-    const historicalDataInterval = setInterval(fetchHistoricalData, 30000);
-    return () => {
-      clearInterval(nodeDataInterval);
-      clearInterval(alertsInterval);
-      clearInterval(historicalDataInterval);
-    };
+    fetchOverview();
+    const overviewInterval = setInterval(fetchOverview, 3000);
+    return () => clearInterval(overviewInterval);
   }, [API_URL, getToken, nodeEui]);
 
   useEffect(() => {